@@ -0,0 +1,72 @@
+"""
+数据库连接基准测试
+对比「每次调用新建连接 + 检查表结构 + 默认 journal」（原 get_conn 写法）与
+database 模块的 WAL 连接池，在多线程更新任务状态 + 读取配置的负载下的吞吐。
+
+运行方式: python -m benchmarks.bench_database [每线程操作数] [线程数]
+"""
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+from src import database as db
+
+
+@contextmanager
+def _legacy_conn():
+    """原实现：每次打开新连接并检查表结构"""
+    conn = sqlite3.connect(str(db.DB_PATH))
+    conn.row_factory = sqlite3.Row
+    db._migrate(conn)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def _workload(n: int, job_id: str):
+    for i in range(n):
+        db.update_job(job_id, status="running", step=i % 7, step_name=f"step {i}")
+        db.get_setting("openai_api_key")
+
+
+def _run(label: str, n: int, threads: int):
+    job_ids = [f"bench-{label}-{t}" for t in range(threads)]
+    for job_id in job_ids:
+        db.create_job(job_id, "bench")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for f in [pool.submit(_workload, n, j) for j in job_ids]:
+            f.result()
+    cost = time.perf_counter() - start
+    ops = n * threads * 2
+    print(f"{label:<10} {ops} 次操作  总耗时 {cost:.3f}s  {ops / cost:,.0f} ops/s")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    with tempfile.TemporaryDirectory() as tmp:
+        original_path, original_get_conn = db.DB_PATH, db.get_conn
+        try:
+            db.DB_PATH = Path(tmp) / "legacy.db"
+            db.get_conn = _legacy_conn
+            _run("每次新建", n, threads)
+
+            db.get_conn = original_get_conn
+            db.DB_PATH = Path(tmp) / "pooled.db"
+            db.close_all()
+            _run("WAL连接池", n, threads)
+        finally:
+            db.close_all()
+            db.DB_PATH, db.get_conn = original_path, original_get_conn
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+后处理编码档位基准测试
+用 FFmpeg lavfi 生成竖版样片（或指定视频），按每个 ENCODE_PROFILES 档位烧录字幕重新编码，
+报告每秒输出视频的编码耗时和文件大小。
+
+运行方式: python -m benchmarks.bench_encode_profiles [样片秒数 | 视频路径]
+"""
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from src.post_processor import ENCODE_PROFILES, _find_chinese_font, build_subtitle_filters, encode_args
+
+_SCRIPT = {
+    "hook": "你还在用老式榨汁机？",
+    "scenes": [
+        {"text": "一键启动，30 秒出汁", "duration": 3},
+        {"text": "USB 充电，随身携带", "duration": 3},
+        {"text": "可拆洗，不留死角", "duration": 3},
+    ],
+    "cta": "点击下方链接立即购买",
+}
+
+
+def _make_sample(path: Path, seconds: int):
+    """lavfi testsrc2 竖版 720x1280 30fps + 正弦音轨（近无损，避免样片质量影响结果）"""
+    subprocess.run(
+        [
+            "ffmpeg", "-y", "-v", "error",
+            "-f", "lavfi", "-i", f"testsrc2=size=720x1280:rate=30:duration={seconds}",
+            "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+            "-c:v", "libx264", "-preset", "ultrafast", "-crf", "10", "-pix_fmt", "yuv420p",
+            "-c:a", "aac", "-shortest",
+            str(path),
+        ],
+        check=True,
+    )
+
+
+def _duration(path: Path) -> float:
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", str(path)],
+        capture_output=True, text=True, check=True,
+    )
+    return float(result.stdout.strip())
+
+
+def main():
+    if shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None:
+        print("❌ 需要 ffmpeg / ffprobe")
+        sys.exit(1)
+
+    arg = sys.argv[1] if len(sys.argv) > 1 else "10"
+    filters = ",".join(build_subtitle_filters(_SCRIPT, _find_chinese_font()))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        if arg.isdigit():
+            sample = tmp / "sample.mp4"
+            _make_sample(sample, int(arg))
+        else:
+            sample = Path(arg)
+        seconds = _duration(sample)
+        print(f"样片: {sample.name}  {seconds:.1f}s  {sample.stat().st_size / 1e6:.2f} MB\n")
+        print(f"{'档位':<16}{'preset':<11}{'crf':>4}{'threads':>8}  {'编码耗时':>9}  {'s/输出秒':>9}  {'文件大小':>9}")
+
+        for name, options in ENCODE_PROFILES.items():
+            output = tmp / f"{name}.mp4"
+            start = time.perf_counter()
+            subprocess.run(
+                ["ffmpeg", "-y", "-v", "error", "-i", str(sample), "-vf", filters,
+                 *encode_args(name), "-c:a", "copy", str(output)],
+                check=True,
+            )
+            cost = time.perf_counter() - start
+            print(f"{name:<16}{options['preset']:<11}{options['crf']:>4}{options['threads'] or 'auto':>8}  {cost:>8.2f}s  "
+                  f"{cost / seconds:>9.3f}  {output.stat().st_size / 1e6:>7.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
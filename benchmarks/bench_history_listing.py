@@ -0,0 +1,81 @@
+"""
+历史列表查询基准测试
+对比「SELECT * + 每行 json.loads(script)」（原 list_jobs 写法）与
+query_jobs 的列投影查询，在带完整脚本的任务表上读取一页历史的耗时和内存峰值。
+
+运行方式: python -m benchmarks.bench_history_listing [任务数] [每页条数]
+"""
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from src import database as db
+
+
+def _legacy_page(limit: int):
+    with db.get_conn() as conn:
+        rows = conn.execute(
+            "SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+    return [db._row_to_dict(r) for r in rows]
+
+
+def _projected_page(limit: int):
+    return db.query_jobs(limit=limit)["items"]
+
+
+def _seed(n: int):
+    script = json.dumps({
+        "hook": "还在为这个烦恼吗？" * 4,
+        "scenes": [{"time": f"{i}-{i + 3}s", "visual": "产品特写镜头" * 20, "text": "卖点文案" * 10}
+                   for i in range(0, 15, 3)],
+        "cta": "点击下方链接立即购买",
+    }, ensure_ascii=False)
+    prompt = "A cinematic product shot, soft studio lighting, slow dolly in. " * 15
+    now = time.time()
+    with db.get_conn() as conn:
+        conn.executemany(
+            """
+            INSERT INTO jobs (job_id, product_name, status, script, video_prompt,
+                              created_at, updated_at)
+            VALUES (?, ?, 'success', ?, ?, ?, ?)
+            """,
+            [(f"job-{i:07d}", f"商品{i}", script, prompt, now - i, now) for i in range(n)],
+        )
+        conn.commit()
+
+
+def _run(label: str, fn, limit: int, rounds: int = 50):
+    fn(limit)  # 预热
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn(limit)
+    cost = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<10} 每页 {limit} 条  平均 {cost / rounds * 1000:.2f} ms/页  内存峰值 {peak / 1024:.0f} KB")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    limit = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    with tempfile.TemporaryDirectory() as tmp:
+        original_path = db.DB_PATH
+        try:
+            db.DB_PATH = Path(tmp) / "history.db"
+            db.close_all()
+            _seed(n)
+            _run("SELECT *", _legacy_page, limit)
+            _run("列投影", _projected_page, limit)
+        finally:
+            db.close_all()
+            db.DB_PATH = original_path
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+HTTP 连接池基准测试
+对比「每次请求新建连接」（原 httpx.get 写法）与 http_clients 共享长连接客户端
+在本地模拟服务器上的单请求耗时。
+
+运行方式: python -m benchmarks.bench_http_pool [请求数]
+"""
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from src.http_clients import build_client
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # 支持 keep-alive
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = b'{"status": "running", "progress": 50}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _run(label: str, fn, n: int):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn().raise_for_status()
+    cost = time.perf_counter() - start
+    print(f"{label:<12} {n} 次请求  总耗时 {cost:.3f}s  平均 {cost / n * 1000:.2f} ms/次")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/tasks/demo"
+
+    try:
+        _run("每次新建", lambda: httpx.get(url), n)
+        with build_client() as client:
+            _run("共享连接池", lambda: client.get(url), n)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+任务实时状态存储基准测试
+对比 memory / sqlite 两种 JobStateStore 实现的状态读取（/api/status）与进度更新延迟，
+sqlite 实现另测多进程并发读写下的延迟。
+
+运行方式: python -m benchmarks.bench_job_state [次数]
+"""
+import multiprocessing
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from src.job_state import InMemoryJobStateStore, SQLiteJobStateStore
+
+_STATE = {
+    "status": "processing",
+    "step": 3,
+    "step_name": "AI 生成视频（豆包 Seedance，约 2-3 分钟）",
+    "product_name": "便携榨汁杯",
+    "video_service": "seedance",
+    "add_subtitle": True,
+    "add_bgm": True,
+    "progress": 40,
+    "eta_seconds": 55,
+}
+
+
+def _measure(store, n: int, job_id: str = "job-0"):
+    start = time.perf_counter()
+    for _ in range(n):
+        store.get(job_id)
+    read = (time.perf_counter() - start) / n
+    start = time.perf_counter()
+    for i in range(n):
+        store.update(job_id, progress=i % 100, eta_seconds=n - i)
+    write = (time.perf_counter() - start) / n
+    return read, write
+
+
+def _worker(path: str, n: int, idx: int, results):
+    store = SQLiteJobStateStore(Path(path))
+    results[idx] = _measure(store, n, f"job-{idx}")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    procs = 4
+
+    memory = InMemoryJobStateStore()
+    memory.create("job-0", _STATE)
+    read, write = _measure(memory, n)
+    print(f"{'memory':<18} 读 {read * 1e6:8.1f} µs  更新 {write * 1e6:8.1f} µs")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "job_state.db"
+        store = SQLiteJobStateStore(path)
+        for i in range(procs):
+            store.create(f"job-{i}", _STATE)
+        read, write = _measure(store, n)
+        print(f"{'sqlite':<18} 读 {read * 1e6:8.1f} µs  更新 {write * 1e6:8.1f} µs")
+
+        with multiprocessing.Manager() as manager:
+            results = manager.dict()
+            workers = [
+                multiprocessing.Process(target=_worker, args=(str(path), n, i, results))
+                for i in range(procs)
+            ]
+            for p in workers:
+                p.start()
+            for p in workers:
+                p.join()
+            read = sum(r for r, _ in results.values()) / procs
+            write = sum(w for _, w in results.values()) / procs
+        print(f"{f'sqlite × {procs} 进程':<16} 读 {read * 1e6:8.1f} µs  更新 {write * 1e6:8.1f} µs")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
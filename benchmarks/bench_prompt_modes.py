@@ -0,0 +1,44 @@
+"""
+脚本 + Prompt 生成模式基准测试
+对比 PromptGenerator 两步模式（two_call）与合并模式（fused）在本地模拟 Chat API 上的延迟。
+
+运行方式: python -m benchmarks.bench_prompt_modes [轮数]
+"""
+import statistics
+import sys
+import time
+
+from openai import OpenAI
+
+from src.prompt_generator import PromptGenerator
+from benchmarks.stub_openai import start_server
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    server = start_server()
+    generator = PromptGenerator(api_key="stub")
+    generator.client = OpenAI(api_key="stub", base_url=f"http://127.0.0.1:{server.server_port}/v1")
+
+    try:
+        for mode in ("two_call", "fused"):
+            costs = []
+            for _ in range(rounds):
+                start = time.perf_counter()
+                generator.generate_complete_prompt(
+                    product_name="智能手表 V8 Pro",
+                    product_description="A modern smartwatch with black metal frame",
+                    selling_points=["30天超长续航", "50米防水", "24小时心率监测"],
+                    duration=5,
+                    use_cache=False,
+                    mode=mode,
+                )
+                costs.append(time.perf_counter() - start)
+            print(f"\n[{mode}] {rounds} 轮  中位数 {statistics.median(costs):.3f}s  "
+                  f"最小 {min(costs):.3f}s  最大 {max(costs):.3f}s")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
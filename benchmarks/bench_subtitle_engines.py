@@ -0,0 +1,56 @@
+"""
+字幕引擎基准测试
+对比 drawtext / ass / overlay 三种字幕引擎在不同场景数下的烧录耗时（含 .ass / 字幕卡准备时间）。
+
+运行方式: python -m benchmarks.bench_subtitle_engines [样片秒数]
+"""
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from src.post_processor import SUBTITLE_ENGINES, PostProcessor
+from benchmarks.bench_encode_profiles import _make_sample
+
+
+def _script(scenes: int, seconds: float) -> dict:
+    """scenes 个场景均分样片时长（扣除开头 3 秒 Hook 和结尾 1 秒 CTA）"""
+    duration = max(0.1, (seconds - 4) / scenes)
+    return {
+        "hook": "你还在用老式榨汁机？",
+        "scenes": [{"text": f"第 {i + 1} 个卖点：一键启动，30 秒出汁", "duration": duration}
+                   for i in range(scenes)],
+        "cta": "点击下方链接立即购买",
+    }
+
+
+def main():
+    if shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None:
+        print("❌ 需要 ffmpeg / ffprobe")
+        sys.exit(1)
+
+    seconds = int(sys.argv[1]) if len(sys.argv) > 1 else 15
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        sample = tmp / "sample.mp4"
+        _make_sample(sample, seconds)
+        print(f"样片: {seconds}s 720x1280\n")
+        print(f"{'场景数':<8}" + "".join(f"{engine:>12}" for engine in SUBTITLE_ENGINES))
+
+        for scenes in (3, 10, 40):
+            script = _script(scenes, seconds)
+            costs = []
+            for engine in SUBTITLE_ENGINES:
+                pp = PostProcessor(encode_profile="fast-preview", subtitle_engine=engine)
+                output = tmp / f"{engine}_{scenes}.mp4"
+                start = time.perf_counter()
+                result = pp.add_subtitles(str(sample), script, str(output))
+                costs.append(time.perf_counter() - start)
+                if result["status"] != "success":
+                    print(f"⚠️ {engine} 失败: {result.get('reason')}")
+            print(f"{scenes:<8}" + "".join(f"{cost:>11.2f}s" for cost in costs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+本地 OpenAI Chat API 模拟服务器（供基准测试使用）
+按固定首包延迟 + 每 token 延迟模拟 GPT-4o 的响应时间，返回可被 PromptGenerator 解析的内容。
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SCRIPT = {
+    "hook": "还在为手表续航焦虑？",
+    "scenes": [
+        {"duration": 3, "description": "产品特写，金属表框反光", "text": "30天超长续航"},
+        {"duration": 3, "description": "游泳池入水镜头", "text": "50米防水"},
+        {"duration": 4, "description": "跑步时心率界面", "text": "24小时心率监测"},
+    ],
+    "cta": "立即下单！",
+}
+VIDEO_PROMPT = (
+    "Vertical 9:16 TikTok product video of a modern smartwatch with a black metal frame. "
+    "Slow dolly-in close-up, soft studio lighting, splash of water, runner at dawn, clean white end card."
+)
+
+
+class StubConfig:
+    first_token_latency = 0.4    # 秒
+    per_token_latency = 0.004    # 秒 / token
+
+
+def _reply_for(payload: dict) -> str:
+    system = payload["messages"][0]["content"] if payload.get("messages") else ""
+    fmt = (payload.get("response_format") or {}).get("type")
+    if fmt == "json_object":
+        return json.dumps({**SCRIPT, "video_prompt": VIDEO_PROMPT}, ensure_ascii=False)
+    if "编剧" in system:
+        return json.dumps(SCRIPT, ensure_ascii=False)
+    return VIDEO_PROMPT
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        content = _reply_for(payload)
+        tokens = max(len(content) // 2, 1)
+        time.sleep(StubConfig.first_token_latency + tokens * StubConfig.per_token_latency)
+
+        if payload.get("stream"):
+            self._send_stream(payload, content)
+            return
+
+        body = json.dumps({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "gpt-4o"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 300, "completion_tokens": tokens, "total_tokens": 300 + tokens},
+        }, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, payload: dict, content: str):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i in range(0, len(content), 8):
+            chunk = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": payload.get("model", "gpt-4o"),
+                "choices": [{"index": 0, "delta": {"content": content[i:i + 8]}, "finish_reason": None}],
+            }
+            self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+def start_server() -> ThreadingHTTPServer:
+    """在后台线程启动模拟服务器，返回 server（server.server_port 为端口）"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
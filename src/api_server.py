@@ -2,159 +2,69 @@
 AI Video Generator - Web API 服务
 提供 REST API 接口，供前端页面调用
 """
-import json
 import uuid
-import threading
 import shutil
+import threading
+from dataclasses import asdict
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Body
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Body, Query, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 
 from .config import settings
-from .image_processor import ImageProcessor
-from .prompt_generator import PromptGenerator
-from .video_generator import VideoGenerator
-from .post_processor import PostProcessor
 from .competitor_analyzer import suggest_selling_points, analyze_competitor_text
 from . import database as db
 from . import batch_processor as bp
 from . import settings_manager as sm
+from . import http_clients
+from .cache import cache_stats
+from . import llm_cache
+from .job_journal import get_journal
+from .checkpoints import Checkpoint
+from .job_state import get_job_state_store
+from . import job_queue
+from .postprocess_pool import get_postprocess_pool
+from .bgm_library import get_bgm_library
+from .task_poller import get_poller
+from .pipeline import run_pipeline, resume_step, get_pipeline  # noqa: F401  run_pipeline 保留在本模块的导出中
 
 
 app = FastAPI(title="AI Video Generator")
 
-# 启动时加载 DB 配置到 config.settings（向后兼容）
+# 启动时建表，并加载 DB 配置到 config.settings（向后兼容）
+db.init_db()
 sm.load_into_config()
 
-# 内存任务状态（供实时轮询用，同时写入 SQLite 持久化）
-jobs: dict = {}
-
-
-def run_pipeline(
-    job_id: str,
-    image_path: str,
-    product_name: str,
-    selling_points: List[str],
-    video_service: str = "seedance",
-    add_subtitle: bool = False,
-    add_bgm: bool = False,
-):
-    """
-    后台线程：执行完整的视频生成流程
-
-    步骤:
-    1. 图片处理（GPT-4o Vision 分析 + DALL-E 3 白底图）
-    2. 脚本生成（GPT-4o 视频脚本 + Prompt）
-    3. 视频生成（Seedance / Creatok）
-    4. 后处理（字幕 + BGM，按需执行）
-    """
-    output_dir = settings.output_dir / job_id
-    output_dir.mkdir(parents=True, exist_ok=True)
-
-    def _update(data: dict):
-        jobs[job_id].update(data)
-        db.update_job(job_id, **data)
-
-    try:
-        # ── 步骤 1: 图片处理 ──────────────────────────────────────
-        _update({"status": "processing", "step": 1, "step_name": "分析产品图片"})
-
-        processor = ImageProcessor()
-        image_result = processor.process_image(
-            input_path=image_path,
-            output_dir=str(output_dir / "processed")
-        )
-
-        if image_result["status"] != "success":
-            raise Exception("图片处理失败，请检查图片是否清晰")
-
-        product_description = image_result["analysis"].get(
-            "white_bg_prompt",
-            image_result["analysis"].get("description", "")
-        )
-        processed_image_path = image_result["output_path"]
-
-        # ── 步骤 2: 生成脚本和 Prompt ────────────────────────────
-        _update({"step": 2, "step_name": "生成视频脚本"})
-
-        duration = 5 if video_service == "seedance" else 15
-        generator = PromptGenerator()
-        prompt_result = generator.generate_complete_prompt(
-            product_name=product_name,
-            product_description=product_description,
-            selling_points=selling_points,
-            duration=duration
-        )
-
-        video_prompt = prompt_result["video_prompt"]
-        script = prompt_result["script"]
-
-        # 保存脚本和 Prompt 到文件
-        with open(output_dir / "script.json", "w", encoding="utf-8") as f:
-            json.dump(script, f, ensure_ascii=False, indent=2)
-        with open(output_dir / "video_prompt.txt", "w", encoding="utf-8") as f:
-            f.write(video_prompt)
-
-        # ── 步骤 3: 生成视频 ─────────────────────────────────────
-        service_label = "豆包 Seedance" if video_service == "seedance" else "Creatok"
-        _update({"step": 3, "step_name": f"AI 生成视频（{service_label}，约 2-3 分钟）"})
-
-        safe_name = product_name.replace(" ", "_").replace("/", "_")
-        raw_video_path = output_dir / f"{safe_name}_raw.mp4"
-        final_video_path = output_dir / f"{safe_name}.mp4"
-
-        video_gen = VideoGenerator()
-        video_result = video_gen.generate_video(
-            prompt=video_prompt,
-            output_path=str(raw_video_path),
-            reference_image_path=processed_image_path,
-            duration=duration,
-            backend=video_service,
-            wait=True
-        )
+# 任务实时状态（供 /api/status 轮询，按 job_state_backend 选择进程内或多进程共享存储）
+job_state = get_job_state_store()
 
-        if video_result["status"] != "success":
-            raise Exception(video_result.get("error", "视频生成失败，请稍后重试"))
-
-        # ── 步骤 4: 后处理（字幕 / BGM）────────────────────────
-        if add_subtitle or add_bgm:
-            _update({"step": 4, "step_name": "后处理（字幕 / BGM）"})
-            pp = PostProcessor()
-            pp.process(
-                video_path=str(raw_video_path),
-                output_path=str(final_video_path),
-                script=script if add_subtitle else None,
-                add_subtitle=add_subtitle,
-                add_bgm=add_bgm,
-            )
-        else:
-            shutil.copy2(str(raw_video_path), str(final_video_path))
-
-        # 清理临时原始视频
-        try:
-            raw_video_path.unlink(missing_ok=True)
-        except Exception:
-            pass
 
-        _update({
-            "status": "success",
-            "step_name": "生成完成",
-            "video_path": str(final_video_path),
-            "script": json.dumps(script, ensure_ascii=False),
-            "video_prompt": video_prompt,
-        })
+@app.on_event("startup")
+def _start_job_queue():
+    """标记队列之外的中断任务，启动队列工作线程（租约过期的任务会被重新领取）"""
+    error = "服务重启，任务已中断，请重新提交"
+    orphaned = db.fail_orphaned_jobs(error)
+    for job_id in orphaned:
+        job_state.update(job_id, status="failed", error=error)
+    if orphaned:
+        print(f"⚠️ {len(orphaned)} 个中断的历史任务已标记为失败")
+    # 共享状态存储中清理一周前的记录（历史查询走 jobs 表）
+    job_state.purge(7 * 86400)
+    job_queue.get_worker_pool().start()
+    # 后台建立 BGM 曲库索引（新曲目需测量响度、生成归一化副本）
+    threading.Thread(target=get_bgm_library().refresh, name="bgm-index", daemon=True).start()
 
-    except Exception as e:
-        _update({"status": "failed", "error": str(e)})
 
-    finally:
-        try:
-            Path(image_path).unlink(missing_ok=True)
-        except Exception:
-            pass
+@app.on_event("shutdown")
+def _close_shared_resources():
+    """停止任务队列，刷写待落库的任务状态，关闭轮询事件循环、共享的 HTTP 长连接和数据库连接池"""
+    job_queue.get_worker_pool().stop()
+    get_journal().close()
+    get_poller().shutdown()
+    http_clients.close_all()
+    db.close_all()
 
 
 # ────────────────────────────────────────────────────────────
@@ -169,6 +79,7 @@ async def start_generation(
     video_service: str = Form("seedance", description="视频生成服务：seedance 或 creatok"),
     add_subtitle: str = Form("false", description="是否添加字幕"),
     add_bgm: str = Form("false", description="是否混入 BGM"),
+    use_cache: str = Form("true", description="是否复用缓存的图片分析 / 白底图"),
 ):
     """开始生成视频任务，返回 job_id"""
     if not image.content_type or not image.content_type.startswith("image/"):
@@ -185,6 +96,7 @@ async def start_generation(
 
     sub = add_subtitle.lower() in ("true", "1", "yes")
     bgm = add_bgm.lower() in ("true", "1", "yes")
+    cached = use_cache.lower() in ("true", "1", "yes")
 
     upload_dir = settings.temp_dir / "uploads"
     upload_dir.mkdir(parents=True, exist_ok=True)
@@ -197,8 +109,8 @@ async def start_generation(
     with open(image_path, "wb") as f:
         f.write(content)
 
-    # 初始化内存状态
-    jobs[job_id] = {
+    # 初始化实时状态
+    job_state.create(job_id, {
         "status": "queued",
         "step": 0,
         "step_name": "等待中",
@@ -206,7 +118,7 @@ async def start_generation(
         "video_service": video_service,
         "add_subtitle": sub,
         "add_bgm": bgm,
-    }
+    })
 
     # 持久化到数据库
     db.create_job(
@@ -217,24 +129,54 @@ async def start_generation(
         add_bgm=bgm,
     )
 
-    t = threading.Thread(
-        target=run_pipeline,
-        args=(job_id, str(image_path), product_name, points, video_service, sub, bgm),
-        daemon=True
-    )
-    t.start()
+    job_queue.submit("pipeline", job_id, {
+        "image_path": str(image_path),
+        "product_name": product_name,
+        "selling_points": points,
+        "video_service": video_service,
+        "add_subtitle": sub,
+        "add_bgm": bgm,
+        "use_cache": cached,
+    })
 
     return {"job_id": job_id}
 
 
+@app.post("/api/retry/{job_id}")
+async def retry_job(job_id: str):
+    """重试失败的任务：从检查点中第一个未完成的步骤继续（已创建的视频任务继续轮询）"""
+    job = job_state.get(job_id) or db.get_job_summary(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    if job["status"] != "failed":
+        raise HTTPException(status_code=400, detail="只有失败的任务可以重试")
+
+    checkpoint = Checkpoint(settings.output_dir / job_id)
+    request = checkpoint.get("request")
+    source_image = checkpoint.file("source_image")
+    if not request or source_image is None:
+        raise HTTPException(status_code=409, detail="该任务没有可用的检查点，请重新提交")
+
+    resume_from = resume_step(checkpoint)
+    state = {"status": "queued", "step": 0, "step_name": "等待重试", "error": None}
+    job_state.create(job_id, {**request, **state})
+    get_journal().record(job_id, **state)
+    job_queue.submit(
+        "pipeline", job_id,
+        {"image_path": str(source_image), **request, "use_cache": request.get("use_cache", True)},
+    )
+
+    return {"job_id": job_id, "resume_from_step": resume_from}
+
+
 @app.get("/api/status/{job_id}")
 async def get_status(job_id: str):
     """查询任务状态和进度"""
-    # 优先从内存中读（内存有则说明任务是本次启动后创建的）
-    job = jobs.get(job_id)
+    # 优先读实时状态（任务执行期间都有记录）
+    job = job_state.get(job_id)
     if not job:
         # 尝试从数据库恢复（跨重启）
-        job = db.get_job(job_id)
+        job = db.get_job_summary(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="任务不存在")
 
@@ -244,13 +186,16 @@ async def get_status(job_id: str):
         "step_name": job.get("step_name", ""),
         "error": job.get("error"),
         "product_name": job.get("product_name", ""),
+        "progress": job.get("progress"),
+        "eta_seconds": job.get("eta_seconds"),
+        "partial_script": job.get("partial_script"),
     }
 
 
 @app.get("/api/download/{job_id}")
 async def download_video(job_id: str):
     """下载生成的视频文件"""
-    job = jobs.get(job_id) or db.get_job(job_id)
+    job = job_state.get(job_id) or db.get_job_summary(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="任务不存在")
     if job["status"] != "success":
@@ -258,6 +203,7 @@ async def download_video(job_id: str):
 
     video_path = Path(job["video_path"])
     if not video_path.exists():
+        db.set_has_video(job_id, False)
         raise HTTPException(status_code=404, detail="视频文件不存在，可能已被清理")
 
     safe_name = job.get("product_name", "video").replace(" ", "_")
@@ -269,12 +215,40 @@ async def download_video(job_id: str):
 
 
 @app.get("/api/history")
-async def get_history():
-    """获取历史任务列表（最近 50 条）"""
-    records = db.list_jobs(limit=50)
-    result = []
-    for r in records:
-        result.append({
+async def get_history(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    video_service: Optional[str] = None,
+    product: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+):
+    """
+    获取历史任务列表（按创建时间倒序，游标分页）
+
+    下一页游标通过 X-Next-Cursor 响应头返回，没有更多记录时不返回该头。
+    product 为产品名前缀，since / until 为 Unix 时间戳。
+    """
+    try:
+        page = db.query_jobs(
+            limit=limit,
+            cursor=cursor,
+            status=status,
+            video_service=video_service,
+            product_prefix=product,
+            created_from=since,
+            created_to=until,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if page["next_cursor"]:
+        response.headers["X-Next-Cursor"] = page["next_cursor"]
+
+    return [
+        {
             "job_id": r["job_id"],
             "product_name": r["product_name"],
             "status": r["status"],
@@ -282,15 +256,26 @@ async def get_history():
             "add_subtitle": r["add_subtitle"],
             "add_bgm": r["add_bgm"],
             "created_at": r["created_at"],
-            "has_video": bool(r.get("video_path") and Path(r["video_path"]).exists()),
-        })
-    return result
+            "has_video": r["has_video"],
+        }
+        for r in page["items"]
+    ]
+
+
+@app.get("/api/history/{job_id}")
+async def get_history_detail(job_id: str):
+    """获取单个任务详情（含脚本、视频 Prompt 和产物记录）"""
+    record = db.get_job(job_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    record["assets"] = db.list_assets(job_id)
+    return record
 
 
 @app.delete("/api/history/{job_id}")
 async def delete_history(job_id: str):
     """删除任务记录及对应视频文件"""
-    record = db.get_job(job_id)
+    record = db.get_job_summary(job_id)
     if not record:
         raise HTTPException(status_code=404, detail="任务不存在")
 
@@ -301,8 +286,8 @@ async def delete_history(job_id: str):
 
     db.delete_job(job_id)
 
-    # 同步清理内存
-    jobs.pop(job_id, None)
+    # 同步清理实时状态
+    job_state.delete(job_id)
 
     return {"status": "deleted"}
 
@@ -401,6 +386,7 @@ async def download_batch(batch_id: str):
 async def api_suggest_selling_points(
     product_name: str = Body(..., embed=True),
     existing_points: List[str] = Body(default=[], embed=True),
+    use_cache: bool = Body(True, embed=True),
 ):
     """AI 卖点建议：根据产品名称 + 已有卖点，返回补充建议"""
     if not product_name.strip():
@@ -409,6 +395,7 @@ async def api_suggest_selling_points(
     result = suggest_selling_points(
         product_name=product_name.strip(),
         existing_points=existing_points,
+        use_cache=use_cache,
     )
 
     if result["status"] == "error":
@@ -420,12 +407,13 @@ async def api_suggest_selling_points(
 @app.post("/api/analyze-competitor")
 async def api_analyze_competitor(
     text: str = Body(..., embed=True),
+    use_cache: bool = Body(True, embed=True),
 ):
     """分析竞品文案，提取卖点和钩子"""
     if not text.strip():
         raise HTTPException(status_code=400, detail="竞品文案不能为空")
 
-    result = analyze_competitor_text(text.strip())
+    result = analyze_competitor_text(text.strip(), use_cache=use_cache)
 
     if result["status"] == "error":
         raise HTTPException(status_code=503, detail=result["reason"])
@@ -437,6 +425,39 @@ async def api_analyze_competitor(
     }
 
 
+@app.get("/api/queue/stats")
+async def get_queue_stats():
+    """任务队列（执行中 / 已完成数量及各状态条目数）与流水线各阶段的并发和排队情况"""
+    return {**job_queue.get_worker_pool().stats(), "pipeline": get_pipeline().stats()}
+
+
+@app.get("/api/postprocess/stats")
+async def get_postprocess_stats():
+    """后处理执行器的并发上限、排队深度、等待时间和执行时间"""
+    return get_postprocess_pool().stats()
+
+
+@app.get("/api/bgm")
+def list_bgm(
+    mood: Optional[str] = Query(None, description="情绪标签"),
+    tempo: Optional[int] = Query(None, description="目标 BPM"),
+    duration: Optional[float] = Query(None, description="视频时长（秒）"),
+):
+    """BGM 曲库：全部曲目（时长、标签、响度），以及按条件会选中的曲目"""
+    library = get_bgm_library()
+    selected = library.select(mood=mood, tempo=tempo, duration=duration)
+    return {
+        "tracks": [asdict(t) for t in library.tracks()],
+        "selected": selected.name if selected else None,
+    }
+
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """各缓存的条目数与命中率"""
+    return {**cache_stats(), "llm": llm_cache.stats()}
+
+
 # ────────────────────────────────────────────────────────────
 # 设置 API
 # ────────────────────────────────────────────────────────────
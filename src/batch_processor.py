@@ -1,12 +1,14 @@
 """
 批量处理模块
-功能：支持多产品队列生成，逐个处理，最后 ZIP 打包下载
+功能：支持多产品队列生成，按后端并发限制并行处理，最后 ZIP 打包下载
+（批量任务与条目状态持久化到 batches / batch_items 表，重启后仍可查询）
 """
 import json
 import shutil
 import threading
 import uuid
 import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Dict, List, Optional
@@ -15,7 +17,11 @@ from .config import settings
 from .prompt_generator import PromptGenerator
 from .video_generator import VideoGenerator
 from .post_processor import PostProcessor
+from .postprocess_pool import get_postprocess_pool
+from .concurrency import get_limiter
 from . import database as db
+from . import job_queue
+from .job_state import get_job_state_store
 
 
 @dataclass
@@ -45,8 +51,26 @@ class BatchJob:
         return len(self.items)
 
 
-# 全局批量任务存储
-batch_jobs: Dict[str, BatchJob] = {}
+# 本进程正在执行（或刚提交）的批量任务；多进程部署时以数据库为准
+_active_batches: Dict[str, BatchJob] = {}
+
+# 保护 BatchJob.completed / failed 计数（多个工作线程并发更新）
+_progress_lock = threading.Lock()
+
+_runner_pool: Optional[ThreadPoolExecutor] = None
+_runner_pool_lock = threading.Lock()
+
+
+def _runner_executor() -> ThreadPoolExecutor:
+    """批量任务执行线程池（每个批量任务占一个线程，不占用队列工作线程）"""
+    global _runner_pool
+    with _runner_pool_lock:
+        if _runner_pool is None:
+            _runner_pool = ThreadPoolExecutor(
+                max_workers=max(1, settings.batch_runner_workers),
+                thread_name_prefix="batch-runner",
+            )
+        return _runner_pool
 
 
 def start_batch(
@@ -85,58 +109,173 @@ def start_batch(
         add_bgm=add_bgm,
         reference_image_path=reference_image_path,
     )
-    batch_jobs[batch_id] = job
+    _active_batches[batch_id] = job
+    db.create_batch(
+        batch_id,
+        [{"item_id": i.item_id, "product_name": i.product_name, "selling_points": i.selling_points}
+         for i in batch_items],
+        video_service=video_service,
+        add_subtitle=add_subtitle,
+        add_bgm=add_bgm,
+        reference_image_path=reference_image_path,
+    )
 
-    t = threading.Thread(target=_process_batch, args=(job,), daemon=True)
-    t.start()
+    job_queue.submit("batch", batch_id)
     return batch_id
 
 
 def get_batch(batch_id: str) -> Optional[BatchJob]:
-    """查询批量任务状态"""
-    return batch_jobs.get(batch_id)
+    """
+    查询批量任务状态
+
+    单进程部署时优先读本进程的内存对象；状态存储为多进程共享时，
+    执行批量的可能是其他 worker，直接读数据库（每条进度都会落库）。
+    服务重启后同样从数据库恢复。
+    """
+    if not get_job_state_store().shared:
+        job = _active_batches.get(batch_id)
+        if job is not None:
+            return job
+
+    record = db.get_batch(batch_id)
+    if record is None:
+        return None
+    return BatchJob(
+        batch_id=record["batch_id"],
+        items=[
+            BatchItem(
+                item_id=i["item_id"],
+                product_name=i["product_name"],
+                selling_points=i["selling_points"],
+                status=i["status"],
+                error=i["error"] or "",
+                video_path=i["video_path"] or "",
+            )
+            for i in record["items"]
+        ],
+        video_service=record["video_service"],
+        add_subtitle=record["add_subtitle"],
+        add_bgm=record["add_bgm"],
+        reference_image_path=record["reference_image_path"] or "",
+        status=record["status"],
+        completed=record["completed"],
+        failed=record["failed"],
+    )
+
+
+def _run_queued_batch(batch_id: str, payload: Dict) -> Future:
+    """
+    队列执行入口：批量任务交给独立线程池执行并立即返回 Future，
+    队列工作线程继续领取下一条（长时间运行的批量任务不阻塞单条生成任务）；
+    服务重启后恢复时，中断的条目重新执行，已完成的条目跳过
+    """
+    job = get_batch(batch_id)
+    if job is None:
+        raise Exception(f"批量任务不存在: {batch_id}")
+
+    for item in job.items:
+        if item.status == "processing":
+            item.status = "pending"
+            db.update_batch_item(item.item_id, status="pending")
+    job.completed = sum(1 for i in job.items if i.status == "success")
+    job.failed = sum(1 for i in job.items if i.status == "failed")
+    _active_batches[batch_id] = job
+
+    def _run():
+        try:
+            _process_batch(job)
+        finally:
+            if get_job_state_store().shared:
+                _active_batches.pop(batch_id, None)
+
+    return _runner_executor().submit(_run)
+
+
+def _give_up_batch(batch_id: str, payload: Dict, error: str):
+    """重试次数用尽：未完成的条目标记为失败"""
+    job = get_batch(batch_id)
+    if job is None:
+        return
+    for item in job.items:
+        if item.status in ("pending", "processing"):
+            item.status, item.error = "failed", error
+            db.update_batch_item(item.item_id, status="failed", error=error)
+    job.completed = sum(1 for i in job.items if i.status == "success")
+    job.failed = sum(1 for i in job.items if i.status == "failed")
+    job.status = "done"
+    db.update_batch(batch_id, status="done", completed=job.completed, failed=job.failed)
+
+
+job_queue.register_handler("batch", _run_queued_batch, on_give_up=_give_up_batch)
 
 
 def _process_batch(job: BatchJob):
-    """后台线程：逐个处理批量任务中的每条产品"""
+    """
+    并发处理批量任务中所有待处理的条目（在批量任务执行线程池中运行）
+
+    每条产品在线程池中独立执行，OpenAI / Seedance / Creatok 调用分别受
+    concurrency 模块中对应后端的并发与速率限制约束，
+    批量总耗时趋近于最慢的一条，而不是所有条目耗时之和。
+    """
     job.status = "processing"
-    duration = 5 if job.video_service == "seedance" else 15
+    db.update_batch(job.batch_id, status="processing")
 
     pg = PromptGenerator()
     vg = VideoGenerator()
     pp = PostProcessor()
 
-    for item in job.items:
-        if item.status != "pending":
-            continue
+    pending = [item for item in job.items if item.status == "pending"]
+    workers = max(1, min(settings.batch_max_workers, len(pending) or 1))
 
-        item.status = "processing"
-        output_dir = settings.output_dir / "batch" / job.batch_id / item.item_id
-        output_dir.mkdir(parents=True, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as pool:
+        futures = [pool.submit(_process_item, job, item, pg, vg, pp) for item in pending]
+        for future in futures:
+            future.result()
 
-        try:
-            # Step 1: 生成视频脚本 + Prompt
-            # 批量模式跳过 DALL-E（降低成本），直接用卖点作产品描述
-            product_desc = "、".join(item.selling_points) if item.selling_points else item.product_name
+    job.status = "done"
+    db.update_batch(job.batch_id, status="done", completed=job.completed, failed=job.failed)
+    print(f"✅ 批量任务完成: {job.completed} 成功, {job.failed} 失败")
+
+
+def _process_item(
+    job: BatchJob,
+    item: BatchItem,
+    pg: PromptGenerator,
+    vg: VideoGenerator,
+    pp: PostProcessor,
+):
+    """处理单条产品：脚本 → 视频 → 后处理，结果计入 job.completed / job.failed"""
+    item.status = "processing"
+    db.update_batch_item(item.item_id, status="processing")
+    duration = 5 if job.video_service == "seedance" else 15
+    output_dir = settings.output_dir / "batch" / job.batch_id / item.item_id
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    try:
+        # Step 1: 生成视频脚本 + Prompt
+        # 批量模式跳过 DALL-E（降低成本），直接用卖点作产品描述
+        product_desc = "、".join(item.selling_points) if item.selling_points else item.product_name
+        with get_limiter("openai").acquire():
             prompt_result = pg.generate_complete_prompt(
                 product_name=item.product_name,
                 product_description=product_desc,
                 selling_points=item.selling_points,
                 duration=duration,
             )
-            script = prompt_result["script"]
-            video_prompt = prompt_result["video_prompt"]
+        script = prompt_result["script"]
+        video_prompt = prompt_result["video_prompt"]
 
-            # 保存脚本
-            with open(output_dir / "script.json", "w", encoding="utf-8") as f:
-                json.dump(script, f, ensure_ascii=False, indent=2)
+        # 保存脚本
+        with open(output_dir / "script.json", "w", encoding="utf-8") as f:
+            json.dump(script, f, ensure_ascii=False, indent=2)
 
-            # Step 2: 生成视频
-            safe_name = item.product_name.replace(" ", "_").replace("/", "_")
-            raw_video = output_dir / f"{safe_name}_raw.mp4"
-            final_video = output_dir / f"{safe_name}.mp4"
+        # Step 2: 生成视频
+        safe_name = item.product_name.replace(" ", "_").replace("/", "_")
+        raw_video = output_dir / f"{safe_name}_raw.mp4"
+        final_video = output_dir / f"{safe_name}.mp4"
 
-            ref_image = job.reference_image_path if job.reference_image_path and Path(job.reference_image_path).exists() else None
+        ref_image = job.reference_image_path if job.reference_image_path and Path(job.reference_image_path).exists() else None
+        with get_limiter(job.video_service).acquire():
             video_result = vg.generate_video(
                 prompt=video_prompt,
                 output_path=str(raw_video),
@@ -146,48 +285,56 @@ def _process_batch(job: BatchJob):
                 wait=True,
             )
 
-            if video_result["status"] != "success":
-                raise Exception(video_result.get("error", "视频生成失败"))
-
-            # Step 3: 后处理
-            if job.add_subtitle or job.add_bgm:
-                pp.process(
-                    video_path=str(raw_video),
-                    output_path=str(final_video),
-                    script=script if job.add_subtitle else None,
-                    add_subtitle=job.add_subtitle,
-                    add_bgm=job.add_bgm,
-                )
-            else:
-                shutil.copy2(str(raw_video), str(final_video))
-
-            try:
-                raw_video.unlink(missing_ok=True)
-            except Exception:
-                pass
-
-            item.status = "success"
-            item.video_path = str(final_video)
-            job.completed += 1
-
-            # 写入历史数据库
-            db.create_job(item.item_id, item.product_name, job.video_service, job.add_subtitle, job.add_bgm)
-            db.update_job(
-                item.item_id,
-                status="success",
-                video_path=str(final_video),
-                script=json.dumps(script, ensure_ascii=False),
-                video_prompt=video_prompt,
+        if video_result["status"] != "success":
+            raise Exception(video_result.get("error", "视频生成失败"))
+
+        # Step 3: 后处理
+        if job.add_subtitle or job.add_bgm:
+            get_postprocess_pool().run(
+                pp.process,
+                video_path=str(raw_video),
+                output_path=str(final_video),
+                script=script if job.add_subtitle else None,
+                add_subtitle=job.add_subtitle,
+                add_bgm=job.add_bgm,
             )
+        else:
+            shutil.copy2(str(raw_video), str(final_video))
 
-        except Exception as e:
-            item.status = "failed"
-            item.error = str(e)
-            job.failed += 1
-            print(f"❌ 批量任务 [{item.product_name}] 失败: {e}")
+        try:
+            raw_video.unlink(missing_ok=True)
+        except Exception:
+            pass
+
+        # 写入历史数据库
+        db.create_job(item.item_id, item.product_name, job.video_service, job.add_subtitle, job.add_bgm)
+        db.update_job(
+            item.item_id,
+            status="success",
+            video_path=str(final_video),
+            script=json.dumps(script, ensure_ascii=False),
+            video_prompt=video_prompt,
+        )
 
-    job.status = "done"
-    print(f"✅ 批量任务完成: {job.completed} 成功, {job.failed} 失败")
+        db.add_asset(item.item_id, "video", str(final_video))
+
+        item.video_path = str(final_video)
+        item.status = "success"
+        db.update_batch_item(item.item_id, status="success", video_path=item.video_path)
+        # 计数和落库放在同一把锁里，保证数据库中的计数只增不减
+        with _progress_lock:
+            job.completed += 1
+            db.update_batch(job.batch_id, completed=job.completed)
+
+    except Exception as e:
+        item.status = "failed"
+        item.error = str(e)
+        db.update_batch_item(item.item_id, status="failed", error=item.error)
+        # 计数和落库放在同一把锁里，保证数据库中的计数只增不减
+        with _progress_lock:
+            job.failed += 1
+            db.update_batch(job.batch_id, failed=job.failed)
+        print(f"❌ 批量任务 [{item.product_name}] 失败: {e}")
 
 
 def create_zip(batch_id: str) -> Optional[str]:
@@ -197,7 +344,7 @@ def create_zip(batch_id: str) -> Optional[str]:
     Returns:
         ZIP 文件路径，如果没有成功视频则返回 None
     """
-    job = batch_jobs.get(batch_id)
+    job = get_batch(batch_id)
     if not job:
         return None
 
@@ -0,0 +1,379 @@
+"""
+BGM 曲库模块
+功能：
+1. 扫描 static/bgm/ 建立索引（时长、情绪 / 节奏标签），索引落盘到 <cache_dir>/bgm/index.json，
+   之后只比较目录签名（文件名 + mtime + 大小），有变化才重新扫描
+2. 每首曲目预先测量 EBU R128 响度（FFmpeg loudnorm），并生成响度归一化后的缓存副本，
+   混音时使用归一化副本，不同曲目的背景音量一致
+3. 按情绪（mood）、节奏（tempo，BPM）和所需时长选曲；时长足够覆盖视频时混音无需 aloop
+
+标签写在 static/bgm/tags.json（可选）：
+    {"summer.mp3": {"mood": "upbeat", "tempo": 120, "tags": ["夏日", "轻快"]}}
+"""
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from dataclasses import asdict, dataclass, field, replace
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .cache import hash_key
+from .config import settings
+
+# BGM 文件目录
+BGM_DIR = Path(__file__).parent.parent / "static" / "bgm"
+
+# 曲目标签文件（可选）
+TAGS_FILE = "tags.json"
+
+AUDIO_SUFFIXES = (".mp3", ".wav", ".m4a", ".aac")
+
+# 归一化目标：积分响度 / 真峰值 / 响度范围
+TARGET_LUFS = -16.0
+TARGET_TP = -1.5
+TARGET_LRA = 11.0
+
+# 索引格式版本（测量方式或目标响度变化时递增，旧索引整体失效）
+INDEX_VERSION = 2
+
+
+@dataclass
+class BgmTrack:
+    """曲库中的一首曲目"""
+    name: str
+    path: str
+    mtime_ns: int
+    size: int
+    duration: Optional[float] = None
+    mood: str = ""
+    tempo: Optional[int] = None
+    tags: List[str] = field(default_factory=list)
+    loudness: Optional[Dict] = None       # loudnorm 测量结果 {"input_i", "input_tp", "input_lra", ...}
+    normalized_path: Optional[str] = None  # 归一化副本路径
+    analyzed: bool = False                 # 是否已测量时长 / 响度（未分析时混音使用原文件）
+
+    @property
+    def mix_path(self) -> str:
+        """混音时使用的文件：归一化副本存在时优先使用"""
+        if self.normalized_path and Path(self.normalized_path).exists():
+            return self.normalized_path
+        return self.path
+
+
+class BgmLibrary:
+    """
+    BGM 曲库（线程安全）
+
+    tracks() / select() 只读取当前索引，不会等待分析：距上次检查超过 rescan_interval 秒时，
+    在后台线程比较目录签名，有变化才重新扫描。重新扫描先把新增 / 修改的曲目（未分析，使用原文件）
+    换入索引，再在锁外测量响度、生成归一化副本，完成后再次换入。
+    """
+
+    def __init__(self, bgm_dir: Path = BGM_DIR, cache_dir: Optional[Path] = None,
+                 rescan_interval: float = 10.0):
+        self.bgm_dir = Path(bgm_dir)
+        self.bgm_dir.mkdir(parents=True, exist_ok=True)
+        self.cache_dir = Path(cache_dir or settings.cache_dir) / "bgm"
+        self.normalized_dir = self.cache_dir / "normalized"
+        self.normalized_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.cache_dir / "index.json"
+        self.rescan_interval = rescan_interval
+        self._lock = threading.Lock()           # 保护 _tracks / _signature / _checked_at
+        self._refresh_lock = threading.Lock()   # 同一时间只有一次重新扫描
+        self._tracks: Dict[str, BgmTrack] = {}
+        self._signature: Optional[Tuple] = None
+        self._checked_at = 0.0
+        self._load_index()
+
+    # ── 索引 ─────────────────────────────────────────────────────
+
+    def _directory_signature(self) -> Tuple:
+        """目录签名：所有音频文件和标签文件的 (文件名, mtime, 大小)"""
+        entries = []
+        with os.scandir(self.bgm_dir) as it:
+            for entry in it:
+                if not entry.is_file():
+                    continue
+                if entry.name == TAGS_FILE or entry.name.lower().endswith(AUDIO_SUFFIXES):
+                    stat = entry.stat()
+                    entries.append((entry.name, stat.st_mtime_ns, stat.st_size))
+        return tuple(sorted(entries))
+
+    def _load_index(self):
+        try:
+            data = json.loads(self.index_path.read_text(encoding="utf-8"))
+            if data.get("version") != INDEX_VERSION:
+                return
+            self._tracks = {t["name"]: BgmTrack(**t) for t in data.get("tracks", [])}
+            self._signature = tuple(tuple(e) for e in data.get("signature", []))
+        except (OSError, ValueError, TypeError, KeyError, AttributeError):
+            # 索引缺失或损坏时重新扫描
+            self._tracks, self._signature = {}, None
+
+    def _save_index(self):
+        data = {
+            "version": INDEX_VERSION,
+            "signature": [list(e) for e in self._signature or ()],
+            "tracks": [asdict(t) for t in self._tracks.values()],
+        }
+        tmp = self.index_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self.index_path)
+
+    def _load_tags(self) -> Dict[str, Dict]:
+        """读取并校验 tags.json，格式不对的条目跳过（按无标签处理）"""
+        try:
+            data = json.loads((self.bgm_dir / TAGS_FILE).read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ BGM 标签文件无法读取，忽略: {e}")
+            return {}
+        if not isinstance(data, dict):
+            print(f"⚠️ BGM 标签文件应为 {{文件名: {{mood, tempo, tags}}}} 对象，忽略")
+            return {}
+
+        tags = {}
+        for name, meta in data.items():
+            parsed = _parse_tags(meta)
+            if parsed is None:
+                print(f"⚠️ BGM 标签格式错误，已跳过: {name} → {meta!r}")
+                continue
+            tags[name] = parsed
+        return tags
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        目录有变化时重新扫描（新增 / 修改的曲目测量响度并生成归一化副本）
+
+        分析在锁外进行，期间 tracks() / select() 照常使用当前索引。
+
+        Args:
+            force: 忽略目录签名，强制重新分析所有曲目
+
+        Returns:
+            是否重新扫描
+        """
+        with self._refresh_lock:
+            signature = self._directory_signature()
+            with self._lock:
+                self._checked_at = time.time()
+                if not force and signature == self._signature:
+                    return False
+                current = dict(self._tracks)
+                old_signature = self._signature
+
+            tags = self._load_tags()
+            tracks: Dict[str, BgmTrack] = {}
+            pending: List[str] = []
+            for name, mtime_ns, size in signature:
+                if name == TAGS_FILE:
+                    continue
+                old = current.get(name)
+                if old and old.analyzed and old.mtime_ns == mtime_ns and old.size == size and not force:
+                    track = replace(old)
+                else:
+                    # 先以未分析状态加入索引（混音使用原文件），分析完成后替换
+                    track = BgmTrack(name=name, path=str(self.bgm_dir / name),
+                                     mtime_ns=mtime_ns, size=size)
+                    pending.append(name)
+                track.mood, track.tempo, track.tags = tags.get(name, ("", None, []))
+                tracks[name] = track
+
+            # 分析完成前仍记录旧签名，中途退出时下次会重新扫描
+            self._swap(dict(tracks), signature if not pending else old_signature)
+            if pending:
+                for name in pending:
+                    analyzed = self._analyze(Path(tracks[name].path), tracks[name].mtime_ns, tracks[name].size)
+                    analyzed.mood, analyzed.tempo, analyzed.tags = tracks[name].mood, tracks[name].tempo, tracks[name].tags
+                    tracks[name] = analyzed
+                self._swap(dict(tracks), signature)
+
+            # 清理已删除或已替换曲目的归一化副本
+            keep = {t.normalized_path for t in tracks.values() if t.normalized_path}
+            for old in current.values():
+                if old.normalized_path and old.normalized_path not in keep:
+                    Path(old.normalized_path).unlink(missing_ok=True)
+
+            print(f"🎵 BGM 曲库已更新: {len(tracks)} 首")
+            return True
+
+    def _swap(self, tracks: Dict[str, BgmTrack], signature: Optional[Tuple]):
+        """换入新索引并落盘"""
+        with self._lock:
+            self._tracks = tracks
+            self._signature = signature
+            self._save_index()
+
+    def _refresh_safely(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"⚠️ BGM 曲库扫描失败: {e}")
+
+    def _refresh_in_background(self):
+        """距上次检查超过 rescan_interval 秒时，在后台线程检查目录变化（不阻塞调用方）"""
+        with self._lock:
+            if time.time() - self._checked_at < self.rescan_interval:
+                return
+            self._checked_at = time.time()
+        if self._refresh_lock.locked():
+            return
+        threading.Thread(target=self._refresh_safely, name="bgm-index", daemon=True).start()
+
+    def _analyze(self, path: Path, mtime_ns: int, size: int) -> BgmTrack:
+        """测量时长和响度，生成归一化副本（FFmpeg 不可用时只记录文件信息）"""
+        track = BgmTrack(name=path.name, path=str(path), mtime_ns=mtime_ns, size=size)
+        if shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None:
+            return track
+
+        track.analyzed = True
+        track.duration = _probe_duration(path)
+        track.loudness = _measure_loudness(path)
+        if track.loudness:
+            key = hash_key(path.name, mtime_ns, size, TARGET_LUFS, TARGET_TP, TARGET_LRA)
+            normalized = self.normalized_dir / f"{key[:16]}.m4a"
+            if normalized.exists() or _normalize(path, normalized, track.loudness):
+                track.normalized_path = str(normalized)
+        print(f"🎵 BGM 分析完成: {path.name}  时长 {track.duration}s  "
+              f"响度 {track.loudness.get('input_i') if track.loudness else '-'} LUFS")
+        return track
+
+    # ── 查询 ─────────────────────────────────────────────────────
+
+    def tracks(self) -> List[BgmTrack]:
+        """所有曲目（按文件名排序），直接读取当前索引"""
+        self._refresh_in_background()
+        with self._lock:
+            return [self._tracks[name] for name in sorted(self._tracks)]
+
+    def select(
+        self,
+        mood: Optional[str] = None,
+        tempo: Optional[int] = None,
+        duration: Optional[float] = None,
+    ) -> Optional[BgmTrack]:
+        """
+        选曲：同样的条件总是选到同一首
+
+        Args:
+            mood: 情绪标签，有匹配的曲目时只在其中选择
+            tempo: 目标 BPM，优先节奏最接近的
+            duration: 视频时长（秒），优先能覆盖整段视频且多余最少的曲目（混音无需 aloop）
+
+        Returns:
+            选中的曲目，曲库为空时返回 None
+        """
+        candidates = self.tracks()
+        if mood:
+            matched = [t for t in candidates if t.mood == mood.lower()]
+            candidates = matched or candidates
+        if not candidates:
+            return None
+
+        def _score(track: BgmTrack):
+            tempo_gap = 0.0
+            if tempo:
+                # 没有节奏标签的曲目排在有标签的之后
+                tempo_gap = abs(track.tempo - tempo) if track.tempo else float("inf")
+            if duration and track.duration:
+                # 能覆盖视频的排前面，其中多余时长越短越好；都不够长时越长越好
+                covers = track.duration >= duration
+                duration_gap = track.duration - duration if covers else duration - track.duration
+                return (tempo_gap, not covers, duration_gap, track.name)
+            return (tempo_gap, bool(duration), 0.0, track.name)
+
+        return min(candidates, key=_score)
+
+
+def _parse_tags(meta) -> Optional[Tuple[str, Optional[int], List[str]]]:
+    """校验单首曲目的标签，返回 (mood, tempo, tags)；格式不对返回 None"""
+    if not isinstance(meta, dict):
+        return None
+    mood = meta.get("mood", "")
+    tempo = meta.get("tempo")
+    tags = meta.get("tags", [])
+    if not isinstance(mood, str):
+        return None
+    if tempo is not None:
+        if isinstance(tempo, bool) or not isinstance(tempo, (int, float, str)):
+            return None
+        try:
+            tempo = int(float(tempo))
+        except ValueError:
+            return None
+        if tempo <= 0:
+            return None
+    if not isinstance(tags, list) or not all(isinstance(t, str) for t in tags):
+        return None
+    return mood.strip().lower(), tempo, tags
+
+
+def _probe_duration(path: Path) -> Optional[float]:
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", str(path)],
+        capture_output=True, text=True,
+    )
+    try:
+        return round(float(result.stdout.strip()), 2)
+    except ValueError:
+        return None
+
+
+def _measure_loudness(path: Path) -> Optional[Dict]:
+    """loudnorm 第一遍：测量积分响度 / 真峰值 / 响度范围"""
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-nostats", "-i", str(path),
+         "-af", f"loudnorm=I={TARGET_LUFS}:TP={TARGET_TP}:LRA={TARGET_LRA}:print_format=json",
+         "-f", "null", "-"],
+        capture_output=True, text=True,
+    )
+    match = re.search(r"\{[^{}]*\"input_i\"[^{}]*\}", result.stderr)
+    if result.returncode != 0 or not match:
+        print(f"⚠️ BGM 响度测量失败: {path.name}")
+        return None
+    try:
+        return json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return None
+
+
+def _normalize(path: Path, output: Path, measured: Dict) -> bool:
+    """loudnorm 第二遍：按测量值线性归一化，输出 AAC 副本"""
+    loudnorm = (
+        f"loudnorm=I={TARGET_LUFS}:TP={TARGET_TP}:LRA={TARGET_LRA}"
+        f":measured_I={measured['input_i']}:measured_TP={measured['input_tp']}"
+        f":measured_LRA={measured['input_lra']}:measured_thresh={measured['input_thresh']}"
+        f":offset={measured['target_offset']}:linear=true"
+    )
+    tmp = output.with_name(f"_tmp_{output.name}")
+    result = subprocess.run(
+        ["ffmpeg", "-y", "-v", "error", "-i", str(path), "-vn", "-af", loudnorm,
+         "-ar", "48000", "-c:a", "aac", "-b:a", "192k", str(tmp)],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        print(f"⚠️ BGM 归一化失败: {path.name}  {result.stderr[-200:]}")
+        tmp.unlink(missing_ok=True)
+        return False
+    os.replace(tmp, output)
+    return True
+
+
+# ── 全局实例 ─────────────────────────────────────────────────────
+
+_library: Optional[BgmLibrary] = None
+_library_lock = threading.Lock()
+
+
+def get_bgm_library() -> BgmLibrary:
+    """获取进程内共享的 BGM 曲库"""
+    global _library
+    with _library_lock:
+        if _library is None:
+            _library = BgmLibrary(rescan_interval=settings.bgm_rescan_interval)
+        return _library
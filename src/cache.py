@@ -0,0 +1,296 @@
+"""
+本地磁盘缓存模块
+功能：
+1. DiskCache  — 按内容哈希缓存 AI 调用结果（JSON），支持 TTL 过期、LRU 淘汰和命中统计
+2. AssetCache — 缓存生成的文件（如 DALL·E 白底图），按总大小淘汰，取用时硬链接到目标路径
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .config import settings
+
+
+def hash_key(*parts: Any) -> str:
+    """将若干部分拼接后计算 SHA-256，作为缓存 key"""
+    hasher = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, bytes):
+            hasher.update(part)
+        else:
+            hasher.update(str(part).encode("utf-8"))
+        hasher.update(b"\x00")
+    return hasher.hexdigest()
+
+
+class DiskCache:
+    """
+    JSON 值的磁盘缓存（线程安全）
+
+    每个条目存为 <cache_dir>/<namespace>/<key[:2]>/<key>.json；
+    读取命中时刷新文件 mtime，超过 max_entries 时按 mtime 淘汰最久未用的条目。
+    """
+
+    def __init__(self, namespace: str, max_entries: int = 1000, ttl: float = 30 * 86400):
+        """
+        Args:
+            namespace: 缓存子目录名
+            max_entries: 最大条目数
+            ttl: 条目有效期（秒），<=0 表示永不过期
+        """
+        self.namespace = namespace
+        self.root = Path(settings.cache_dir) / namespace
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._count = sum(1 for _ in self.root.glob("*/*.json"))
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Any]:
+        """读取缓存，未命中或已过期返回 None"""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        if self.ttl > 0 and time.time() - entry.get("created_at", 0) > self.ttl:
+            self._remove(path)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            os.utime(path, None)   # 刷新 LRU 时间
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return entry.get("value")
+
+    def set(self, key: str, value: Any) -> None:
+        """写入缓存（先写临时文件再原子替换）"""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        existed = path.exists()
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"created_at": time.time(), "value": value}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+        with self._lock:
+            if not existed:
+                self._count += 1
+            need_evict = self._count > self.max_entries
+        if need_evict:
+            self._evict()
+
+    def _remove(self, path: Path):
+        try:
+            path.unlink()
+            with self._lock:
+                self._count -= 1
+        except OSError:
+            pass
+
+    def _evict(self):
+        """按 mtime 淘汰最久未使用的条目，直到数量降到上限的 90%"""
+        entries = []
+        for p in self.root.glob("*/*.json"):
+            try:
+                entries.append((p.stat().st_mtime, p))
+            except OSError:
+                pass
+        entries.sort()
+        target = int(self.max_entries * 0.9)
+        with self._lock:
+            self._count = len(entries)
+        for _, p in entries[:max(len(entries) - target, 0)]:
+            self._remove(p)
+
+    def clear(self) -> None:
+        """清空本命名空间下所有条目"""
+        for p in self.root.glob("*/*.json"):
+            self._remove(p)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": self._count,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+class AssetCache:
+    """
+    生成文件的磁盘缓存（线程安全）
+
+    每个条目为 <cache_dir>/<namespace>/<key><suffix> 文件加一个 <key>.json 元数据；
+    命中时优先硬链接到目标路径（跨分区时退化为复制），
+    总大小超过 max_bytes 时按 mtime 淘汰最久未用的文件。
+    """
+
+    def __init__(self, namespace: str, max_bytes: int, suffix: str = ".png"):
+        """
+        Args:
+            namespace: 缓存子目录名
+            max_bytes: 缓存文件总大小上限（字节）
+            suffix: 缓存文件扩展名
+        """
+        self.namespace = namespace
+        self.root = Path(settings.cache_dir) / namespace
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max(0, max_bytes)
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._total = sum(p.stat().st_size for p in self.root.glob(f"*{suffix}"))
+
+    def _file(self, key: str) -> Path:
+        return self.root / f"{key}{self.suffix}"
+
+    def _meta(self, key: str) -> Path:
+        return self.root / f"{key}.json"
+
+    def get(self, key: str, dest_path: str) -> Optional[Dict]:
+        """
+        命中时将缓存文件放到 dest_path 并返回元数据，未命中返回 None
+        """
+        src = self._file(key)
+        if not src.exists():
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            meta = json.loads(self._meta(key).read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            meta = {}
+
+        _place(src, Path(dest_path))
+        try:
+            os.utime(src, None)   # 刷新 LRU 时间
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return meta
+
+    def put(self, key: str, src_path: str, meta: Optional[Dict] = None) -> None:
+        """将已生成的文件存入缓存（不移动原文件）"""
+        dest = self._file(key)
+        if dest.exists():
+            return
+        tmp = dest.with_suffix(f".{threading.get_ident()}.tmp")
+        shutil.copy2(src_path, tmp)
+        os.replace(tmp, dest)
+        self._meta(key).write_text(
+            json.dumps({"created_at": time.time(), **(meta or {})}, ensure_ascii=False),
+            encoding="utf-8",
+        )
+
+        with self._lock:
+            self._total += dest.stat().st_size
+            need_evict = self.max_bytes and self._total > self.max_bytes
+        if need_evict:
+            self._evict()
+
+    def _evict(self):
+        """按 mtime 淘汰最久未使用的文件，直到总大小降到上限的 90%"""
+        entries = []
+        for p in self.root.glob(f"*{self.suffix}"):
+            try:
+                st = p.stat()
+                entries.append((st.st_mtime, st.st_size, p))
+            except OSError:
+                pass
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        for _, size, p in entries:
+            if total <= target:
+                break
+            try:
+                p.unlink()
+                p.with_suffix(".json").unlink(missing_ok=True)
+                total -= size
+            except OSError:
+                pass
+        with self._lock:
+            self._total = total
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+def _place(src: Path, dest: Path) -> None:
+    """将缓存文件放到目标路径：优先硬链接，失败时复制"""
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    dest.unlink(missing_ok=True)
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+
+# ── 全局缓存注册表 ───────────────────────────────────────────────
+
+# DiskCache 与 AssetCache 分开登记，同名命名空间不会互相返回错误类型的实例
+_caches: Dict[str, DiskCache] = {}
+_asset_caches: Dict[str, "AssetCache"] = {}
+_registry_lock = threading.Lock()
+
+
+def get_cache(namespace: str, max_entries: int = 1000, ttl: float = 30 * 86400) -> DiskCache:
+    """获取（或创建）指定命名空间的进程内共享缓存"""
+    with _registry_lock:
+        cache = _caches.get(namespace)
+        if cache is None:
+            cache = DiskCache(namespace, max_entries=max_entries, ttl=ttl)
+            _caches[namespace] = cache
+        return cache
+
+
+def get_asset_cache(namespace: str, max_bytes: int, suffix: str = ".png") -> AssetCache:
+    """获取（或创建）指定命名空间的进程内共享文件缓存"""
+    with _registry_lock:
+        cache = _asset_caches.get(namespace)
+        if cache is None:
+            cache = AssetCache(namespace, max_bytes=max_bytes, suffix=suffix)
+            _asset_caches[namespace] = cache
+        return cache
+
+
+def cache_stats() -> Dict[str, Dict]:
+    """返回所有已创建缓存的统计信息（文件缓存与 JSON 缓存同名时加 asset: 前缀）"""
+    with _registry_lock:
+        stats = {name: c.stats() for name, c in _caches.items()}
+        for name, c in _asset_caches.items():
+            stats[f"asset:{name}" if name in stats else name] = c.stats()
+        return stats
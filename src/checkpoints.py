@@ -0,0 +1,73 @@
+"""
+任务检查点模块
+功能：把 run_pipeline 每一步的产出记录到 <output_dir>/<job_id>/checkpoint.json，
+重试或服务重启后从第一个未完成的步骤继续，不重复调用 GPT-4o / DALL·E / 视频生成
+"""
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+CHECKPOINT_FILE = "checkpoint.json"
+
+
+class Checkpoint:
+    """
+    单个任务的检查点（线程安全）
+
+    记录的键：
+        request     — 任务参数（产品名、卖点、视频服务等，重试时使用）
+        source_image — 原始上传图片的副本
+        analysis    — GPT-4o 图片分析结果
+        white_bg    — 白底图路径
+        script / video_prompt — 视频脚本和 Prompt
+        task_id / backend     — 已创建的视频生成任务（重试时继续轮询，而不是重新生成）
+        task_created_at       — 视频任务提交时间（继续轮询时已耗时和 ETA 从此刻计算）
+        raw_video   — 已下载的原始视频 {"path", "size", "sha256"}
+    """
+
+    def __init__(self, job_dir: Path):
+        self.path = Path(job_dir) / CHECKPOINT_FILE
+        self._lock = threading.Lock()
+        try:
+            self._data: Dict[str, Any] = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            self._data = {}
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            return self._data.get(key, default)
+
+    def has(self, *keys: str) -> bool:
+        """所有键都已记录"""
+        with self._lock:
+            return all(self._data.get(k) not in (None, "") for k in keys)
+
+    def file(self, key: str) -> Optional[Path]:
+        """读取记录的文件路径（支持 {"path": ...} 形式），文件已不存在时返回 None"""
+        value = self.get(key)
+        if isinstance(value, dict):
+            value = value.get("path")
+        if value and Path(value).exists():
+            return Path(value)
+        return None
+
+    def save(self, **values: Any) -> None:
+        """记录若干步骤产出并立即落盘（先写临时文件再原子替换）"""
+        with self._lock:
+            self._data.update(values)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self._data, ensure_ascii=False, indent=2), encoding="utf-8")
+            os.replace(tmp, self.path)
+
+    def discard(self, *keys: str) -> None:
+        """删除若干记录（如视频任务已失效时清除 task_id）"""
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+        self.save()
+
+    def exists(self) -> bool:
+        return self.path.exists()
@@ -9,11 +9,13 @@ from typing import List, Optional
 from openai import OpenAI
 
 from .config import settings
+from .http_clients import OPENAI_BASE_URL, get_client
+from .llm_cache import chat_completion
 from .utils import parse_json_response
 
 
 def _client() -> OpenAI:
-    return OpenAI(api_key=settings.openai_api_key)
+    return OpenAI(api_key=settings.openai_api_key, http_client=get_client(OPENAI_BASE_URL))
 
 
 # ── 1. AI 卖点建议 ────────────────────────────────────────────
@@ -23,6 +25,7 @@ def suggest_selling_points(
     product_name: str,
     existing_points: Optional[List[str]] = None,
     product_description: str = "",
+    use_cache: bool = True,
 ) -> dict:
     """
     根据产品信息，用 GPT-4o 生成/补充卖点建议
@@ -31,6 +34,7 @@ def suggest_selling_points(
         product_name: 产品名称
         existing_points: 已有卖点（可为空）
         product_description: 产品描述（可选）
+        use_cache: 是否使用 LLM 响应缓存
 
     Returns:
         {
@@ -68,13 +72,14 @@ def suggest_selling_points(
 }}"""
 
     try:
-        resp = _client().chat.completions.create(
+        text = chat_completion(
+            _client(),
+            use_cache=use_cache,
             model="gpt-4o",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.8,
             max_tokens=512,
         )
-        text = resp.choices[0].message.content or ""
         data = parse_json_response(text)
 
         if isinstance(data, dict) and "suggestions" in data:
@@ -97,12 +102,13 @@ def suggest_selling_points(
 # ── 2. 竞品文案分析 ───────────────────────────────────────────
 
 
-def analyze_competitor_text(competitor_text: str) -> dict:
+def analyze_competitor_text(competitor_text: str, use_cache: bool = True) -> dict:
     """
     分析竞品视频文案，提取可借鉴的卖点和表达方式
 
     Args:
         competitor_text: 竞品文案（标题 / 描述 / 评论等）
+        use_cache: 是否使用 LLM 响应缓存
 
     Returns:
         {
@@ -150,13 +156,14 @@ def analyze_competitor_text(competitor_text: str) -> dict:
 - summary：不超过 30 字"""
 
     try:
-        resp = _client().chat.completions.create(
+        text = chat_completion(
+            _client(),
+            use_cache=use_cache,
             model="gpt-4o",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.7,
             max_tokens=512,
         )
-        text = resp.choices[0].message.content or ""
         data = parse_json_response(text)
 
         if isinstance(data, dict):
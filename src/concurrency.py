@@ -0,0 +1,113 @@
+"""
+并发控制模块
+功能：
+1. 按后端（Seedance / Creatok / OpenAI）限制同时进行的请求数
+2. 可选的每分钟请求数限制（滑动窗口）
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Optional
+
+from .config import settings
+
+
+class BackendLimiter:
+    """单个后端的并发 + 速率限制器（线程安全）"""
+
+    def __init__(self, name: str, max_concurrency: int, rate_per_minute: int = 0):
+        """
+        Args:
+            name: 后端名称（seedance / creatok / openai）
+            max_concurrency: 最大并发数（<=0 视为 1）
+            rate_per_minute: 每分钟最多发起的请求数，0 表示不限制
+        """
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.rate_per_minute = max(0, rate_per_minute)
+        self._sem = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+        self._starts: Deque[float] = deque()
+        self._active = 0
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def _wait_for_rate_slot(self):
+        """速率限制：最近 60 秒内的请求数达到上限时等待最早一条过期"""
+        if not self.rate_per_minute:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._starts and now - self._starts[0] >= 60:
+                    self._starts.popleft()
+                if len(self._starts) < self.rate_per_minute:
+                    self._starts.append(now)
+                    return
+                wait = 60 - (now - self._starts[0])
+            time.sleep(max(wait, 0.05))
+
+    @contextmanager
+    def acquire(self):
+        """占用一个并发名额（with 语句块结束后释放）"""
+        self._sem.acquire()
+        try:
+            self._wait_for_rate_slot()
+            with self._lock:
+                self._active += 1
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self._active -= 1
+        finally:
+            self._sem.release()
+
+    def stats(self) -> Dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "rate_per_minute": self.rate_per_minute,
+            "active": self._active,
+        }
+
+
+# ── 全局限制器注册表 ─────────────────────────────────────────────
+
+_limiters: Dict[str, BackendLimiter] = {}
+_registry_lock = threading.Lock()
+
+
+def _limits_for(name: str) -> tuple:
+    """从 config.settings 读取某个后端的并发 / 速率配置"""
+    max_concurrency = getattr(settings, f"{name}_max_concurrency", 2)
+    rate_per_minute = getattr(settings, f"{name}_rate_per_minute", 0)
+    return max_concurrency, rate_per_minute
+
+
+def get_limiter(name: str) -> BackendLimiter:
+    """获取（或创建）指定后端的全局限制器，同一进程内共享"""
+    with _registry_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            max_concurrency, rate_per_minute = _limits_for(name)
+            limiter = BackendLimiter(name, max_concurrency, rate_per_minute)
+            _limiters[name] = limiter
+        return limiter
+
+
+def limiter_stats() -> Dict[str, Dict]:
+    """返回所有已创建限制器的运行状态"""
+    with _registry_lock:
+        return {name: l.stats() for name, l in _limiters.items()}
+
+
+def reset_limiters(name: Optional[str] = None) -> None:
+    """丢弃限制器，下次 get_limiter 时按最新配置重建"""
+    with _registry_lock:
+        if name is None:
+            _limiters.clear()
+        else:
+            _limiters.pop(name, None)
@@ -19,14 +19,84 @@ class Settings(BaseSettings):
     seedance_model_id: str = "doubao-seedance-1-0-lite-i2v-250428"
     seedance_api_url: str = "https://ark.cn-beijing.volces.com/api/v3"
 
+    # 视频任务轮询（自适应间隔上下限；*_expected_seconds 为无进度时的预估耗时）
+    poll_min_interval: float = 2.0
+    poll_max_interval: float = 20.0
+    seedance_expected_seconds: int = 120
+    creatok_expected_seconds: int = 180
+
+    # HTTP 连接池（按上游主机共享；安装 h2 后自动启用 HTTP/2）
+    http2_enabled: bool = True
+    http_max_connections: int = 100
+    http_max_keepalive: int = 20
+    http_keepalive_expiry: float = 30.0
+
+    # 脚本 + Prompt 生成模式：two_call（脚本、Prompt 分两次调用，默认）或 fused（一次调用，需显式开启）
+    prompt_mode: str = "two_call"
+
+    # 后处理模式：single_pass（字幕 + BGM 一次 FFmpeg 完成）或 multi_pass（逐步处理，经临时文件）
+    postprocess_mode: str = "single_pass"
+    # 后处理编码档位：fast-preview / tiktok-upload / archive（见 post_processor.ENCODE_PROFILES）
+    encode_profile: str = "tiktok-upload"
+    # 字幕引擎：drawtext（逐条 drawtext 滤镜）、ass（.ass 文件 + subtitles 滤镜）或 overlay（Pillow 预渲染字幕卡）
+    subtitle_engine: str = "drawtext"
+    # 同时运行的后处理 FFmpeg 进程数上限（0 = 按 CPU 核数自动决定）
+    postprocess_workers: int = 0
+    # BGM 选曲情绪（对应 static/bgm/tags.json 中的 mood，留空不限）；曲库目录变化的检查间隔（秒）
+    bgm_mood: str = ""
+    bgm_rescan_interval: float = 10.0
+
     # 路径配置
     output_dir: Path = Path("./output")
     temp_dir: Path = Path("./temp")
+    cache_dir: Path = Path("./cache")
+
+    # 缓存（GPT-4o 图片分析结果，按图片内容哈希）
+    analysis_cache_max_entries: int = 2000
+    analysis_cache_ttl_days: int = 30
+    # DALL·E 白底图缓存总大小上限（MB）
+    asset_cache_max_mb: int = 500
+    # LLM 响应缓存（脚本 / Prompt / 卖点建议 / 竞品分析）
+    llm_cache_enabled: bool = True
+    llm_cache_max_entries: int = 5000
+    llm_cache_ttl_days: int = 7
+
+    # 任务状态写入：合并同一任务的更新，按间隔批量落库（秒）；成功 / 失败状态立即落库
+    job_journal_flush_interval: float = 0.5
+
+    # 流水线各阶段并发数（图片处理 / 脚本生成 / 视频任务提交 / 原始视频下载 / FFmpeg 后处理）与阶段间队列长度
+    # 视频阶段只提交任务，等待完成由共享轮询器负责，在途视频任务数不受这里的线程数限制
+    pipeline_image_workers: int = 4
+    pipeline_prompt_workers: int = 4
+    pipeline_video_workers: int = 4
+    pipeline_download_workers: int = 4
+    pipeline_post_workers: int = 2
+    pipeline_queue_size: int = 8
+
+    # 任务实时状态存储：memory（单进程）或 sqlite（uvicorn --workers N 多进程共享）
+    job_state_backend: str = "memory"
+    job_state_path: Path = Path("./data/job_state.db")
+
+    # 持久化任务队列：工作线程数、租约时长（秒，心跳每 1/3 租约续约一次）、崩溃后最多重试次数
+    queue_workers: int = 4
+    queue_lease_seconds: float = 60.0
+    queue_max_attempts: int = 3
 
     # 服务配置
     host: str = "0.0.0.0"
     port: int = 8000
 
+    # 批量并发（按后端限制同时进行的请求数；rate_per_minute=0 表示不限速）
+    # batch_runner_workers 为同时执行的批量任务数（独立线程池，不占用队列工作线程）
+    batch_max_workers: int = 8
+    batch_runner_workers: int = 2
+    seedance_max_concurrency: int = 4
+    seedance_rate_per_minute: int = 0
+    creatok_max_concurrency: int = 2
+    creatok_rate_per_minute: int = 0
+    openai_max_concurrency: int = 4
+    openai_rate_per_minute: int = 0
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -38,3 +108,4 @@ settings = Settings()
 # 确保目录存在
 settings.output_dir.mkdir(parents=True, exist_ok=True)
 settings.temp_dir.mkdir(parents=True, exist_ok=True)
+settings.cache_dir.mkdir(parents=True, exist_ok=True)
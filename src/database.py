@@ -1,19 +1,38 @@
 """
 数据库模块
 功能：使用 SQLite 持久化存储任务记录，服务器重启后历史不丢失
+（WAL 模式 + 有界连接池，表结构只在启动时创建一次）
 """
 import json
+import queue
 import sqlite3
+import threading
 import time
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional, List, Dict
+from typing import Callable, Optional, List, Dict, Tuple
 
 DB_PATH = Path(__file__).parent.parent / "data" / "jobs.db"
 
+# 连接池上限（同时借出的连接数）
+POOL_SIZE = 8
 
-def _init_db(conn: sqlite3.Connection):
-    """初始化数据库表结构"""
+# 每个连接打开后执行的 PRAGMA：WAL 允许读写并发，synchronous=NORMAL 在 WAL 下仍保证崩溃一致性
+_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-8000",      # 约 8 MB 页缓存
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+
+# ── 表结构迁移 ─────────────────────────────────────────────────
+# 版本号记录在 PRAGMA user_version 中；启动时按顺序执行尚未应用的迁移，
+# 每个迁移在独立事务中执行。新增表结构变更时只追加，不要修改已发布的迁移。
+
+
+def _m001_base_tables(conn: sqlite3.Connection):
     conn.execute("""
         CREATE TABLE IF NOT EXISTS jobs (
             job_id      TEXT PRIMARY KEY,
@@ -39,20 +58,278 @@ def _init_db(conn: sqlite3.Connection):
             updated_at  REAL NOT NULL
         )
     """)
-    conn.commit()
+
+
+def _m002_history_indexes(conn: sqlite3.Connection):
+    # has_video 随 video_path 一起维护，旧数据按文件是否存在回填一次
+    columns = {r[1] for r in conn.execute("PRAGMA table_info(jobs)")}
+    if "has_video" not in columns:
+        conn.execute("ALTER TABLE jobs ADD COLUMN has_video INTEGER NOT NULL DEFAULT 0")
+        rows = conn.execute(
+            "SELECT job_id, video_path FROM jobs WHERE video_path IS NOT NULL AND video_path != ''"
+        ).fetchall()
+        conn.executemany(
+            "UPDATE jobs SET has_video = 1 WHERE job_id = ?",
+            [(r[0],) for r in rows if Path(r[1]).exists()],
+        )
+    # 历史列表：按 (created_at, job_id) 倒序做游标分页，筛选条件各有复合索引
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs (created_at, job_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at, job_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_service ON jobs (video_service, created_at, job_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_product ON jobs (product_name, created_at)")
+
+
+def _m003_batches(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE batches (
+            batch_id    TEXT PRIMARY KEY,
+            status      TEXT NOT NULL DEFAULT 'pending',
+            video_service TEXT DEFAULT 'seedance',
+            add_subtitle INTEGER DEFAULT 0,
+            add_bgm     INTEGER DEFAULT 0,
+            reference_image_path TEXT DEFAULT '',
+            total       INTEGER NOT NULL DEFAULT 0,
+            completed   INTEGER NOT NULL DEFAULT 0,
+            failed      INTEGER NOT NULL DEFAULT 0,
+            created_at  REAL NOT NULL,
+            updated_at  REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX idx_batches_created ON batches (created_at)")
+    conn.execute("CREATE INDEX idx_batches_status ON batches (status, created_at)")
+    conn.execute("""
+        CREATE TABLE batch_items (
+            item_id     TEXT PRIMARY KEY,
+            batch_id    TEXT NOT NULL REFERENCES batches (batch_id) ON DELETE CASCADE,
+            position    INTEGER NOT NULL,
+            product_name TEXT NOT NULL,
+            selling_points TEXT NOT NULL DEFAULT '[]',
+            status      TEXT NOT NULL DEFAULT 'pending',
+            error       TEXT DEFAULT '',
+            video_path  TEXT DEFAULT '',
+            updated_at  REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX idx_batch_items_batch ON batch_items (batch_id, position)")
+    conn.execute("CREATE INDEX idx_batch_items_status ON batch_items (batch_id, status)")
+
+
+def _m004_assets(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE assets (
+            asset_id    INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id      TEXT NOT NULL,
+            kind        TEXT NOT NULL,
+            path        TEXT NOT NULL,
+            size        INTEGER,
+            sha256      TEXT,
+            created_at  REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX idx_assets_job ON assets (job_id, kind)")
+    conn.execute("CREATE INDEX idx_assets_sha256 ON assets (sha256)")
+
+
+def _m005_job_queue(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE job_queue (
+            entry_id    TEXT PRIMARY KEY,
+            kind        TEXT NOT NULL,
+            ref_id      TEXT NOT NULL,
+            payload     TEXT NOT NULL DEFAULT '{}',
+            status      TEXT NOT NULL DEFAULT 'queued',
+            attempts    INTEGER NOT NULL DEFAULT 0,
+            lease_owner TEXT,
+            lease_expires REAL,
+            error       TEXT,
+            created_at  REAL NOT NULL,
+            updated_at  REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX idx_job_queue_status ON job_queue (status, created_at)")
+    conn.execute("CREATE INDEX idx_job_queue_ref ON job_queue (kind, ref_id)")
+
+
+def _m006_job_timings(conn: sqlite3.Connection):
+    # 各步骤耗时 JSON：{"analysis": {"start": 0.0, "seconds": 6.1}, ...}
+    conn.execute("ALTER TABLE jobs ADD COLUMN timings TEXT")
+
+
+# (版本号, 说明, 迁移函数)
+MIGRATIONS = (
+    (1, "jobs / settings 基础表", _m001_base_tables),
+    (2, "历史查询索引 + has_video 列", _m002_history_indexes),
+    (3, "批量任务表 batches / batch_items", _m003_batches),
+    (4, "产物记录表 assets", _m004_assets),
+    (5, "持久化任务队列 job_queue", _m005_job_queue),
+    (6, "任务步骤耗时 timings 列", _m006_job_timings),
+)
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def _migrate(conn: sqlite3.Connection) -> int:
+    """
+    执行尚未应用的迁移
+
+    Returns:
+        迁移后的版本号
+    """
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version, description, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        conn.execute("BEGIN")
+        try:
+            migrate(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        print(f"🗄️ 数据库迁移 v{version}: {description}")
+        current = version
+    return current
+
+
+def open_connection(path: Path) -> sqlite3.Connection:
+    """打开一个已设置 WAL 等 PRAGMA 的连接（可跨线程使用）"""
+    conn = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys=ON")
+    for pragma in _PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def _connect() -> sqlite3.Connection:
+    return open_connection(DB_PATH)
+
+
+class ConnectionPool:
+    """
+    有界连接池（connect 为新建连接的函数）
+
+    同一线程内嵌套调用 get_conn 复用同一个连接；
+    空闲连接放回池中供其他线程复用，借出数量达到上限时等待。
+    close_all 只关闭空闲连接并递增代数，之前借出的连接归还时直接关闭，不再放回池中。
+    """
+
+    def __init__(self, size: int, connect: Callable[[], sqlite3.Connection]):
+        self.size = size
+        self._connect = connect
+        self._idle: "queue.LifoQueue[Tuple[int, sqlite3.Connection]]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._local = threading.local()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            self._local.depth += 1
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+
+        self._slots.acquire()
+        try:
+            with self._lock:
+                generation = self._generation
+            try:
+                generation, conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            self._local.conn, self._local.depth = conn, 0
+            try:
+                yield conn
+            finally:
+                self._local.conn = None
+                self._return(generation, conn)
+        finally:
+            self._slots.release()
+
+    def _return(self, generation: int, conn: sqlite3.Connection):
+        with self._lock:
+            current = generation == self._generation
+            if current:
+                try:
+                    if conn.in_transaction:
+                        conn.rollback()
+                except sqlite3.Error:
+                    current = False
+                else:
+                    self._idle.put((generation, conn))
+        if not current:
+            # close_all 之后归还的连接（或已损坏的连接）直接关闭
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def close_all(self):
+        with self._lock:
+            self._generation += 1
+            idle = []
+            while True:
+                try:
+                    idle.append(self._idle.get_nowait()[1])
+                except queue.Empty:
+                    break
+        for conn in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+_pool = ConnectionPool(POOL_SIZE, _connect)
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def init_db() -> None:
+    """执行表结构迁移（进程内只执行一次，服务启动时调用）"""
+    global _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = _connect()
+        try:
+            _migrate(conn)
+        finally:
+            conn.close()
+        _initialized = True
 
 
 @contextmanager
 def get_conn():
-    """数据库连接上下文管理器"""
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(str(DB_PATH), check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    try:
-        _init_db(conn)
+    """从连接池借出一个数据库连接（上下文结束后归还）"""
+    init_db()
+    with _pool.connection() as conn:
         yield conn
-    finally:
-        conn.close()
+
+
+def close_all() -> None:
+    """关闭池中所有连接；之后的 get_conn 会按当前 DB_PATH 重新迁移和连接"""
+    global _initialized
+    _pool.close_all()
+    _initialized = False
+
+
+# 列表 / 状态查询只取这些列，不读取 script、video_prompt 大字段
+SUMMARY_COLUMNS = (
+    "job_id", "product_name", "status", "step", "step_name", "video_service",
+    "video_path", "error", "add_subtitle", "add_bgm", "has_video",
+    "created_at", "updated_at",
+)
+_SUMMARY_SELECT = ", ".join(SUMMARY_COLUMNS)
 
 
 # ── CRUD 操作 ──────────────────────────────────────────────────
@@ -82,27 +359,55 @@ def create_job(
         conn.commit()
 
 
+def _update_statement(job_id: str, fields: Dict):
+    """生成 UPDATE 语句和参数（script / timings 字典序列化为 JSON）"""
+    fields = dict(fields)
+    fields["updated_at"] = time.time()
+    # 写入视频路径时同步维护 has_video，列表查询无需逐行检查文件
+    if "video_path" in fields and "has_video" not in fields:
+        fields["has_video"] = 1 if fields["video_path"] else 0
+
+    # 将 script/video_prompt 序列化为 JSON 字符串
+    if "script" in fields and isinstance(fields["script"], dict):
+        fields["script"] = json.dumps(fields["script"], ensure_ascii=False)
+    if "timings" in fields and isinstance(fields["timings"], dict):
+        fields["timings"] = json.dumps(fields["timings"])
+
+    columns = ", ".join(f"{k} = ?" for k in fields)
+    values = list(fields.values()) + [job_id]
+    return f"UPDATE jobs SET {columns} WHERE job_id = ?", values
+
+
 def update_job(job_id: str, **kwargs) -> None:
     """更新任务字段（只更新传入的字段）"""
     if not kwargs:
         return
 
-    kwargs["updated_at"] = time.time()
+    sql, values = _update_statement(job_id, kwargs)
+    with get_conn() as conn:
+        conn.execute(sql, values)
+        conn.commit()
 
-    # 将 script/video_prompt 序列化为 JSON 字符串
-    if "script" in kwargs and isinstance(kwargs["script"], dict):
-        kwargs["script"] = json.dumps(kwargs["script"], ensure_ascii=False)
 
-    columns = ", ".join(f"{k} = ?" for k in kwargs)
-    values = list(kwargs.values()) + [job_id]
+def update_jobs_many(updates: Dict[str, Dict]) -> None:
+    """
+    在同一个事务中批量更新多个任务
+
+    Args:
+        updates: {job_id: {字段: 值}}
+    """
+    updates = {job_id: fields for job_id, fields in updates.items() if fields}
+    if not updates:
+        return
 
     with get_conn() as conn:
-        conn.execute(f"UPDATE jobs SET {columns} WHERE job_id = ?", values)
+        for job_id, fields in updates.items():
+            conn.execute(*_update_statement(job_id, fields))
         conn.commit()
 
 
 def get_job(job_id: str) -> Optional[Dict]:
-    """查询单个任务"""
+    """查询单个任务（含 script / video_prompt，用于详情）"""
     with get_conn() as conn:
         row = conn.execute(
             "SELECT * FROM jobs WHERE job_id = ?", (job_id,)
@@ -114,15 +419,106 @@ def get_job(job_id: str) -> Optional[Dict]:
     return _row_to_dict(row)
 
 
+def get_job_summary(job_id: str) -> Optional[Dict]:
+    """查询单个任务的状态字段（不读取 script / video_prompt）"""
+    with get_conn() as conn:
+        row = conn.execute(
+            f"SELECT {_SUMMARY_SELECT} FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+    return _row_to_dict(row) if row else None
+
+
 def list_jobs(limit: int = 50) -> List[Dict]:
-    """获取最近的任务列表（按创建时间倒序）"""
+    """获取最近的任务列表（按创建时间倒序，不含 script / video_prompt）"""
+    return query_jobs(limit=limit)["items"]
+
+
+def query_jobs(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    video_service: Optional[str] = None,
+    product_prefix: Optional[str] = None,
+    created_from: Optional[float] = None,
+    created_to: Optional[float] = None,
+) -> Dict:
+    """
+    按创建时间倒序分页查询任务（游标分页，深翻页不退化）
+
+    只查询 SUMMARY_COLUMNS，需要脚本时用 get_job 按需加载。
+
+    Args:
+        limit: 每页条数
+        cursor: 上一页返回的 next_cursor
+        status: 按状态筛选
+        video_service: 按视频服务筛选
+        product_prefix: 产品名前缀
+        created_from: 创建时间下限（Unix 时间戳，含）
+        created_to: 创建时间上限（Unix 时间戳，不含）
+
+    Returns:
+        {"items": [...], "next_cursor": 下一页游标，没有更多时为 None}
+    """
+    where, params = [], []
+    if status:
+        where.append("status = ?")
+        params.append(status)
+    if video_service:
+        where.append("video_service = ?")
+        params.append(video_service)
+    if product_prefix:
+        # 前缀匹配改写为范围查询，可走索引
+        where.append("product_name >= ? AND product_name < ?")
+        params += [product_prefix, product_prefix + "\U0010ffff"]
+    if created_from is not None:
+        where.append("created_at >= ?")
+        params.append(created_from)
+    if created_to is not None:
+        where.append("created_at < ?")
+        params.append(created_to)
+    if cursor:
+        created_at, job_id = decode_cursor(cursor)
+        where.append("(created_at, job_id) < (?, ?)")
+        params += [created_at, job_id]
+
+    sql = f"SELECT {_SUMMARY_SELECT} FROM jobs"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY created_at DESC, job_id DESC LIMIT ?"
+    params.append(limit + 1)
+
     with get_conn() as conn:
-        rows = conn.execute(
-            "SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?",
-            (limit,)
-        ).fetchall()
+        rows = conn.execute(sql, params).fetchall()
+
+    items = [_row_to_dict(r) for r in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor(last["created_at"], last["job_id"])
+    return {"items": items, "next_cursor": next_cursor}
 
-    return [_row_to_dict(r) for r in rows]
+
+def encode_cursor(created_at: float, job_id: str) -> str:
+    """分页游标：<created_at>:<job_id>"""
+    return f"{created_at!r}:{job_id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    """解析分页游标，格式错误抛出 ValueError"""
+    created_at, sep, job_id = cursor.partition(":")
+    if not sep or not job_id:
+        raise ValueError(f"无效的分页游标: {cursor}")
+    return float(created_at), job_id
+
+
+def set_has_video(job_id: str, has_video: bool) -> None:
+    """视频文件被创建或删除时更新 has_video 标记"""
+    with get_conn() as conn:
+        conn.execute(
+            "UPDATE jobs SET has_video = ? WHERE job_id = ?",
+            (1 if has_video else 0, job_id),
+        )
+        conn.commit()
 
 
 def get_setting(key: str) -> Optional[str]:
@@ -157,27 +553,347 @@ def list_settings() -> Dict[str, str]:
 
 
 def delete_job(job_id: str) -> bool:
-    """删除任务记录，返回是否删除成功"""
+    """删除任务记录（及其产物记录），返回是否删除成功"""
     with get_conn() as conn:
         cursor = conn.execute(
             "DELETE FROM jobs WHERE job_id = ?", (job_id,)
         )
+        conn.execute("DELETE FROM assets WHERE job_id = ?", (job_id,))
+        conn.commit()
+        return cursor.rowcount > 0
+
+
+# ── 批量任务 ───────────────────────────────────────────────────
+
+
+def create_batch(
+    batch_id: str,
+    items: List[Dict],
+    video_service: str = "seedance",
+    add_subtitle: bool = False,
+    add_bgm: bool = False,
+    reference_image_path: str = "",
+) -> None:
+    """
+    创建批量任务及其全部条目（同一事务）
+
+    Args:
+        items: [{"item_id": ..., "product_name": ..., "selling_points": [...]}, ...]
+    """
+    now = time.time()
+    with get_conn() as conn:
+        conn.execute(
+            """
+            INSERT INTO batches (batch_id, video_service, add_subtitle, add_bgm,
+                                 reference_image_path, total, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (batch_id, video_service, 1 if add_subtitle else 0, 1 if add_bgm else 0,
+             reference_image_path, len(items), now, now),
+        )
+        conn.executemany(
+            """
+            INSERT INTO batch_items (item_id, batch_id, position, product_name,
+                                     selling_points, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (item["item_id"], batch_id, pos, item["product_name"],
+                 json.dumps(item.get("selling_points", []), ensure_ascii=False), now)
+                for pos, item in enumerate(items)
+            ],
+        )
+        conn.commit()
+
+
+def update_batch(batch_id: str, **kwargs) -> None:
+    """更新批量任务字段（status / completed / failed）"""
+    if not kwargs:
+        return
+    kwargs["updated_at"] = time.time()
+    columns = ", ".join(f"{k} = ?" for k in kwargs)
+    with get_conn() as conn:
+        conn.execute(
+            f"UPDATE batches SET {columns} WHERE batch_id = ?",
+            list(kwargs.values()) + [batch_id],
+        )
+        conn.commit()
+
+
+def update_batch_item(item_id: str, **kwargs) -> None:
+    """更新批量条目字段（status / error / video_path）"""
+    if not kwargs:
+        return
+    kwargs["updated_at"] = time.time()
+    columns = ", ".join(f"{k} = ?" for k in kwargs)
+    with get_conn() as conn:
+        conn.execute(
+            f"UPDATE batch_items SET {columns} WHERE item_id = ?",
+            list(kwargs.values()) + [item_id],
+        )
+        conn.commit()
+
+
+def get_batch(batch_id: str) -> Optional[Dict]:
+    """查询批量任务及其条目（按提交顺序），不存在返回 None"""
+    with get_conn() as conn:
+        row = conn.execute(
+            "SELECT * FROM batches WHERE batch_id = ?", (batch_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        item_rows = conn.execute(
+            """
+            SELECT item_id, product_name, selling_points, status, error, video_path
+            FROM batch_items WHERE batch_id = ? ORDER BY position
+            """,
+            (batch_id,),
+        ).fetchall()
+
+    batch = dict(row)
+    batch["add_subtitle"] = bool(batch["add_subtitle"])
+    batch["add_bgm"] = bool(batch["add_bgm"])
+    batch["items"] = []
+    for r in item_rows:
+        item = dict(r)
+        item["selling_points"] = json.loads(item["selling_points"] or "[]")
+        batch["items"].append(item)
+    return batch
+
+
+# ── 产物记录 ───────────────────────────────────────────────────
+
+
+def add_asset(
+    job_id: str,
+    kind: str,
+    path: str,
+    size: Optional[int] = None,
+    sha256: Optional[str] = None,
+) -> None:
+    """
+    记录任务生成的文件
+
+    Args:
+        job_id: 任务 ID（单条任务或批量条目 ID）
+        kind: 产物类型，如 white_bg / video
+        path: 文件路径
+        size: 文件大小（字节），为空时读取文件大小
+        sha256: 文件内容摘要（可选）
+    """
+    if size is None:
+        try:
+            size = Path(path).stat().st_size
+        except OSError:
+            size = None
+    with get_conn() as conn:
+        conn.execute(
+            """
+            INSERT INTO assets (job_id, kind, path, size, sha256, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (job_id, kind, path, size, sha256, time.time()),
+        )
+        conn.commit()
+
+
+def list_assets(job_id: str) -> List[Dict]:
+    """查询任务的全部产物记录"""
+    with get_conn() as conn:
+        rows = conn.execute(
+            "SELECT kind, path, size, sha256, created_at FROM assets WHERE job_id = ? ORDER BY asset_id",
+            (job_id,),
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+# ── 任务队列 ───────────────────────────────────────────────────
+# 状态流转：queued → leased →（done | failed）；
+# 租约到期未续约（进程崩溃 / 重启）的 leased 条目会被重新领取。
+
+
+def enqueue(entry_id: str, kind: str, ref_id: str, payload: Optional[Dict] = None) -> None:
+    """写入一条待执行的队列条目"""
+    now = time.time()
+    with get_conn() as conn:
+        conn.execute(
+            """
+            INSERT INTO job_queue (entry_id, kind, ref_id, payload, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (entry_id, kind, ref_id, json.dumps(payload or {}, ensure_ascii=False), now, now),
+        )
+        conn.commit()
+
+
+def claim_queue_entry(owner: str, lease_seconds: float) -> Optional[Dict]:
+    """
+    领取最早的一条可执行条目（排队中或租约已过期），并加上租约
+
+    Args:
+        owner: 领取者标识（进程级）
+        lease_seconds: 租约时长（秒）
+
+    Returns:
+        条目字典（payload 已反序列化，attempts 已加一），没有可领取的条目时返回 None
+    """
+    now = time.time()
+    with get_conn() as conn:
+        # IMMEDIATE 事务保证多进程下同一条目只被领取一次
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                """
+                SELECT * FROM job_queue
+                WHERE status = 'queued' OR (status = 'leased' AND lease_expires < ?)
+                ORDER BY created_at LIMIT 1
+                """,
+                (now,),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                """
+                UPDATE job_queue
+                SET status = 'leased', lease_owner = ?, lease_expires = ?,
+                    attempts = attempts + 1, updated_at = ?
+                WHERE entry_id = ?
+                """,
+                (owner, now + lease_seconds, now, row["entry_id"]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    entry = dict(row)
+    entry["payload"] = json.loads(entry["payload"] or "{}")
+    entry["attempts"] += 1
+    return entry
+
+
+def renew_leases(owner: str, entry_ids: List[str], lease_seconds: float) -> None:
+    """续约本进程正在执行的条目（心跳）"""
+    if not entry_ids:
+        return
+    now = time.time()
+    with get_conn() as conn:
+        conn.executemany(
+            """
+            UPDATE job_queue SET lease_expires = ?, updated_at = ?
+            WHERE entry_id = ? AND lease_owner = ? AND status = 'leased'
+            """,
+            [(now + lease_seconds, now, entry_id, owner) for entry_id in entry_ids],
+        )
+        conn.commit()
+
+
+def finish_queue_entry(
+    entry_id: str, status: str, error: Optional[str] = None, owner: Optional[str] = None
+) -> bool:
+    """
+    将条目标记为 done / failed
+
+    Args:
+        owner: 给定时只在租约仍属于该领取者时更新（租约已过期并被其他进程领取时不覆盖其状态）
+
+    Returns:
+        是否更新
+    """
+    sql = """
+        UPDATE job_queue
+        SET status = ?, error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ?
+        WHERE entry_id = ?
+    """
+    params = [status, error, time.time(), entry_id]
+    if owner is not None:
+        sql += " AND lease_owner = ?"
+        params.append(owner)
+    with get_conn() as conn:
+        cursor = conn.execute(sql, params)
         conn.commit()
         return cursor.rowcount > 0
 
 
+def release_leases(owner: str, exclude: Optional[List[str]] = None) -> int:
+    """
+    释放指定领取者持有的租约（正常退出时调用），返回释放的条目数
+
+    Args:
+        exclude: 不释放的条目（仍在执行中，租约随进程退出自然过期）
+    """
+    exclude = list(exclude or [])
+    placeholders = ", ".join("?" * len(exclude))
+    sql = """
+        UPDATE job_queue
+        SET status = 'queued', attempts = MAX(attempts - 1, 0),
+            lease_owner = NULL, lease_expires = NULL, updated_at = ?
+        WHERE lease_owner = ? AND status = 'leased'
+    """
+    if exclude:
+        sql += f" AND entry_id NOT IN ({placeholders})"
+    with get_conn() as conn:
+        cursor = conn.execute(sql, [time.time(), owner, *exclude])
+        conn.commit()
+        return cursor.rowcount
+
+
+def fail_orphaned_jobs(error: str, grace_seconds: float = 60.0) -> List[str]:
+    """
+    将没有对应队列条目、却停留在 queued / processing 的任务标记为失败
+
+    （例如引入队列之前由后台线程执行、随进程退出而中断的任务；
+    grace_seconds 内更新过的任务跳过，避免误判其他进程刚创建、尚未入队的任务）
+
+    Returns:
+        被标记为失败的 job_id 列表
+    """
+    now = time.time()
+    with get_conn() as conn:
+        rows = conn.execute(
+            """
+            SELECT job_id FROM jobs
+            WHERE status IN ('queued', 'processing') AND updated_at < ?
+              AND job_id NOT IN (
+                  SELECT ref_id FROM job_queue
+                  WHERE kind = 'pipeline' AND status IN ('queued', 'leased')
+              )
+            """,
+            (now - grace_seconds,),
+        ).fetchall()
+        job_ids = [r["job_id"] for r in rows]
+        conn.executemany(
+            "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE job_id = ?",
+            [(error, now, job_id) for job_id in job_ids],
+        )
+        conn.commit()
+    return job_ids
+
+
+def queue_counts() -> Dict[str, int]:
+    """各状态的队列条目数"""
+    with get_conn() as conn:
+        rows = conn.execute(
+            "SELECT status, COUNT(*) AS n FROM job_queue GROUP BY status"
+        ).fetchall()
+    return {r["status"]: r["n"] for r in rows}
+
+
 # ── 内部工具 ───────────────────────────────────────────────────
 
 
 def _row_to_dict(row: sqlite3.Row) -> Dict:
     d = dict(row)
-    # 反序列化 script JSON
-    if d.get("script") and isinstance(d["script"], str):
-        try:
-            d["script"] = json.loads(d["script"])
-        except json.JSONDecodeError:
-            pass
+    # 反序列化 script / timings JSON（只有详情查询包含这两列，列表查询只取 SUMMARY_COLUMNS）
+    for key in ("script", "timings"):
+        if d.get(key) and isinstance(d[key], str):
+            try:
+                d[key] = json.loads(d[key])
+            except json.JSONDecodeError:
+                pass
     # 布尔字段
-    d["add_subtitle"] = bool(d.get("add_subtitle"))
-    d["add_bgm"] = bool(d.get("add_bgm"))
+    for key in ("add_subtitle", "add_bgm", "has_video"):
+        if key in d:
+            d[key] = bool(d[key])
     return d
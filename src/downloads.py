@@ -0,0 +1,157 @@
+"""
+流式下载模块
+功能：
+1. 分块写入临时文件（不把整个文件读入内存）
+2. 连接中断后用 HTTP Range 断点续传（If-Range 校验源文件未变化，否则从头下载）
+3. 下载过程中同步计算 SHA-256，完成后原子重命名为目标文件
+"""
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import httpx
+
+from .http_clients import get_client
+
+CHUNK_SIZE = 1024 * 1024   # 1 MB
+
+
+def _hash_existing(path: Path, chunk_size: int) -> "hashlib._Hash":
+    """对已下载的部分重新计算哈希（续传前恢复哈希状态）"""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(block)
+    return hasher
+
+
+def _validator(response: httpx.Response) -> Optional[str]:
+    """可用于 If-Range 的校验值：强 ETag 优先，其次 Last-Modified（弱 ETag 不能用于 If-Range）"""
+    etag = response.headers.get("etag", "")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return response.headers.get("last-modified") or None
+
+
+def _load_meta(meta_path: Path) -> Dict:
+    try:
+        return json.loads(meta_path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _total_size(response: httpx.Response, offset: int) -> Optional[int]:
+    """从 Content-Range / Content-Length 推算文件总大小"""
+    content_range = response.headers.get("content-range", "")
+    if "/" in content_range:
+        total = content_range.rsplit("/", 1)[-1]
+        if total.isdigit():
+            return int(total)
+    length = response.headers.get("content-length")
+    if length and length.isdigit():
+        return offset + int(length) if response.status_code == 206 else int(length)
+    return None
+
+
+def stream_download(
+    url: str,
+    output_path: str,
+    chunk_size: int = CHUNK_SIZE,
+    max_retries: int = 3,
+    timeout: float = 120.0,
+) -> Dict:
+    """
+    流式下载文件，支持断点续传与 SHA-256 校验
+
+    临时文件为 <output_path>.part，下载完成后 os.replace 到目标路径。
+    开始写入时在 <output_path>.part.json 记录 URL 和校验值（ETag / Last-Modified）；
+    若 .part 已存在（上次下载中断）且 URL 相同、有校验值，则带 If-Range 从已有字节处续传，
+    源文件已变化或无法校验时丢弃 .part 从头下载。
+
+    Args:
+        url: 下载地址
+        output_path: 保存路径
+        chunk_size: 每次写入的块大小（字节）
+        max_retries: 连接中断后的最大重试次数
+        timeout: 单次请求超时（秒）
+
+    Returns:
+        {"path": 保存路径, "size": 字节数, "sha256": 十六进制摘要}
+    """
+    target = Path(output_path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    part = target.with_name(target.name + ".part")
+    meta_path = target.with_name(target.name + ".part.json")
+
+    meta = _load_meta(meta_path) if part.exists() else {}
+    if part.exists() and meta.get("url") == url and meta.get("validator"):
+        offset = part.stat().st_size
+        hasher = _hash_existing(part, chunk_size)
+    else:
+        # 不是同一个资源（如重试时新建了视频任务）或无法校验，已有部分不可信
+        part.unlink(missing_ok=True)
+        meta_path.unlink(missing_ok=True)
+        meta = {}
+        offset = 0
+        hasher = hashlib.sha256()
+
+    client = get_client(url)
+    attempt = 0
+
+    while True:
+        # 不接受压缩编码：Range 偏移按传输字节计算，必须与写入文件的字节一致
+        headers = {"Accept-Encoding": "identity"}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = meta["validator"]
+        try:
+            with client.stream("GET", url, headers=headers, timeout=timeout) as response:
+                if response.status_code == 416 and offset:
+                    # 续传位置非法（源文件已变化），从头下载
+                    offset, hasher = 0, hashlib.sha256()
+                    part.unlink(missing_ok=True)
+                    continue
+                response.raise_for_status()
+
+                if offset and response.status_code != 206:
+                    # If-Range 不匹配（源文件已变化）或服务器不支持 Range，返回的是完整文件
+                    offset, hasher = 0, hashlib.sha256()
+
+                encoded = response.headers.get("content-encoding", "identity").lower() != "identity"
+                if not offset:
+                    # 仍然被压缩时写入的是解码后的字节，偏移无法对应，不记录校验值（不续传）
+                    meta = {"url": url, "validator": None if encoded else _validator(response)}
+                    meta_path.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+
+                total = None if encoded else _total_size(response, offset)
+                blocks = response.iter_bytes(chunk_size) if encoded else response.iter_raw(chunk_size)
+                mode = "ab" if offset else "wb"
+                with open(part, mode) as f:
+                    for block in blocks:
+                        f.write(block)
+                        hasher.update(block)
+                        offset += len(block)
+
+            if total is not None and offset < total:
+                raise httpx.ReadError(f"连接提前关闭（{offset}/{total} 字节）")
+            break
+
+        except httpx.TransportError as e:
+            attempt += 1
+            if attempt > max_retries:
+                raise
+            if not meta.get("validator"):
+                # 无法校验源文件，不续传
+                offset, hasher = 0, hashlib.sha256()
+                part.unlink(missing_ok=True)
+                print(f"⚠️ 下载中断，无法校验源文件，从头下载（第 {attempt} 次重试）: {e}")
+            else:
+                print(f"⚠️ 下载中断，{offset} 字节处续传（第 {attempt} 次重试）: {e}")
+            time.sleep(min(2 ** attempt, 10))
+
+    os.replace(part, target)
+    meta_path.unlink(missing_ok=True)
+    return {"path": str(target), "size": offset, "sha256": hasher.hexdigest()}
@@ -0,0 +1,91 @@
+"""
+HTTP 客户端注册表
+功能：进程内按上游主机（ARK / Creatok / OpenAI / CDN）共享长连接 httpx 客户端，
+避免每次请求重新建立 TCP + TLS 连接；安装了 h2 时自动启用 HTTP/2。
+"""
+import threading
+from typing import Dict
+from urllib.parse import urlsplit
+
+import httpx
+
+from .config import settings
+
+# OpenAI SDK 共用的客户端 key
+OPENAI_BASE_URL = "https://api.openai.com"
+
+_clients: Dict[str, httpx.Client] = {}
+_lock = threading.Lock()
+
+
+def _http2_available() -> bool:
+    """httpx 的 HTTP/2 支持依赖可选包 h2"""
+    if not settings.http2_enabled:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive,
+        keepalive_expiry=settings.http_keepalive_expiry,
+    )
+
+
+def _host_key(url: str) -> str:
+    """scheme://host[:port]，同一主机共享一个客户端"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def build_client() -> httpx.Client:
+    """按当前配置新建一个同步客户端（连接池 + 可选 HTTP/2）"""
+    return httpx.Client(
+        http2=_http2_available(),
+        limits=_limits(),
+        timeout=httpx.Timeout(30.0),
+        follow_redirects=True,
+    )
+
+
+def build_async_client() -> httpx.AsyncClient:
+    """按当前配置新建一个异步客户端（需在使用它的事件循环中创建）"""
+    return httpx.AsyncClient(
+        http2=_http2_available(),
+        limits=_limits(),
+        timeout=httpx.Timeout(30.0),
+        follow_redirects=True,
+    )
+
+
+def get_client(url: str) -> httpx.Client:
+    """
+    获取 url 所在主机的共享客户端（线程安全，首次调用时创建）
+
+    Args:
+        url: 完整请求地址或主机根地址
+    """
+    key = _host_key(url)
+    with _lock:
+        client = _clients.get(key)
+        if client is None or client.is_closed:
+            client = build_client()
+            _clients[key] = client
+        return client
+
+
+def close_all() -> None:
+    """关闭所有共享客户端（服务退出时调用）"""
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        try:
+            client.close()
+        except Exception:
+            pass
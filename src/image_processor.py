@@ -9,13 +9,57 @@ import base64
 from pathlib import Path
 from typing import Optional
 from openai import OpenAI
-from PIL import Image
-import httpx
+from PIL import Image, ImageOps
 
+from .cache import get_asset_cache, get_cache, hash_key
 from .config import settings
+from .downloads import stream_download
+from .http_clients import OPENAI_BASE_URL, get_client
 from .utils import parse_json_response
 
 
+# 产品分析 Prompt；修改内容时递增版本号，使旧缓存失效
+ANALYSIS_PROMPT_VERSION = "1"
+ANALYSIS_PROMPT = """请分析这张产品图片，并提供：
+1. 产品名称和类别
+2. 详细的外观描述（颜色、形状、材质、特征）
+3. 建议的白底图描述（用于后续 AI 生成）
+
+请用 JSON 格式返回，包含字段：
+- product_name: 产品名称
+- category: 类别
+- description: 详细描述
+- white_bg_prompt: 白底图生成提示词（英文）
+"""
+
+
+def image_fingerprint(image_path: str) -> str:
+    """
+    计算图片内容指纹：解码后按 EXIF 方向校正并转为 RGB 像素再哈希，
+    同一张图重新保存（元数据 / 文件名不同）也能命中缓存。
+    解码失败时退化为原始字节哈希。
+    """
+    try:
+        with Image.open(image_path) as img:
+            img = ImageOps.exif_transpose(img).convert("RGB")
+            return hash_key(img.size, img.tobytes())
+    except Exception:
+        with open(image_path, "rb") as f:
+            return hash_key(f.read())
+
+
+def _analysis_cache():
+    return get_cache(
+        "image_analysis",
+        max_entries=settings.analysis_cache_max_entries,
+        ttl=settings.analysis_cache_ttl_days * 86400,
+    )
+
+
+def _white_bg_cache():
+    return get_asset_cache("white_bg", max_bytes=settings.asset_cache_max_mb * 1024 * 1024)
+
+
 class ImageProcessor:
     """图片处理器"""
 
@@ -26,7 +70,10 @@ class ImageProcessor:
         Args:
             api_key: OpenAI API Key，如果不提供则从环境变量读取
         """
-        self.client = OpenAI(api_key=api_key or settings.openai_api_key)
+        self.client = OpenAI(
+            api_key=api_key or settings.openai_api_key,
+            http_client=get_client(OPENAI_BASE_URL),
+        )
 
     def encode_image(self, image_path: str) -> str:
         """
@@ -41,19 +88,29 @@ class ImageProcessor:
         with open(image_path, "rb") as image_file:
             return base64.b64encode(image_file.read()).decode("utf-8")
 
-    def remove_background(self, image_path: str, output_path: str) -> dict:
+    def remove_background(self, image_path: str, output_path: str, use_cache: bool = True) -> dict:
         """
         使用 ChatGPT Vision 分析产品并生成抠图描述
 
+        相同图片内容 + 相同 Prompt 版本的分析结果会被缓存，命中时不再调用 GPT-4o。
+
         Args:
             image_path: 原始图片路径
             output_path: 输出路径
+            use_cache: 是否读写分析缓存
 
         Returns:
             包含产品描述和建议的字典
         """
         print(f"📸 分析产品图片: {image_path}")
 
+        cache_key = hash_key(ANALYSIS_PROMPT_VERSION, image_fingerprint(image_path))
+        if use_cache:
+            cached = _analysis_cache().get(cache_key)
+            if isinstance(cached, dict):
+                print(f"✅ 产品分析命中缓存")
+                return cached
+
         # 编码图片
         base64_image = self.encode_image(image_path)
 
@@ -66,17 +123,7 @@ class ImageProcessor:
                     "content": [
                         {
                             "type": "text",
-                            "text": """请分析这张产品图片，并提供：
-1. 产品名称和类别
-2. 详细的外观描述（颜色、形状、材质、特征）
-3. 建议的白底图描述（用于后续 AI 生成）
-
-请用 JSON 格式返回，包含字段：
-- product_name: 产品名称
-- category: 类别
-- description: 详细描述
-- white_bg_prompt: 白底图生成提示词（英文）
-"""
+                            "text": ANALYSIS_PROMPT
                         },
                         {
                             "type": "image_url",
@@ -102,6 +149,9 @@ class ImageProcessor:
                 "description": result_text,
                 "white_bg_prompt": result_text,
             }
+        elif use_cache:
+            # 只缓存解析成功的结构化结果
+            _analysis_cache().set(cache_key, result)
 
         return result
 
@@ -110,19 +160,25 @@ class ImageProcessor:
         image_path: str,
         product_description: str,
         output_path: str,
-        size: str = "1024x1024"
+        size: str = "1024x1024",
+        quality: str = "hd",
+        use_cache: bool = True,
     ) -> str:
         """
         使用 DALL·E 3 生成白底产品图（扩图）
 
+        同一 prompt + size + quality 生成过的图片会从本地缓存直接取用。
+
         Args:
             image_path: 原始图片路径
             product_description: 产品描述（从 Vision 分析获得）
             output_path: 输出路径
             size: 图片尺寸（1024x1024 或 1024x1792）
+            quality: 图片质量（standard / hd）
+            use_cache: 是否读写白底图缓存
 
         Returns:
-            生成的图片 URL
+            生成的图片 URL；命中缓存时返回本地文件路径（DALL·E 的签名 URL 约一小时后失效，不缓存）
         """
         print(f"🎨 使用 DALL·E 3 生成白底图...")
         print(f"产品描述: {product_description[:100]}...")
@@ -139,12 +195,19 @@ Requirements:
 - No text, no watermarks
 """
 
+        cache_key = hash_key("dall-e-3", prompt, size, quality)
+        if use_cache:
+            cached = _white_bg_cache().get(cache_key, output_path)
+            if cached is not None:
+                print(f"✅ 白底图命中缓存: {output_path}")
+                return output_path
+
         # 调用 DALL·E 3 生成图片
         response = self.client.images.generate(
             model="dall-e-3",
             prompt=prompt,
             size=size,
-            quality="hd",
+            quality=quality,
             n=1
         )
 
@@ -153,32 +216,38 @@ Requirements:
         print(f"✅ 图片生成成功: {image_url}")
 
         # 下载图片
-        self._download_image(image_url, output_path)
+        download = self._download_image(image_url, output_path)
+        if use_cache:
+            _white_bg_cache().put(
+                cache_key, output_path,
+                {"sha256": download["sha256"]},
+            )
 
         return image_url
 
-    def _download_image(self, url: str, output_path: str):
+    def _download_image(self, url: str, output_path: str) -> dict:
         """
-        下载图片到本地
+        下载图片到本地（流式写入）
 
         Args:
             url: 图片 URL
             output_path: 保存路径
+
+        Returns:
+            {"path", "size", "sha256"}
         """
         print(f"⬇️  下载图片到: {output_path}")
 
-        response = httpx.get(url)
-        response.raise_for_status()
-
-        with open(output_path, "wb") as f:
-            f.write(response.content)
+        result = stream_download(url, output_path, timeout=60.0)
 
         print(f"✅ 图片已保存")
+        return result
 
     def process_image(
         self,
         input_path: str,
-        output_dir: Optional[str] = None
+        output_dir: Optional[str] = None,
+        use_cache: bool = True,
     ) -> dict:
         """
         完整的图片处理流程
@@ -186,6 +255,7 @@ Requirements:
         Args:
             input_path: 输入图片路径
             output_dir: 输出目录（可选）
+            use_cache: 是否使用分析缓存和白底图缓存
 
         Returns:
             处理结果字典
@@ -203,7 +273,7 @@ Requirements:
         print("步骤 1: 分析产品图片")
         print("="*50)
 
-        analysis = self.remove_background(input_path, str(output_dir / "temp.png"))
+        analysis = self.remove_background(input_path, str(output_dir / "temp.png"), use_cache=use_cache)
 
         # 步骤 2: 生成白底图
         print("\n" + "="*50)
@@ -217,7 +287,8 @@ Requirements:
             input_path,
             white_bg_prompt,
             str(output_path),
-            size="1024x1792"  # 竖版，适合 TikTok
+            size="1024x1792",  # 竖版，适合 TikTok
+            use_cache=use_cache,
         )
 
         return {
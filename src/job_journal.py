@@ -0,0 +1,125 @@
+"""
+任务状态写入日志（write-behind）
+功能：
+1. 暂存 update_job 调用，同一 job_id 的多次更新合并为一条
+2. 后台线程按固定间隔在一个事务内批量落库
+3. 成功 / 失败等终态立即落库；服务退出时刷写剩余更新
+"""
+import atexit
+import threading
+from typing import Dict, Optional
+
+from . import database as db
+from .config import settings
+
+# 出现这些状态时立即刷写，保证终态不因进程退出而丢失
+TERMINAL_STATUSES = ("success", "failed")
+
+
+class JobJournal:
+    """
+    合并任务状态更新并批量写入 SQLite（线程安全）
+
+    flush 之间互斥，且在持有刷写锁后才取出待写数据，
+    因此较早的更新不会覆盖较晚的更新。
+    """
+
+    def __init__(self, flush_interval: float = 0.5):
+        """
+        Args:
+            flush_interval: 后台刷写间隔（秒）
+        """
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+        self.records = 0
+        self.flushes = 0
+        self.rows_written = 0
+
+    def record(self, job_id: str, **fields) -> None:
+        """
+        记录一次任务更新（与 db.update_job 参数相同）
+
+        终态更新会同步刷写后才返回。
+        """
+        if not fields:
+            return
+        with self._lock:
+            self._pending.setdefault(job_id, {}).update(fields)
+            self.records += 1
+        if fields.get("status") in TERMINAL_STATUSES or self._stopped:
+            self.flush()
+        else:
+            self._ensure_thread()
+
+    def flush(self) -> int:
+        """立即把所有待写更新落库，返回写入的任务数"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            try:
+                db.update_jobs_many(batch)
+            except Exception as e:
+                # 写入失败时放回队列，已有的较新字段优先
+                with self._lock:
+                    for job_id, fields in batch.items():
+                        self._pending[job_id] = {**fields, **self._pending.get(job_id, {})}
+                print(f"⚠️ 任务状态落库失败，稍后重试: {e}")
+                return 0
+            with self._lock:
+                self.flushes += 1
+                self.rows_written += len(batch)
+            return len(batch)
+
+    def close(self) -> None:
+        """停止后台线程并刷写剩余更新"""
+        self._stopped = True
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=5)
+        self.flush()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "records": self.records,
+                "flushes": self.flushes,
+                "rows_written": self.rows_written,
+            }
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="job-journal", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self.flush()
+
+
+# ── 全局实例 ─────────────────────────────────────────────────────
+
+_journal: Optional[JobJournal] = None
+_journal_lock = threading.Lock()
+
+
+def get_journal() -> JobJournal:
+    """获取进程内共享的任务状态日志"""
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = JobJournal(settings.job_journal_flush_interval)
+            atexit.register(_journal.close)
+        return _journal
@@ -0,0 +1,238 @@
+"""
+持久化任务队列
+功能：
+1. 任务写入 jobs.db 的 job_queue 表，服务重启不丢失
+2. 固定数量的工作线程领取任务执行，领取时加租约
+3. 心跳线程定期续约；进程崩溃后租约过期，任务由下次启动（或其他进程）重新领取
+4. 超过最大重试次数的任务标记为失败
+"""
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+
+from . import database as db
+from .config import settings
+
+# handler(ref_id, payload)：正常返回即视为完成，抛出异常视为失败（不自动重试）；
+# 返回 Future 时由 Future 结束决定完成与否，工作线程不等待
+Handler = Callable[[str, Dict], Optional[Future]]
+# on_give_up(ref_id, payload, error)：崩溃重试次数用尽时调用
+GiveUpHandler = Callable[[str, Dict, str], None]
+
+_handlers: Dict[str, Handler] = {}
+_give_up_handlers: Dict[str, GiveUpHandler] = {}
+
+
+def register_handler(kind: str, handler: Handler, on_give_up: Optional[GiveUpHandler] = None) -> None:
+    """
+    注册某类队列条目的执行函数
+
+    Args:
+        kind: 条目类型（如 pipeline / batch）
+        handler: 执行函数
+        on_give_up: 重试次数用尽时的回调（用于把业务记录标记为失败）
+    """
+    _handlers[kind] = handler
+    if on_give_up is not None:
+        _give_up_handlers[kind] = on_give_up
+
+
+class WorkerPool:
+    """
+    固定大小的队列工作线程池
+
+    所有线程共享一个领取者标识（进程级），心跳线程统一为本进程正在执行的条目续约。
+    """
+
+    def __init__(self, workers: int = 4, lease_seconds: float = 60.0, max_attempts: int = 3):
+        """
+        Args:
+            workers: 工作线程数
+            lease_seconds: 租约时长（秒）
+            max_attempts: 单个条目最多被领取的次数（含崩溃后的重新领取）
+        """
+        self.workers = max(1, workers)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._active: Dict[str, str] = {}   # entry_id -> kind
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)   # _active 清空时通知（stop 等待用）
+        self._wakeup = threading.Condition()
+        self._pending = False   # 有新提交尚未被工作线程看到（在 _wakeup 下读写，避免丢失唤醒）
+        self._stopped = threading.Event()
+        self._threads = []
+        self.completed = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        """启动工作线程和心跳线程（重复调用无副作用）"""
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"queue-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        t = threading.Thread(target=self._heartbeat, name="queue-heartbeat", daemon=True)
+        t.start()
+        self._threads.append(t)
+        print(f"✅ 任务队列已启动: {self.workers} 个工作线程")
+
+    def submit(self, kind: str, ref_id: str, payload: Optional[Dict] = None) -> str:
+        """写入队列并唤醒空闲工作线程，返回条目 ID"""
+        entry_id = str(uuid.uuid4())
+        db.enqueue(entry_id, kind, ref_id, payload)
+        with self._wakeup:
+            self._pending = True
+            self._wakeup.notify()
+        return entry_id
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """
+        停止领取新任务，等待执行中的任务结束（最多 timeout 秒），再释放本进程其余的租约
+
+        仍在执行的条目不释放：释放后其他进程可能立即领取并重复执行。
+        它们的租约由心跳继续续约，进程退出后自然过期，再由下次启动重新领取。
+        """
+        self._stopped.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        deadline = time.time() + timeout
+        with self._idle:
+            while self._active and time.time() < deadline:
+                self._idle.wait(deadline - time.time())
+            running = list(self._active)
+        released = db.release_leases(self.owner, exclude=running)
+        if released:
+            print(f"⏳ 已释放 {released} 个未开始的队列任务，下次启动时继续")
+        if running:
+            print(f"⏳ {len(running)} 个队列任务仍在执行，租约过期后由下次启动重新领取")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            active = len(self._active)
+            completed, failed = self.completed, self.failed
+        return {
+            "workers": self.workers,
+            "active": active,
+            "completed": completed,
+            "failed": failed,
+            "queue": db.queue_counts(),
+        }
+
+    # ── 内部 ──
+
+    def _work(self):
+        while not self._stopped.is_set():
+            with self._wakeup:
+                self._pending = False
+            try:
+                entry = db.claim_queue_entry(self.owner, self.lease_seconds)
+            except Exception as e:
+                print(f"⚠️ 领取队列任务失败: {e}")
+                entry = None
+            if entry is None:
+                # 没有任务时等待提交通知；超时后再查一次，以便接手其他进程过期的租约。
+                # 领取之后才到的提交会留下 _pending，此时不等待，立即再领取一次
+                with self._wakeup:
+                    if not self._pending and not self._stopped.is_set():
+                        self._wakeup.wait(timeout=self.lease_seconds / 3)
+                continue
+            self._run(entry)
+
+    def _run(self, entry: Dict):
+        entry_id, kind, ref_id = entry["entry_id"], entry["kind"], entry["ref_id"]
+        payload = entry["payload"]
+
+        if entry["attempts"] > self.max_attempts:
+            error = f"任务中断次数过多（{entry['attempts'] - 1} 次），已放弃"
+            db.finish_queue_entry(entry_id, "failed", error, owner=self.owner)
+            give_up = _give_up_handlers.get(kind)
+            if give_up is not None:
+                give_up(ref_id, payload, error)
+            print(f"❌ 队列任务 [{kind}:{ref_id}] {error}")
+            return
+
+        handler = _handlers.get(kind)
+        if handler is None:
+            db.finish_queue_entry(entry_id, "failed", f"未注册的任务类型: {kind}", owner=self.owner)
+            return
+
+        if entry["attempts"] > 1:
+            print(f"⏳ 恢复中断的队列任务 [{kind}:{ref_id}]（第 {entry['attempts']} 次执行）")
+
+        with self._lock:
+            self._active[entry_id] = kind
+        try:
+            result = handler(ref_id, payload)
+        except Exception as e:
+            self._finish(entry_id, kind, ref_id, e)
+            return
+
+        if isinstance(result, Future):
+            # 异步执行：工作线程继续领取下一条，结束时再确认（期间心跳照常续约）
+            result.add_done_callback(
+                lambda f: self._finish(entry_id, kind, ref_id, f.exception())
+            )
+        else:
+            self._finish(entry_id, kind, ref_id, None)
+
+    def _finish(self, entry_id: str, kind: str, ref_id: str, error: Optional[BaseException]):
+        try:
+            status = "done" if error is None else "failed"
+            message = None if error is None else str(error)
+            if not db.finish_queue_entry(entry_id, status, message, owner=self.owner):
+                print(f"⚠️ 队列任务 [{kind}:{ref_id}] 的租约已不属于本进程，不更新其状态")
+            elif error is not None:
+                print(f"❌ 队列任务 [{kind}:{ref_id}] 失败: {error}")
+        finally:
+            with self._lock:
+                self._active.pop(entry_id, None)
+                if error is None:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                if not self._active:
+                    self._idle.notify_all()
+
+    def _heartbeat(self):
+        # stop() 之后仍为执行中的条目续约，直到它们全部结束
+        interval = self.lease_seconds / 3
+        while True:
+            time.sleep(interval)
+            with self._lock:
+                entry_ids = list(self._active)
+            if self._stopped.is_set() and not entry_ids:
+                return
+            try:
+                db.renew_leases(self.owner, entry_ids, self.lease_seconds)
+            except Exception as e:
+                print(f"⚠️ 队列租约续约失败: {e}")
+
+
+# ── 全局实例 ─────────────────────────────────────────────────────
+
+_pool: Optional[WorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool() -> WorkerPool:
+    """获取进程内共享的队列工作线程池（首次调用时创建，需调用 start 启动）"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool(
+                workers=settings.queue_workers,
+                lease_seconds=settings.queue_lease_seconds,
+                max_attempts=settings.queue_max_attempts,
+            )
+        return _pool
+
+
+def submit(kind: str, ref_id: str, payload: Optional[Dict] = None) -> str:
+    """提交任务到共享队列"""
+    return get_worker_pool().submit(kind, ref_id, payload)
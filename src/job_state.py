@@ -0,0 +1,182 @@
+"""
+任务实时状态存储
+功能：/api/status 轮询读取的实时状态（步骤、进度、ETA、部分脚本）统一经过 JobStateStore 接口，
+按 settings.job_state_backend 选择实现：
+1. memory — 进程内字典，单进程部署（默认）
+2. sqlite — 独立的 SQLite 文件（WAL），多个 uvicorn worker 进程共享
+"""
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Optional
+
+from . import database as db
+from .config import settings
+
+
+class JobStateStore(ABC):
+    """任务实时状态存储接口（实现类缺少任一抽象方法时无法实例化）"""
+
+    # 状态是否跨进程共享
+    shared = False
+
+    @abstractmethod
+    def create(self, job_id: str, state: Dict) -> None:
+        """写入（覆盖）任务的完整状态"""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Dict]:
+        """读取任务状态副本，不存在返回 None"""
+
+    @abstractmethod
+    def update(self, job_id: str, **fields) -> None:
+        """合并更新若干字段（值为 None 表示清除该字段）；任务不存在时忽略"""
+
+    @abstractmethod
+    def delete(self, job_id: str) -> None:
+        """删除任务状态"""
+
+    def purge(self, older_than: float) -> int:
+        """清理 older_than 秒内未更新的状态，返回清理条数"""
+        return 0
+
+    def __contains__(self, job_id: str) -> bool:
+        return self.get(job_id) is not None
+
+
+class InMemoryJobStateStore(JobStateStore):
+    """进程内字典实现（线程安全）"""
+
+    def __init__(self):
+        self._states: Dict[str, Dict] = {}
+        self._updated: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id: str, state: Dict) -> None:
+        with self._lock:
+            self._states[job_id] = {k: v for k, v in state.items() if v is not None}
+            self._updated[job_id] = time.time()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            state = self._states.get(job_id)
+            return dict(state) if state is not None else None
+
+    def update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            state = self._states.get(job_id)
+            if state is None:
+                return
+            for key, value in fields.items():
+                if value is None:
+                    state.pop(key, None)
+                else:
+                    state[key] = value
+            self._updated[job_id] = time.time()
+
+    def delete(self, job_id: str) -> None:
+        with self._lock:
+            self._states.pop(job_id, None)
+            self._updated.pop(job_id, None)
+
+    def purge(self, older_than: float) -> int:
+        cutoff = time.time() - older_than
+        with self._lock:
+            expired = [job_id for job_id, ts in self._updated.items() if ts < cutoff]
+            for job_id in expired:
+                self._states.pop(job_id, None)
+                self._updated.pop(job_id, None)
+        return len(expired)
+
+
+class SQLiteJobStateStore(JobStateStore):
+    """
+    SQLite 实现（多进程共享）
+
+    状态以 JSON 存在独立文件中，与 jobs.db 的历史写入互不争用；
+    更新用 json_patch 在一条 UPDATE 中完成合并，无需读-改-写。
+    """
+
+    shared = True
+
+    def __init__(self, path: Path, pool_size: int = 8):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._pool = db.ConnectionPool(pool_size, lambda: db.open_connection(self.path))
+        with self._pool.connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_state (
+                    job_id      TEXT PRIMARY KEY,
+                    data        TEXT NOT NULL,
+                    updated_at  REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_job_state_updated ON job_state (updated_at)")
+            conn.commit()
+
+    def create(self, job_id: str, state: Dict) -> None:
+        data = json.dumps({k: v for k, v in state.items() if v is not None}, ensure_ascii=False)
+        with self._pool.connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO job_state (job_id, data, updated_at) VALUES (?, ?, ?)",
+                (job_id, data, time.time()),
+            )
+            conn.commit()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._pool.connection() as conn:
+            row = conn.execute(
+                "SELECT data FROM job_state WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, job_id: str, **fields) -> None:
+        if not fields:
+            return
+        # json_patch（RFC 7396）中 null 表示删除该键，与内存实现语义一致
+        patch = json.dumps(fields, ensure_ascii=False)
+        with self._pool.connection() as conn:
+            conn.execute(
+                "UPDATE job_state SET data = json_patch(data, ?), updated_at = ? WHERE job_id = ?",
+                (patch, time.time(), job_id),
+            )
+            conn.commit()
+
+    def delete(self, job_id: str) -> None:
+        with self._pool.connection() as conn:
+            conn.execute("DELETE FROM job_state WHERE job_id = ?", (job_id,))
+            conn.commit()
+
+    def purge(self, older_than: float) -> int:
+        with self._pool.connection() as conn:
+            cursor = conn.execute(
+                "DELETE FROM job_state WHERE updated_at < ?", (time.time() - older_than,)
+            )
+            conn.commit()
+            return cursor.rowcount
+
+    def close(self) -> None:
+        self._pool.close_all()
+
+
+# ── 全局实例 ─────────────────────────────────────────────────────
+
+_store: Optional[JobStateStore] = None
+_store_lock = threading.Lock()
+
+
+def get_job_state_store() -> JobStateStore:
+    """按 settings.job_state_backend 创建（或返回已创建的）进程内共享实例"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            backend = settings.job_state_backend
+            if backend == "memory":
+                _store = InMemoryJobStateStore()
+            elif backend == "sqlite":
+                _store = SQLiteJobStateStore(settings.job_state_path)
+            else:
+                raise ValueError(f"未知的 job_state_backend: {backend}（可选 memory / sqlite）")
+        return _store
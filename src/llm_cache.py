@@ -0,0 +1,106 @@
+"""
+LLM 响应缓存模块
+功能：对 chat.completions.create 按 (model, messages, temperature, max_tokens, ...) 做记忆化，
+相同输入直接返回缓存内容，并统计命中率和节省的 token 数
+"""
+import json
+import threading
+from typing import Callable, Dict
+
+from .cache import get_cache, hash_key
+from .config import settings
+
+_lock = threading.Lock()
+_tokens_saved = 0
+
+
+def _cache():
+    return get_cache(
+        "llm",
+        max_entries=settings.llm_cache_max_entries,
+        ttl=settings.llm_cache_ttl_days * 86400,
+    )
+
+
+def request_key(**kwargs) -> str:
+    """根据请求参数计算缓存 key（参数顺序无关）"""
+    return hash_key(json.dumps(kwargs, sort_keys=True, ensure_ascii=False, default=str))
+
+
+def chat_completion(client, use_cache: bool = True, **kwargs) -> str:
+    """
+    调用 client.chat.completions.create 并返回 message.content（带缓存）
+
+    Args:
+        client: OpenAI 客户端
+        use_cache: 为 False 时跳过缓存（仍会写入最新结果）
+        **kwargs: 透传给 chat.completions.create 的参数
+
+    Returns:
+        模型返回的文本内容
+    """
+    global _tokens_saved
+    enabled = use_cache and settings.llm_cache_enabled
+    key = request_key(**kwargs)
+
+    if enabled:
+        cached = _cache().get(key)
+        if isinstance(cached, dict) and "content" in cached:
+            with _lock:
+                _tokens_saved += cached.get("total_tokens", 0)
+            return cached["content"]
+
+    response = client.chat.completions.create(**kwargs)
+    content = response.choices[0].message.content or ""
+
+    if settings.llm_cache_enabled and content:
+        usage = getattr(response, "usage", None)
+        _cache().set(key, {
+            "content": content,
+            "total_tokens": getattr(usage, "total_tokens", 0) or 0,
+        })
+
+    return content
+
+
+def stream_chat_completion(client, on_delta: Callable[[str], None], use_cache: bool = True, **kwargs) -> str:
+    """
+    流式调用 chat.completions.create，每收到一段文本回调 on_delta，返回完整文本
+
+    与 chat_completion 共用缓存 key（不含 stream 参数）；
+    命中缓存时把整段缓存文本一次性回调给 on_delta。
+    """
+    global _tokens_saved
+    enabled = use_cache and settings.llm_cache_enabled
+    key = request_key(**kwargs)
+
+    if enabled:
+        cached = _cache().get(key)
+        if isinstance(cached, dict) and "content" in cached:
+            with _lock:
+                _tokens_saved += cached.get("total_tokens", 0)
+            on_delta(cached["content"])
+            return cached["content"]
+
+    parts = []
+    for chunk in client.chat.completions.create(stream=True, **kwargs):
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            parts.append(delta)
+            on_delta(delta)
+    content = "".join(parts)
+
+    if settings.llm_cache_enabled and content:
+        # 流式响应不带 usage，按字符数粗略估算 token
+        _cache().set(key, {"content": content, "total_tokens": len(content) // 2})
+
+    return content
+
+
+def stats() -> Dict:
+    """命中率与节省的 token 数"""
+    with _lock:
+        saved = _tokens_saved
+    return {**_cache().stats(), "tokens_saved": saved}
@@ -0,0 +1,648 @@
+"""
+视频生成流水线
+功能：
+1. 把单条任务拆成 4 个阶段：图片处理 → 脚本生成 → 视频生成 → 后处理
+2. 每个阶段有独立的工作线程数，阶段之间用有界队列连接（下游满时上游阻塞，形成背压）
+3. 不同任务的各阶段互相重叠执行，吞吐受最慢阶段限制，而不是受单条任务的串行耗时限制
+4. 每个阶段先查检查点，已完成的步骤直接跳过（重试 / 重启后续跑）
+5. 单条任务内 DALL·E 白底图与脚本生成并行（白底图只在视频生成时才用到），并记录各步骤耗时
+6. 视频生成阶段只负责提交任务，等待完成交给共享轮询器（task_poller），
+   完成后在下载线程池中下载并交给后处理阶段，在途视频任务数不受阶段线程数限制
+"""
+import json
+import queue
+import shutil
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from .config import settings
+from .image_processor import ImageProcessor
+from .prompt_generator import PromptGenerator
+from .video_generator import VideoGenerator
+from .post_processor import PostProcessor, SubtitleFilterBuilder, _find_chinese_font
+from . import database as db
+from . import job_queue
+from .checkpoints import Checkpoint
+from .job_journal import get_journal
+from .job_state import get_job_state_store
+from .postprocess_pool import get_postprocess_pool
+
+
+@dataclass
+class PipelineJob:
+    """在各阶段之间传递的任务上下文"""
+    job_id: str
+    image_path: str
+    product_name: str
+    selling_points: List[str]
+    video_service: str = "seedance"
+    add_subtitle: bool = False
+    add_bgm: bool = False
+    use_cache: bool = True
+
+    # 以下字段由各阶段填充
+    output_dir: Optional[Path] = None
+    checkpoint: Optional[Checkpoint] = None
+    analysis: Dict = field(default_factory=dict)
+    processed_image_path: str = ""
+    script: Dict = field(default_factory=dict)
+    video_prompt: str = ""
+    subtitle_builder: Optional[SubtitleFilterBuilder] = None
+    white_bg_future: Optional[Future] = None
+    raw_video_path: Optional[Path] = None
+    video_result: Dict = field(default_factory=dict)
+    started_at: float = 0.0
+    timings: Dict[str, Dict] = field(default_factory=dict)
+    future: Future = field(default_factory=Future)
+
+    @property
+    def duration(self) -> int:
+        return 5 if self.video_service == "seedance" else 15
+
+    def update(self, **data):
+        """更新实时状态；数据库由 journal 合并后批量写入（终态立即写入）"""
+        get_job_state_store().update(self.job_id, **data)
+        get_journal().record(self.job_id, **data)
+
+
+@contextmanager
+def _timed(job: PipelineJob, name: str):
+    """记录一个步骤的开始时间（相对任务开始）和耗时（秒）"""
+    start = time.time()
+    try:
+        yield
+    finally:
+        _record_timing(job, name, start)
+
+
+def _record_timing(job: PipelineJob, name: str, start: float):
+    job.timings[name] = {
+        "start": round(start - job.started_at, 2),
+        "seconds": round(time.time() - start, 2),
+    }
+
+
+_render_pool: Optional[ThreadPoolExecutor] = None
+_render_pool_lock = threading.Lock()
+
+
+def _render_executor() -> ThreadPoolExecutor:
+    """DALL·E 白底图生成线程池（与脚本生成并行执行）"""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = ThreadPoolExecutor(
+                max_workers=max(1, settings.pipeline_image_workers),
+                thread_name_prefix="pipeline-render",
+            )
+        return _render_pool
+
+
+_download_pool: Optional[ThreadPoolExecutor] = None
+_download_pool_lock = threading.Lock()
+
+
+def _download_executor() -> ThreadPoolExecutor:
+    """视频任务完成后的下载线程池（轮询线程只负责把完成的任务转交到这里）"""
+    global _download_pool
+    with _download_pool_lock:
+        if _download_pool is None:
+            _download_pool = ThreadPoolExecutor(
+                max_workers=max(1, settings.pipeline_download_workers),
+                thread_name_prefix="pipeline-download",
+            )
+        return _download_pool
+
+
+def _render_white_bg(job: PipelineJob) -> str:
+    """DALL·E 3 生成白底图，完成后记录检查点，返回图片路径"""
+    output_path = job.output_dir / "processed" / "white_bg.png"
+    white_bg_prompt = job.analysis.get("white_bg_prompt", job.analysis.get("description", ""))
+    with _timed(job, "white_bg"):
+        ImageProcessor().expand_image(
+            job.image_path,
+            white_bg_prompt,
+            str(output_path),
+            size="1024x1792",  # 竖版，适合 TikTok
+            use_cache=job.use_cache,
+        )
+    job.checkpoint.save(white_bg=str(output_path))
+    db.add_asset(job.job_id, "white_bg", str(output_path))
+    return str(output_path)
+
+
+# ── 阶段函数 ─────────────────────────────────────────────────────
+
+
+def stage_image(job: PipelineJob):
+    """
+    步骤 1：GPT-4o Vision 分析
+
+    分析完成后立即进入脚本生成阶段；DALL·E 白底图在后台并行生成，视频生成阶段再等待它。
+    """
+    job.started_at = job.started_at or time.time()
+    job.output_dir = settings.output_dir / job.job_id
+    job.output_dir.mkdir(parents=True, exist_ok=True)
+    checkpoint = job.checkpoint = Checkpoint(job.output_dir)
+
+    # 记录任务参数和原图副本，重试时不依赖已清理的上传文件
+    if not checkpoint.has("request"):
+        source_image = job.output_dir / f"source{Path(job.image_path).suffix or '.jpg'}"
+        shutil.copy2(job.image_path, source_image)
+        checkpoint.save(
+            request={
+                "product_name": job.product_name,
+                "selling_points": job.selling_points,
+                "video_service": job.video_service,
+                "add_subtitle": job.add_subtitle,
+                "add_bgm": job.add_bgm,
+                "use_cache": job.use_cache,
+            },
+            source_image=str(source_image),
+        )
+
+    job.update(status="processing", step=1, step_name="分析产品图片")
+
+    if checkpoint.has("analysis"):
+        job.analysis = checkpoint.get("analysis")
+    else:
+        processed_dir = job.output_dir / "processed"
+        processed_dir.mkdir(parents=True, exist_ok=True)
+        with _timed(job, "analysis"):
+            job.analysis = ImageProcessor().remove_background(
+                job.image_path, str(processed_dir / "temp.png"), use_cache=job.use_cache
+            )
+        checkpoint.save(analysis=job.analysis)
+
+    if checkpoint.file("white_bg"):
+        print("⏭️ 步骤 1 已完成，使用检查点")
+        job.processed_image_path = str(checkpoint.file("white_bg"))
+    else:
+        job.white_bg_future = _render_executor().submit(_render_white_bg, job)
+
+
+def stage_prompt(job: PipelineJob):
+    """步骤 2：GPT-4o 视频脚本 + Prompt（流式生成，部分内容实时写入任务状态）"""
+    job.update(step=2, step_name="生成视频脚本")
+    checkpoint = job.checkpoint
+    state = get_job_state_store()
+
+    # 字幕滤镜随脚本流式生成同步提前构建
+    builder = job.subtitle_builder = (
+        SubtitleFilterBuilder(_find_chinese_font()) if job.add_subtitle else None
+    )
+
+    def _on_partial(event: str, value, partial: dict):
+        state.update(job.job_id, partial_script={
+            "hook": partial.get("hook", ""),
+            "scenes": list(partial.get("scenes", [])),
+            "cta": partial.get("cta", ""),
+        })
+        if builder is None:
+            return
+        if event == "hook":
+            builder.add_hook(value)
+        elif event == "scene":
+            builder.add_scene(value)
+        elif event == "cta":
+            builder.add_cta(value)
+
+    if checkpoint.has("script", "video_prompt"):
+        print("⏭️ 步骤 2 已完成，使用检查点")
+        job.script = checkpoint.get("script")
+        job.video_prompt = checkpoint.get("video_prompt")
+        return
+
+    product_description = job.analysis.get(
+        "white_bg_prompt",
+        job.analysis.get("description", "")
+    )
+    generator = PromptGenerator()
+    with _timed(job, "script"):
+        prompt_result = generator.generate_complete_prompt(
+            product_name=job.product_name,
+            product_description=product_description,
+            selling_points=job.selling_points,
+            duration=job.duration,
+            use_cache=job.use_cache,
+            on_partial=_on_partial,
+        )
+
+    job.video_prompt = prompt_result["video_prompt"]
+    job.script = prompt_result["script"]
+    state.update(job.job_id, partial_script=None)
+
+    # 保存脚本和 Prompt 到文件
+    with open(job.output_dir / "script.json", "w", encoding="utf-8") as f:
+        json.dump(job.script, f, ensure_ascii=False, indent=2)
+    with open(job.output_dir / "video_prompt.txt", "w", encoding="utf-8") as f:
+        f.write(job.video_prompt)
+    checkpoint.save(script=job.script, video_prompt=job.video_prompt)
+
+
+def stage_video(job: PipelineJob) -> Optional[Future]:
+    """
+    步骤 3：等待白底图，提交视频生成任务（已创建过的任务直接继续轮询）
+
+    提交后立即返回 Future，阶段线程不等待生成完成：任务交给共享轮询器，
+    完成后在下载线程池中下载原始视频并记录检查点，再由 Future 把任务交给后处理阶段。
+    """
+    if job.white_bg_future is not None:
+        # 白底图生成失败时异常在这里抛出，任务按失败处理
+        job.processed_image_path = job.white_bg_future.result()
+        job.white_bg_future = None
+
+    service_label = "豆包 Seedance" if job.video_service == "seedance" else "Creatok"
+    job.update(step=3, step_name=f"AI 生成视频（{service_label}，约 2-3 分钟）")
+    checkpoint = job.checkpoint
+    state = get_job_state_store()
+
+    if checkpoint.file("raw_video"):
+        print("⏭️ 步骤 3 已完成，使用检查点")
+        job.video_result = {"status": "success", **checkpoint.get("raw_video")}
+        job.raw_video_path = checkpoint.file("raw_video")
+        state.update(job.job_id, progress=100, eta_seconds=0)
+        return None
+
+    safe_name = job.product_name.replace(" ", "_").replace("/", "_")
+    job.raw_video_path = job.output_dir / f"{safe_name}_raw.mp4"
+    start = time.time()
+    done: Future = Future()
+    video_gen = VideoGenerator()
+
+    def _on_video_progress(info: dict):
+        # 轮询进度只写实时状态（频繁更新，不落库）
+        state.update(
+            job.job_id,
+            progress=info.get("progress", 0),
+            eta_seconds=info.get("eta_seconds"),
+        )
+
+    resume_task_id = (
+        checkpoint.get("task_id") if checkpoint.get("backend") == job.video_service else None
+    )
+    def _on_task_created(task_id: str):
+        if task_id != resume_task_id:
+            # 新建了视频任务（首次执行，或原任务已失效）：上一个任务残留的下载不能续传到新视频上
+            checkpoint.discard("raw_video")
+            for suffix in (".part", ".part.json"):
+                Path(f"{job.raw_video_path}{suffix}").unlink(missing_ok=True)
+        checkpoint.save(task_id=task_id, backend=job.video_service, task_created_at=time.time())
+
+    def _submit(task_id: Optional[str]):
+        """task_id 为空时新建任务；随后交给共享轮询器，当前线程不等待"""
+        if task_id is None:
+            created = video_gen.generate_video(
+                prompt=job.video_prompt,
+                output_path=str(job.raw_video_path),
+                reference_image_path=job.processed_image_path,
+                duration=job.duration,
+                backend=job.video_service,
+                wait=False,
+                on_task_created=_on_task_created,
+            )
+            if created["status"] != "created":
+                raise Exception(created.get("error", "视频生成失败，请稍后重试"))
+            task_id = created["task_id"]
+        else:
+            print(f"⏳ 继续轮询已有任务: {task_id}")
+        watch = video_gen.watch_task(
+            task_id,
+            job.video_service,
+            on_progress=_on_video_progress,
+            started_at=checkpoint.get("task_created_at"),
+        )
+        # 轮询线程里只做转交，下载在下载线程池中执行
+        watch.add_done_callback(lambda f: _download_executor().submit(_finish, task_id, f))
+
+    def _finish(task_id: str, watch: Future):
+        try:
+            result = watch.result()
+            if result["status"] != "completed":
+                if task_id == resume_task_id:
+                    print(f"⚠️ 已有任务未成功（{result.get('error', result['status'])}），重新创建")
+                    _submit(None)
+                    return
+                raise Exception(result.get("error", "视频生成失败，请稍后重试"))
+            download = video_gen.download_video(result["video_url"], str(job.raw_video_path))
+            job.video_result = {
+                "status": "success",
+                "output_path": str(job.raw_video_path),
+                "video_url": result["video_url"],
+                "backend": job.video_service,
+                "task_id": task_id,
+                "size": download["size"],
+                "sha256": download["sha256"],
+            }
+            checkpoint.save(raw_video={
+                "path": str(job.raw_video_path),
+                "size": download["size"],
+                "sha256": download["sha256"],
+            })
+            state.update(job.job_id, progress=100, eta_seconds=0)
+        except BaseException as e:
+            _record_timing(job, "video", start)
+            done.set_exception(e)
+        else:
+            _record_timing(job, "video", start)
+            done.set_result(True)
+
+    _submit(resume_task_id)
+    return done
+
+
+def stage_post(job: PipelineJob):
+    """步骤 4：字幕 / BGM 后处理（按需），写入最终结果"""
+    safe_name = job.product_name.replace(" ", "_").replace("/", "_")
+    final_video_path = job.output_dir / f"{safe_name}.mp4"
+
+    if job.add_subtitle or job.add_bgm:
+        job.update(step=4, step_name="后处理（字幕 / BGM）")
+        builder = job.subtitle_builder
+        pp = PostProcessor()
+        with _timed(job, "post"):
+            get_postprocess_pool().run(
+                pp.process,
+                video_path=str(job.raw_video_path),
+                output_path=str(final_video_path),
+                script=job.script if job.add_subtitle else None,
+                add_subtitle=job.add_subtitle,
+                add_bgm=job.add_bgm,
+                subtitle_filters=(
+                    builder.build() if builder and builder.matches(job.script) else None
+                ),
+            )
+        db.add_asset(job.job_id, "video", str(final_video_path))
+    else:
+        shutil.copy2(str(job.raw_video_path), str(final_video_path))
+        db.add_asset(job.job_id, "video", str(final_video_path),
+                     size=job.video_result.get("size"), sha256=job.video_result.get("sha256"))
+
+    # 清理临时原始视频
+    try:
+        job.raw_video_path.unlink(missing_ok=True)
+    except Exception:
+        pass
+
+    job.update(
+        status="success",
+        step_name="生成完成",
+        video_path=str(final_video_path),
+        script=json.dumps(job.script, ensure_ascii=False),
+        video_prompt=job.video_prompt,
+        timings=_timings(job),
+    )
+
+
+def _timings(job: PipelineJob) -> Dict[str, Dict]:
+    """各步骤耗时，附带任务总耗时 total"""
+    timings = dict(job.timings)
+    if job.started_at:
+        timings["total"] = {"start": 0.0, "seconds": round(time.time() - job.started_at, 2)}
+    return timings
+
+
+# ── 阶段调度 ─────────────────────────────────────────────────────
+
+
+class Stage:
+    """
+    一个流水线阶段：有界输入队列 + 固定数量的工作线程
+
+    fn 返回 Future 时（如视频生成），工作线程立即领取下一条任务，
+    Future 结束后在结束它的线程中把任务交给下游（下游队列满时阻塞的是那个线程）。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[PipelineJob], Optional[Future]],
+        workers: int,
+        queue_size: int,
+    ):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.queue: "queue.Queue[PipelineJob]" = queue.Queue(maxsize=max(1, queue_size))
+        self.next: Optional["Stage"] = None
+        self.active = 0
+        self.waiting = 0
+        self.processed = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f"pipeline-{self.name}-{i}", daemon=True).start()
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            with self._lock:
+                self.active += 1
+            pending, error = None, None
+            try:
+                pending = self.fn(job)
+            except BaseException as e:
+                # 阶段线程不能因单个任务退出
+                error = e
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    if isinstance(pending, Future):
+                        self.waiting += 1
+                    else:
+                        self.processed += 1
+
+            if isinstance(pending, Future):
+                pending.add_done_callback(lambda f, job=job: self._resume(job, f))
+            else:
+                self._complete(job, error)
+
+    def _resume(self, job: PipelineJob, future: Future):
+        with self._lock:
+            self.waiting -= 1
+            self.processed += 1
+        try:
+            future.result()
+            error = None
+        except BaseException as e:
+            error = e
+        self._complete(job, error)
+
+    def _complete(self, job: PipelineJob, error: Optional[BaseException]):
+        """本阶段结束：失败时写入失败状态并结束任务，成功时交给下游"""
+        if error is not None:
+            # 失败状态写入本身出错也不能让 future 悬空
+            try:
+                job.update(status="failed", error=str(error) or type(error).__name__, timings=_timings(job))
+            except BaseException as update_error:
+                print(f"⚠️ 任务 {job.job_id} 失败状态写入出错: {update_error}")
+            finally:
+                if not job.future.done():
+                    job.future.set_result(False)
+            return
+
+        if self.next is None:
+            job.future.set_result(True)
+        else:
+            # 下游队列满时阻塞在这里，本阶段不再领取新任务（背压）
+            self.next.queue.put(job)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "active": self.active,
+                "waiting": self.waiting,
+                "queued": self.queue.qsize(),
+                "processed": self.processed,
+            }
+
+
+class Pipeline:
+    """按顺序串联的阶段"""
+
+    def __init__(self, stages: List[Stage]):
+        self.stages = stages
+        for upstream, downstream in zip(stages, stages[1:]):
+            upstream.next = downstream
+        for stage in stages:
+            stage.start()
+
+    def submit(self, job: PipelineJob) -> Future:
+        """放入第一个阶段的队列（队列满时阻塞），返回任务结束时完成的 Future（结果为是否成功）"""
+        self.stages[0].queue.put(job)
+        return job.future
+
+    def stats(self) -> Dict[str, Dict]:
+        return {stage.name: stage.stats() for stage in self.stages}
+
+
+_pipeline: Optional[Pipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline() -> Pipeline:
+    """获取进程内共享的流水线（首次调用时按配置创建并启动各阶段线程）"""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            size = settings.pipeline_queue_size
+            _pipeline = Pipeline([
+                Stage("image", stage_image, settings.pipeline_image_workers, size),
+                Stage("prompt", stage_prompt, settings.pipeline_prompt_workers, size),
+                Stage("video", stage_video, settings.pipeline_video_workers, size),
+                Stage("post", stage_post, settings.pipeline_post_workers, size),
+            ])
+        return _pipeline
+
+
+def run_pipeline(
+    job_id: str,
+    image_path: str,
+    product_name: str,
+    selling_points: List[str],
+    video_service: str = "seedance",
+    add_subtitle: bool = False,
+    add_bgm: bool = False,
+    use_cache: bool = True,
+) -> bool:
+    """
+    执行完整的视频生成流程并等待结束（阻塞调用，返回是否成功）
+
+    步骤:
+    1. 图片处理（GPT-4o Vision 分析 + DALL-E 3 白底图）
+    2. 脚本生成（GPT-4o 视频脚本 + Prompt）
+    3. 视频生成（Seedance / Creatok）
+    4. 后处理（字幕 + BGM，按需执行）
+
+    每步产出记录在检查点中，重试或服务重启后从第一个未完成的步骤继续。
+    """
+    return submit_pipeline(PipelineJob(
+        job_id=job_id,
+        image_path=image_path,
+        product_name=product_name,
+        selling_points=selling_points,
+        video_service=video_service,
+        add_subtitle=add_subtitle,
+        add_bgm=add_bgm,
+        use_cache=use_cache,
+    )).result()
+
+
+def submit_pipeline(job: PipelineJob) -> Future:
+    """提交到共享流水线，不等待结束"""
+    return get_pipeline().submit(job)
+
+
+# ── 队列对接 ─────────────────────────────────────────────────────
+
+
+def _ensure_job_state(job_id: str, payload: dict):
+    """服务重启后恢复的任务在状态存储中没有记录，从数据库补齐"""
+    state = get_job_state_store()
+    if job_id in state:
+        return
+    record = db.get_job_summary(job_id) or {}
+    state.create(job_id, {
+        "status": record.get("status", "queued"),
+        "step": record.get("step", 0),
+        "step_name": record.get("step_name", "等待中"),
+        "product_name": payload["product_name"],
+        "video_service": payload["video_service"],
+        "add_subtitle": payload["add_subtitle"],
+        "add_bgm": payload["add_bgm"],
+    })
+
+
+def _run_queued_pipeline(job_id: str, payload: dict) -> Future:
+    """
+    队列执行入口：把任务交给流水线后立即返回 Future，队列工作线程继续领取下一条；
+    任务结束（成功或失败）后队列条目才被确认，上传的图片也在此时删除，中断时保留以便恢复
+    """
+    _ensure_job_state(job_id, payload)
+    future = submit_pipeline(PipelineJob(
+        job_id=job_id,
+        image_path=payload["image_path"],
+        product_name=payload["product_name"],
+        selling_points=payload["selling_points"],
+        video_service=payload["video_service"],
+        add_subtitle=payload["add_subtitle"],
+        add_bgm=payload["add_bgm"],
+        use_cache=payload.get("use_cache", True),
+    ))
+    future.add_done_callback(lambda _: discard_upload(payload["image_path"]))
+    return future
+
+
+def _give_up_pipeline(job_id: str, payload: dict, error: str):
+    _ensure_job_state(job_id, payload)
+    get_job_state_store().update(job_id, status="failed", error=error)
+    get_journal().record(job_id, status="failed", error=error)
+    discard_upload(payload["image_path"])
+
+
+def discard_upload(image_path: str):
+    """删除上传目录中的原图（重试时使用的是检查点里的副本，不删除）"""
+    path = Path(image_path)
+    if path.parent.resolve() == (settings.temp_dir / "uploads").resolve():
+        path.unlink(missing_ok=True)
+
+
+def resume_step(checkpoint: Checkpoint) -> int:
+    """检查点中第一个未完成的步骤（1-4）"""
+    if not (checkpoint.has("analysis") and checkpoint.file("white_bg")):
+        return 1
+    if not checkpoint.has("script", "video_prompt"):
+        return 2
+    if not checkpoint.file("raw_video"):
+        return 3
+    return 4
+
+
+job_queue.register_handler("pipeline", _run_queued_pipeline, on_give_up=_give_up_pipeline)
@@ -3,16 +3,82 @@
 功能：
 1. 字幕合成 - 从 script.json 读取文案，用 FFmpeg 烧录到视频
 2. BGM 混音  - 从 static/bgm/ 目录读取音频文件，FFmpeg 混音
+3. 两者同时需要时默认用一次 FFmpeg（单个 filter_complex）直接输出
+4. 重新编码时使用命名编码档位（preset / CRF / 线程数 / faststart），见 ENCODE_PROFILES
+5. 字幕引擎可选：drawtext（默认）/ ass（写 .ass 文件，subtitles 滤镜烧录）/
+   overlay（Pillow 预渲染字幕卡 PNG，一个 overlay 叠加）
+6. 输入视频只用 ffprobe 探测一次（按路径 + mtime + 大小缓存），据此直接选定 FFmpeg 命令
+7. BGM 从曲库（bgm_library）按情绪 / 时长选曲，使用响度归一化副本；曲目够长时不用 aloop
 """
+import json
 import subprocess
 import shutil
 import platform
+import tempfile
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional, Dict, List
-
-
-# BGM 文件目录
-BGM_DIR = Path(__file__).parent.parent / "static" / "bgm"
+from typing import Optional, Dict, List, Tuple
+
+from .config import settings
+from .bgm_library import BGM_DIR, BgmTrack, get_bgm_library
+
+
+# BGM 相对音量（曲目已归一化到 bgm_library.TARGET_LUFS）
+BGM_VOLUME = 0.25
+
+# 编码档位：重新编码视频时的 libx264 参数
+#   preset  — 编码速度档（越慢压缩率越高）
+#   crf     — 画质（越小画质越高、文件越大）
+#   threads — 编码线程数，0 表示由 FFmpeg 按 CPU 核数决定
+#             （后处理执行器按每个 FFmpeg 进程 2 核估算并发数，常规档位固定 2 线程，避免多个进程抢占 CPU）
+ENCODE_PROFILES: Dict[str, Dict] = {
+    # 预览：最快出片，画质次要；ultrafast 每帧计算量小，多线程收益低
+    "fast-preview": {"preset": "ultrafast", "crf": 28, "threads": 2},
+    # 上传 TikTok：平台会再次转码，中等画质足够；与执行器的并发估算一致
+    "tiktok-upload": {"preset": "veryfast", "crf": 23, "threads": 2},
+    # 存档：高画质、文件更小，编码最慢，用满所有核缩短耗时
+    "archive": {"preset": "slow", "crf": 18, "threads": 0},
+}
+
+
+# 字幕引擎
+SUBTITLE_ENGINES = ("drawtext", "ass", "overlay")
+
+# 各类字幕的样式（与 SubtitleFilterBuilder 的 drawtext 参数一致）
+#   y — 文字顶部距画面顶部（top）或距画面底部（bottom）的像素
+SUBTITLE_STYLES: Dict[str, Dict] = {
+    "hook": {"fontsize": 38, "color": (255, 255, 255), "anchor": "top", "y": 60},
+    "scene": {"fontsize": 42, "color": (255, 255, 255), "anchor": "bottom", "y": 90},
+    "cta": {"fontsize": 38, "color": (255, 255, 0), "anchor": "bottom", "y": 90},
+}
+
+# 取不到视频分辨率时按竖版 720x1280 处理
+DEFAULT_FRAME_SIZE = (720, 1280)
+
+
+def encode_args(profile: str) -> List[str]:
+    """
+    重新编码视频时的 FFmpeg 输出参数
+
+    Args:
+        profile: ENCODE_PROFILES 中的档位名
+
+    Returns:
+        参数列表（含 -c:v libx264 / -preset / -crf / -threads / -pix_fmt / -movflags）
+    """
+    if profile not in ENCODE_PROFILES:
+        raise ValueError(f"未知的编码档位: {profile}（可选 {' / '.join(ENCODE_PROFILES)}）")
+    options = ENCODE_PROFILES[profile]
+    return [
+        "-c:v", "libx264",
+        "-preset", options["preset"],
+        "-crf", str(options["crf"]),
+        "-threads", str(options["threads"]),
+        # yuv420p 兼容所有播放器；faststart 把 moov 放到文件头，边下边播
+        "-pix_fmt", "yuv420p",
+        "-movflags", "+faststart",
+    ]
 
 
 def _find_chinese_font() -> str:
@@ -49,9 +115,21 @@ def _find_chinese_font() -> str:
 class PostProcessor:
     """视频后处理器"""
 
-    def __init__(self):
+    def __init__(
+        self,
+        encode_profile: Optional[str] = None,
+        subtitle_engine: Optional[str] = None,
+        bgm_mood: Optional[str] = None,
+    ):
         self.ffmpeg_available = shutil.which("ffmpeg") is not None
         self.font_path = _find_chinese_font()
+        self.bgm_mood = settings.bgm_mood if bgm_mood is None else bgm_mood
+        self.encode_args = encode_args(encode_profile or settings.encode_profile)
+        self.subtitle_engine = subtitle_engine or settings.subtitle_engine
+        if self.subtitle_engine not in SUBTITLE_ENGINES:
+            raise ValueError(
+                f"未知的字幕引擎: {self.subtitle_engine}（可选 {' / '.join(SUBTITLE_ENGINES)}）"
+            )
         BGM_DIR.mkdir(parents=True, exist_ok=True)
 
     def add_subtitles(
@@ -59,88 +137,44 @@ class PostProcessor:
         video_path: str,
         script: dict,
         output_path: str,
+        filters: Optional[List[str]] = None,
     ) -> Dict:
         """
         将脚本文案烧录为字幕
 
         从 script.json 的 scenes[].text 字段读取文案，
-        按每个场景的 duration 计算时间轴，用 FFmpeg drawtext 叠加。
+        按每个场景的 duration 计算时间轴，用 subtitle_engine 指定的方式叠加。
 
         Args:
             video_path: 输入视频路径
             script: 视频脚本字典（含 hook / scenes / cta）
             output_path: 输出视频路径
+            filters: 预先构建好的 drawtext 滤镜列表（见 SubtitleFilterBuilder，仅 drawtext 引擎使用），
+                     为空时按 script 构建
         """
         if not self.ffmpeg_available:
             shutil.copy2(video_path, output_path)
             return {"status": "skipped", "reason": "FFmpeg 未安装，跳过字幕"}
 
-        scenes: List[dict] = script.get("scenes", [])
-        filters: List[str] = []
-        current_time = 0.0
-
-        # Hook 字幕（开头 3 秒）
-        hook = script.get("hook", "").strip()
-        if hook:
-            safe = _escape_drawtext(hook)
-            font_opt = f":fontfile='{self.font_path}'" if self.font_path else ""
-            filters.append(
-                f"drawtext=text='{safe}'"
-                f":fontsize=38:fontcolor=white"
-                f":bordercolor=black:borderw=2"
-                f":x=(w-text_w)/2:y=60"
-                f"{font_opt}"
-                f":enable='between(t,0,3)'"
-            )
-            current_time = 3.0
-
-        # 每个场景字幕
-        for scene in scenes:
-            text = scene.get("text", "").strip()
-            duration = float(scene.get("duration", 3))
-            if text:
-                safe = _escape_drawtext(text)
-                font_opt = f":fontfile='{self.font_path}'" if self.font_path else ""
-                start = current_time
-                end = current_time + duration
-                filters.append(
-                    f"drawtext=text='{safe}'"
-                    f":fontsize=42:fontcolor=white"
-                    f":bordercolor=black:borderw=2"
-                    f":x=(w-text_w)/2:y=h-90"
-                    f"{font_opt}"
-                    f":enable='between(t,{start:.1f},{end:.1f})'"
-                )
-            current_time += duration
-
-        # CTA 字幕（最后 2 秒）
-        cta = script.get("cta", "").strip()
-        if cta:
-            safe = _escape_drawtext(cta)
-            font_opt = f":fontfile='{self.font_path}'" if self.font_path else ""
-            filters.append(
-                f"drawtext=text='{safe}'"
-                f":fontsize=38:fontcolor=yellow"
-                f":bordercolor=black:borderw=2"
-                f":x=(w-text_w)/2:y=h-90"
-                f"{font_opt}"
-                f":enable='gte(t,{current_time:.1f})'"
-            )
-
-        if not filters:
-            shutil.copy2(video_path, output_path)
-            return {"status": "success", "note": "无字幕文案，跳过字幕处理"}
+        with tempfile.TemporaryDirectory(dir=Path(output_path).parent) as work_dir:
+            inputs, graph = self._subtitle_graph(video_path, script, filters, Path(work_dir))
+            if not graph:
+                shutil.copy2(video_path, output_path)
+                return {"status": "success", "note": "无字幕文案，跳过字幕处理"}
+
+            cmd = [
+                "ffmpeg", "-y",
+                "-i", video_path,
+                *inputs,
+                "-filter_complex", graph,
+                "-map", "[vout]",
+                "-map", "0:a?",
+                *self.encode_args,
+                "-c:a", "copy",
+                output_path,
+            ]
+            result = subprocess.run(cmd, capture_output=True, text=True)
 
-        vf = ",".join(filters)
-        cmd = [
-            "ffmpeg", "-y",
-            "-i", video_path,
-            "-vf", vf,
-            "-c:a", "copy",
-            output_path,
-        ]
-
-        result = subprocess.run(cmd, capture_output=True, text=True)
         if result.returncode == 0:
             print(f"✅ 字幕合成完成: {output_path}")
             return {"status": "success", "output": output_path}
@@ -153,12 +187,12 @@ class PostProcessor:
         self,
         video_path: str,
         output_path: str,
-        volume: float = 0.25,
+        volume: float = BGM_VOLUME,
     ) -> Dict:
         """
         混入背景音乐
 
-        从 static/bgm/ 目录查找第一个音频文件（mp3/wav/m4a），
+        从 BGM 曲库按情绪和视频时长选曲（使用响度归一化副本），
         使用 FFmpeg 混音，BGM 音量为 25%。
 
         Args:
@@ -170,52 +204,59 @@ class PostProcessor:
             shutil.copy2(video_path, output_path)
             return {"status": "skipped", "reason": "FFmpeg 未安装，跳过 BGM"}
 
-        bgm_file = self._find_bgm()
-        if not bgm_file:
+        layout = probe_streams(video_path)
+        track = self._find_bgm(layout["duration"])
+        if not track:
             shutil.copy2(video_path, output_path)
             return {
                 "status": "skipped",
                 "reason": f"未找到 BGM 文件，请在 static/bgm/ 目录放置 mp3/wav 文件",
             }
 
-        print(f"🎵 混入 BGM: {bgm_file.name}")
+        print(f"🎵 混入 BGM: {track.name}")
+
+        # 视频无音轨（如 Seedance 生成的片段）时直接用方式二，不再白跑一次 amix
+        has_audio = layout["has_audio"]
+        bgm_chain = _bgm_chain(track, layout["duration"], volume)
 
-        # 尝试方式一：视频有音轨，amix 混音
+        # 方式一：视频有音轨，amix 混音
         cmd = [
             "ffmpeg", "-y",
             "-i", video_path,
-            "-i", str(bgm_file),
+            "-i", track.mix_path,
             "-filter_complex",
-            f"[1:a]volume={volume},aloop=loop=-1:size=2e+09[bgm];"
+            f"[1:a]{bgm_chain}[bgm];"
             f"[0:a][bgm]amix=inputs=2:duration=first:dropout_transition=2[aout]",
             "-map", "0:v",
             "-map", "[aout]",
             "-c:v", "copy",
+            "-movflags", "+faststart",
             output_path,
         ]
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        if has_audio is not False:
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            if result.returncode == 0:
+                print(f"✅ BGM 混音完成: {output_path}")
+                return {"status": "success", "output": output_path, "bgm": track.name}
 
-        if result.returncode == 0:
-            print(f"✅ BGM 混音完成: {output_path}")
-            return {"status": "success", "output": output_path, "bgm": bgm_file.name}
-
-        # 方式二：视频无音轨，直接添加 BGM
+        # 方式二：视频无音轨（或探测不到时方式一失败），直接添加 BGM
         cmd2 = [
             "ffmpeg", "-y",
             "-i", video_path,
-            "-i", str(bgm_file),
+            "-i", track.mix_path,
             "-map", "0:v",
             "-map", "1:a",
             "-c:v", "copy",
             "-af", f"volume={volume}",
             "-shortest",
+            "-movflags", "+faststart",
             output_path,
         ]
         result2 = subprocess.run(cmd2, capture_output=True, text=True)
 
         if result2.returncode == 0:
             print(f"✅ BGM 添加完成: {output_path}")
-            return {"status": "success", "output": output_path, "bgm": bgm_file.name}
+            return {"status": "success", "output": output_path, "bgm": track.name}
 
         print(f"⚠️ BGM 混音失败，使用原视频")
         shutil.copy2(video_path, output_path)
@@ -228,9 +269,13 @@ class PostProcessor:
         script: Optional[dict] = None,
         add_subtitle: bool = False,
         add_bgm: bool = False,
+        subtitle_filters: Optional[List[str]] = None,
     ) -> Dict:
         """
-        后处理主入口，按顺序执行字幕 → BGM
+        后处理主入口
+
+        默认（postprocess_mode=single_pass）用一次 FFmpeg 调用同时完成字幕和 BGM，
+        直接写入 output_path；失败时回退为逐步处理（字幕 → BGM，经临时文件）。
 
         Args:
             video_path: 原始视频路径
@@ -238,48 +283,510 @@ class PostProcessor:
             script: 视频脚本（字幕来源）
             add_subtitle: 是否添加字幕
             add_bgm: 是否添加 BGM
+            subtitle_filters: 预先构建好的字幕滤镜（脚本流式生成时提前准备）
         """
         if not add_subtitle and not add_bgm:
             shutil.copy2(video_path, output_path)
             return {"status": "success", "output": output_path, "steps": []}
 
-        tmp_dir = Path(output_path).parent
-        tmp_sub = str(tmp_dir / "_tmp_subtitle.mp4")
-        tmp_bgm = str(tmp_dir / "_tmp_bgm.mp4")
+        if settings.postprocess_mode == "single_pass" and self.ffmpeg_available:
+            result = self._process_single_pass(
+                video_path, output_path, script, add_subtitle, add_bgm, subtitle_filters
+            )
+            if result is not None:
+                return result
+
+        return self._process_multi_pass(
+            video_path, output_path, script, add_subtitle, add_bgm, subtitle_filters
+        )
+
+    def _process_single_pass(
+        self,
+        video_path: str,
+        output_path: str,
+        script: Optional[dict],
+        add_subtitle: bool,
+        add_bgm: bool,
+        subtitle_filters: Optional[List[str]],
+    ) -> Optional[Dict]:
+        """
+        单次 FFmpeg：字幕滤镜和 amix/aloop 音频图放进同一个 filter_complex
+
+        比逐步处理少一次解码 / 编码、两个临时文件和一次整文件复制。
+        FFmpeg 执行失败时返回 None，由调用方回退为逐步处理。
+        """
+        with tempfile.TemporaryDirectory(dir=Path(output_path).parent) as work_dir:
+            sub_inputs, sub_graph = [], ""
+            if add_subtitle and script:
+                sub_inputs, sub_graph = self._subtitle_graph(
+                    video_path, script, subtitle_filters, Path(work_dir)
+                )
+            layout = probe_streams(video_path)
+            track = self._find_bgm(layout["duration"]) if add_bgm else None
+
+            steps = []
+            if add_subtitle and script:
+                steps.append({"step": "字幕", "status": "success", "engine": self.subtitle_engine}
+                             if sub_graph
+                             else {"step": "字幕", "status": "success", "note": "无字幕文案，跳过字幕处理"})
+            if add_bgm:
+                steps.append({"step": "BGM", "status": "success", "bgm": track.name} if track
+                             else {"step": "BGM", "status": "skipped",
+                                   "reason": "未找到 BGM 文件，请在 static/bgm/ 目录放置 mp3/wav 文件"})
+
+            if not sub_graph and not track:
+                shutil.copy2(video_path, output_path)
+                return {"status": "success", "output": output_path, "steps": steps}
+
+            graph = []
+            cmd = ["ffmpeg", "-y", "-i", video_path, *sub_inputs]
+            if sub_graph:
+                graph.append(sub_graph)
+            if track:
+                # BGM 排在字幕卡等额外输入之后
+                bgm_index = 1 + sub_inputs.count("-i")
+                cmd += ["-i", track.mix_path]
+                if layout["has_audio"] is not False:
+                    bgm_chain = _bgm_chain(track, layout["duration"], BGM_VOLUME)
+                    graph.append(f"[{bgm_index}:a]{bgm_chain}[bgm]")
+                    graph.append("[0:a][bgm]amix=inputs=2:duration=first:dropout_transition=2[aout]")
+                else:
+                    graph.append(f"[{bgm_index}:a]volume={BGM_VOLUME}[aout]")
+
+            cmd += ["-filter_complex", ";".join(graph)]
+            if sub_graph:
+                cmd += ["-map", "[vout]", *self.encode_args]
+            else:
+                cmd += ["-map", "0:v", "-c:v", "copy", "-movflags", "+faststart"]
+            if track:
+                cmd += ["-map", "[aout]", "-shortest"]
+            else:
+                cmd += ["-map", "0:a?", "-c:a", "copy"]
+            cmd.append(output_path)
+
+            result = subprocess.run(cmd, capture_output=True, text=True)
+
+        if result.returncode != 0:
+            print(f"⚠️ 单次 FFmpeg 后处理失败，改为逐步处理: {result.stderr[-300:]}")
+            Path(output_path).unlink(missing_ok=True)
+            return None
+
+        print(f"✅ 后处理完成（单次 FFmpeg）: {output_path}")
+        return {"status": "success", "output": output_path, "steps": steps, "mode": "single_pass"}
+
+    def _process_multi_pass(
+        self,
+        video_path: str,
+        output_path: str,
+        script: Optional[dict],
+        add_subtitle: bool,
+        add_bgm: bool,
+        subtitle_filters: Optional[List[str]],
+    ) -> Dict:
+        """
+        逐步处理：字幕 → BGM，每步一次 FFmpeg
+
+        最后一步直接写入 output_path；只有字幕 + BGM 都需要时才经过一个临时文件。
+        """
+        tmp_sub = str(Path(output_path).parent / "_tmp_subtitle.mp4")
         steps = []
         current = video_path
 
         try:
             if add_subtitle and script:
-                res = self.add_subtitles(current, script, tmp_sub)
+                target = tmp_sub if add_bgm else output_path
+                res = self.add_subtitles(current, script, target, filters=subtitle_filters)
                 steps.append({"step": "字幕", **res})
-                if res["status"] == "success":
-                    current = tmp_sub
+                # 跳过 / 失败时 add_subtitles 也会把原视频复制到 target
+                current = target
 
             if add_bgm:
-                res = self.add_bgm(current, tmp_bgm)
+                res = self.add_bgm(current, output_path)
                 steps.append({"step": "BGM", **res})
-                if res["status"] == "success":
-                    current = tmp_bgm
+                current = output_path
 
-            shutil.copy2(current, output_path)
+            if current != output_path:
+                shutil.copy2(current, output_path)
 
         finally:
-            for tmp in (tmp_sub, tmp_bgm):
-                try:
-                    Path(tmp).unlink(missing_ok=True)
-                except Exception:
-                    pass
-
-        return {"status": "success", "output": output_path, "steps": steps}
-
-    def _find_bgm(self) -> Optional[Path]:
-        """从 static/bgm/ 目录查找第一个音频文件"""
-        for ext in ("*.mp3", "*.wav", "*.m4a", "*.aac"):
-            files = list(BGM_DIR.glob(ext))
-            if files:
-                return files[0]
-        return None
+            try:
+                Path(tmp_sub).unlink(missing_ok=True)
+            except Exception:
+                pass
+
+        return {"status": "success", "output": output_path, "steps": steps, "mode": "multi_pass"}
+
+    def _subtitle_graph(
+        self,
+        video_path: str,
+        script: dict,
+        filters: Optional[List[str]],
+        work_dir: Path,
+    ) -> Tuple[List[str], str]:
+        """
+        按字幕引擎生成视频滤镜图（从 [0:v] 到 [vout]）
+
+        Args:
+            video_path: 输入视频路径（ass / overlay 需要按分辨率排版）
+            script: 视频脚本
+            filters: 预先构建好的 drawtext 滤镜（仅 drawtext 引擎使用）
+            work_dir: 存放 .ass 文件 / 字幕卡 PNG 的临时目录
+
+        Returns:
+            (额外的 FFmpeg 输入参数, 滤镜图)；没有字幕文案时滤镜图为空字符串
+        """
+        if self.subtitle_engine == "drawtext":
+            if filters is None:
+                filters = build_subtitle_filters(script, self.font_path)
+            return [], f"[0:v]{','.join(filters)}[vout]" if filters else ""
+
+        cues = build_subtitle_cues(script)
+        if not cues:
+            return [], ""
+        frame_size = probe_streams(video_path)["frame_size"]
+
+        if self.subtitle_engine == "ass":
+            ass_path = work_dir / "subtitles.ass"
+            write_ass_subtitles(cues, ass_path, frame_size, self.font_path)
+            options = f"filename='{_escape_filter_path(ass_path)}'"
+            if self.font_path:
+                options += f":fontsdir='{_escape_filter_path(Path(self.font_path).parent)}'"
+            return [], f"[0:v]subtitles={options}[vout]"
+
+        # overlay：所有字幕卡经 concat 合成一路图片流，只需一个 overlay
+        concat_list = render_subtitle_cards(cues, work_dir, frame_size, self.font_path)
+        inputs = ["-f", "concat", "-safe", "0", "-i", str(concat_list)]
+        return inputs, "[0:v][1:v]overlay=0:0:eof_action=repeat[vout]"
+
+    def _find_bgm(self, duration: Optional[float] = None) -> Optional[BgmTrack]:
+        """从 BGM 曲库选曲（情绪取 bgm_mood，优先能覆盖视频时长的曲目）"""
+        return get_bgm_library().select(mood=self.bgm_mood or None, duration=duration)
+
+
+class SubtitleFilterBuilder:
+    """
+    drawtext 字幕滤镜构建器
+
+    可以在脚本流式生成时逐条喂入 hook / scene / cta，提前转义好文案；
+    时间轴在 build() 时按最终的 hook / scenes / cta 统一计算，与喂入顺序无关。
+    """
+
+    def __init__(self, font_path: str = ""):
+        self.font_opt = f":fontfile='{font_path}'" if font_path else ""
+        self.script: dict = {"hook": "", "scenes": [], "cta": ""}
+        self._escaped: Dict[str, str] = {}
+
+    def _escape(self, text: str) -> str:
+        if text not in self._escaped:
+            self._escaped[text] = _escape_drawtext(text)
+        return self._escaped[text]
+
+    def add_hook(self, hook: str):
+        """Hook 字幕（开头 3 秒）"""
+        hook = (hook or "").strip()
+        self.script["hook"] = hook
+        if hook:
+            self._escape(hook)
+
+    def add_scene(self, scene: dict):
+        """追加一个场景字幕"""
+        self.script["scenes"].append(scene)
+        text = str(scene.get("text", "")).strip()
+        if text:
+            self._escape(text)
+
+    def add_cta(self, cta: str):
+        self.script["cta"] = (cta or "").strip()
+
+    def matches(self, script: dict) -> bool:
+        """已喂入的内容是否与最终脚本一致（流式结果可能被回退逻辑替换）"""
+        return (
+            self.script["hook"] == (script.get("hook") or "").strip()
+            and self.script["scenes"] == list(script.get("scenes", []))
+            and self.script["cta"] == (script.get("cta") or "").strip()
+        )
+
+    def build(self) -> List[str]:
+        """按已喂入的完整内容计算时间轴，返回滤镜列表（与 build_subtitle_cues 的时间规则一致）"""
+        filters = []
+        for cue in build_subtitle_cues(self.script):
+            text = self._escape(cue["text"])
+            if cue["kind"] == "hook":
+                filters.append(
+                    f"drawtext=text='{text}'"
+                    f":fontsize=38:fontcolor=white"
+                    f":bordercolor=black:borderw=2"
+                    f":x=(w-text_w)/2:y=60"
+                    f"{self.font_opt}"
+                    f":enable='between(t,{cue['start']:.1f},{cue['end']:.1f})'"
+                )
+            elif cue["kind"] == "scene":
+                filters.append(
+                    f"drawtext=text='{text}'"
+                    f":fontsize=42:fontcolor=white"
+                    f":bordercolor=black:borderw=2"
+                    f":x=(w-text_w)/2:y=h-90"
+                    f"{self.font_opt}"
+                    f":enable='between(t,{cue['start']:.1f},{cue['end']:.1f})'"
+                )
+            else:
+                filters.append(
+                    f"drawtext=text='{text}'"
+                    f":fontsize=38:fontcolor=yellow"
+                    f":bordercolor=black:borderw=2"
+                    f":x=(w-text_w)/2:y=h-90"
+                    f"{self.font_opt}"
+                    f":enable='gte(t,{cue['start']:.1f})'"
+                )
+        return filters
+
+
+def build_subtitle_filters(script: dict, font_path: str = "") -> List[str]:
+    """根据完整脚本构建 drawtext 滤镜列表"""
+    builder = SubtitleFilterBuilder(font_path)
+    builder.add_hook(script.get("hook", ""))
+    for scene in script.get("scenes", []):
+        builder.add_scene(scene)
+    builder.add_cta(script.get("cta", ""))
+    return builder.build()
+
+
+def build_subtitle_cues(script: dict) -> List[Dict]:
+    """
+    把脚本转成字幕时间轴（drawtext / ass / overlay 三种引擎共用）
+
+    Returns:
+        [{"kind": "hook"/"scene"/"cta", "text", "start", "end"}]，CTA 的 end 为 None（持续到视频结束）
+    """
+    cues = []
+    current_time = 0.0
+    hook = (script.get("hook") or "").strip()
+    if hook:
+        cues.append({"kind": "hook", "text": hook, "start": 0.0, "end": 3.0})
+        current_time = 3.0
+    for scene in script.get("scenes", []):
+        text = str(scene.get("text", "")).strip()
+        duration = float(scene.get("duration", 3))
+        if text:
+            cues.append({"kind": "scene", "text": text,
+                         "start": current_time, "end": current_time + duration})
+        current_time += duration
+    cta = (script.get("cta") or "").strip()
+    if cta:
+        cues.append({"kind": "cta", "text": cta, "start": current_time, "end": None})
+    return cues
+
+
+def write_ass_subtitles(
+    cues: List[Dict],
+    ass_path: Path,
+    frame_size: Tuple[int, int] = DEFAULT_FRAME_SIZE,
+    font_path: str = "",
+) -> Path:
+    """
+    把字幕时间轴写成 ASS 文件（libass 一次排版，逐帧只做贴图）
+
+    Args:
+        cues: build_subtitle_cues 的结果
+        ass_path: 输出 .ass 路径
+        frame_size: 视频分辨率 (宽, 高)，作为 PlayResX / PlayResY，字号即像素
+        font_path: 字体文件路径（取其字体族名，配合 subtitles 滤镜的 fontsdir）
+    """
+    width, height = frame_size
+    font_name = _font_family(font_path) or "Arial"
+    lines = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {width}",
+        f"PlayResY: {height}",
+        "WrapStyle: 2",
+        "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, OutlineColour, BackColour, "
+        "Bold, Italic, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV",
+    ]
+    for kind, style in SUBTITLE_STYLES.items():
+        # 8 = 顶部居中，2 = 底部居中；底部样式的 MarginV 是文字底边到画面底部的距离
+        if style["anchor"] == "top":
+            alignment, margin_v = 8, style["y"]
+        else:
+            alignment, margin_v = 2, max(0, style["y"] - style["fontsize"])
+        lines.append(
+            f"Style: {kind},{font_name},{style['fontsize']},{_ass_color(style['color'])},"
+            f"&H00000000,&H00000000,0,0,1,2,0,{alignment},10,10,{margin_v}"
+        )
+    lines += ["", "[Events]", "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text"]
+    for cue in cues:
+        # CTA 持续到视频结束，结束时间取一个足够大的值
+        end = cue["end"] if cue["end"] is not None else 35999.0
+        text = cue["text"].replace("\\", "\\\\").replace("{", "\\{").replace("}", "\\}").replace("\n", "\\N")
+        lines.append(
+            f"Dialogue: 0,{_ass_time(cue['start'])},{_ass_time(end)},{cue['kind']},,0,0,0,,{text}"
+        )
+    ass_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return ass_path
+
+
+def render_subtitle_cards(
+    cues: List[Dict],
+    work_dir: Path,
+    frame_size: Tuple[int, int] = DEFAULT_FRAME_SIZE,
+    font_path: str = "",
+) -> Path:
+    """
+    用 Pillow 把字幕预渲染成整帧透明 PNG，并写出 FFmpeg concat 列表
+
+    时间轴按所有字幕的起止点切成若干区间，每个区间渲染一张卡（同时出现的字幕画在同一张上），
+    字幕再多也只对应一路输入和一个 overlay。
+
+    Returns:
+        concat 列表文件路径
+    """
+    from PIL import Image, ImageDraw, ImageFont
+
+    width, height = frame_size
+    fonts = {}
+
+    def _font(size: int):
+        if size not in fonts:
+            fonts[size] = (ImageFont.truetype(font_path, size) if font_path
+                           else ImageFont.load_default(size))
+        return fonts[size]
+
+    points = sorted({c["start"] for c in cues} | {c["end"] for c in cues if c["end"] is not None} | {0.0})
+    entries = []
+    for i, start in enumerate(points):
+        end = points[i + 1] if i + 1 < len(points) else None
+        active = [c for c in cues
+                  if c["start"] <= start and (c["end"] is None or c["end"] > start)]
+        card = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(card)
+        for cue in active:
+            style = SUBTITLE_STYLES[cue["kind"]]
+            font = _font(style["fontsize"])
+            text_width = draw.textlength(cue["text"], font=font)
+            y = style["y"] if style["anchor"] == "top" else height - style["y"]
+            draw.text(
+                ((width - text_width) / 2, y), cue["text"], font=font,
+                fill=style["color"] + (255,), stroke_width=2, stroke_fill=(0, 0, 0, 255),
+            )
+        path = work_dir / f"card_{i:04d}.png"
+        card.save(path, optimize=False, compress_level=1)
+        entries.append((path, end - start if end is not None else None))
+
+    # concat 分离器：最后一张卡需重复列出一次，否则其时长会被忽略；overlay 的 eof_action=repeat 让它保持到结尾
+    lines = ["ffconcat version 1.0"]
+    for path, duration in entries:
+        lines.append(f"file '{path.name}'")
+        if duration is not None:
+            lines.append(f"duration {duration:.3f}")
+    lines.append(f"file '{entries[-1][0].name}'")
+    concat_list = work_dir / "cards.ffconcat"
+    concat_list.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return concat_list
+
+
+def _font_family(font_path: str) -> str:
+    """读取字体文件的字体族名（失败返回空字符串）"""
+    if not font_path:
+        return ""
+    try:
+        from PIL import ImageFont
+        return ImageFont.truetype(font_path, 12).getname()[0] or ""
+    except Exception:
+        return ""
+
+
+def _ass_color(rgb: Tuple[int, int, int]) -> str:
+    """RGB → ASS 颜色（&HAABBGGRR）"""
+    r, g, b = rgb
+    return f"&H00{b:02X}{g:02X}{r:02X}"
+
+
+def _ass_time(seconds: float) -> str:
+    """秒 → ASS 时间（H:MM:SS.cc）"""
+    centis = int(round(seconds * 100))
+    hours, centis = divmod(centis, 360000)
+    minutes, centis = divmod(centis, 6000)
+    secs, centis = divmod(centis, 100)
+    return f"{hours}:{minutes:02d}:{secs:02d}.{centis:02d}"
+
+
+def _escape_filter_path(path: Path) -> str:
+    """转义放在单引号内的滤镜参数路径（\\ 换成 /，: 转义，' 先闭合引号再转义）"""
+    return (
+        str(Path(path).resolve())
+        .replace("\\", "/")
+        .replace(":", "\\:")
+        .replace("'", "'\\''")
+    )
+
+
+_PROBE_CACHE_SIZE = 256
+_probe_cache: "OrderedDict[tuple, Dict]" = OrderedDict()
+_probe_lock = threading.Lock()
+
+
+def probe_streams(video_path: str) -> Dict:
+    """
+    用一次 ffprobe 读取视频的流布局，按 (路径, mtime, 大小) 缓存
+
+    Returns:
+        {"has_audio": bool 或 None（无法探测）, "frame_size": (宽, 高), "duration": 秒 或 None}
+    """
+    path = Path(video_path)
+    try:
+        stat = path.stat()
+        key = (str(path.resolve()), stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        key = None
+
+    if key is not None:
+        with _probe_lock:
+            cached = _probe_cache.get(key)
+            if cached is not None:
+                _probe_cache.move_to_end(key)
+                return cached
+
+    layout = {"has_audio": None, "frame_size": DEFAULT_FRAME_SIZE, "duration": None}
+    if shutil.which("ffprobe") is None:
+        return layout
+    result = subprocess.run(
+        ["ffprobe", "-v", "error",
+         "-show_entries", "stream=codec_type,width,height:format=duration",
+         "-of", "json", str(path)],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        return layout
+    try:
+        info = json.loads(result.stdout)
+    except json.JSONDecodeError:
+        return layout
+
+    streams = info.get("streams", [])
+    layout["has_audio"] = any(s.get("codec_type") == "audio" for s in streams)
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    if video and video.get("width") and video.get("height"):
+        layout["frame_size"] = (int(video["width"]), int(video["height"]))
+    try:
+        layout["duration"] = float(info.get("format", {}).get("duration"))
+    except (TypeError, ValueError):
+        pass
+
+    if key is not None:
+        with _probe_lock:
+            _probe_cache[key] = layout
+            while len(_probe_cache) > _PROBE_CACHE_SIZE:
+                _probe_cache.popitem(last=False)
+    return layout
+
+
+def _bgm_chain(track: BgmTrack, duration: Optional[float], volume: float) -> str:
+    """BGM 音频滤镜：曲目时长已知且覆盖视频时不加 aloop"""
+    if track.duration and duration and track.duration >= duration:
+        return f"volume={volume}"
+    return f"volume={volume},aloop=loop=-1:size=2e+09"
 
 
 def _escape_drawtext(text: str) -> str:
@@ -0,0 +1,118 @@
+"""
+后处理执行器
+功能：
+1. 流水线和批量任务的后处理（FFmpeg 字幕 / BGM）统一提交到这里排队执行
+2. 同时运行的 FFmpeg 进程数有上限（postprocess_workers，默认按 CPU 核数），
+   多个任务同时到达后处理时排队，而不是同时启动多个 x264 编码抢占 CPU
+3. 记录排队深度、等待时间和执行时间，供 /api/postprocess/stats 查看
+   （抛异常或返回非 success 结果的任务都计入 failed）
+
+FFmpeg 本身就是子进程，工作线程只负责启动并等待它，所以这里用线程池而不是进程池。
+"""
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from .config import settings
+
+
+def _succeeded(result) -> bool:
+    """
+    PostProcessor 把 FFmpeg 失败报告为 status=skipped 的结果（不抛异常），
+    顶层或任一步骤不是 success 都算失败
+    """
+    if not isinstance(result, dict):
+        return True
+    if result.get("status", "success") != "success":
+        return False
+    return all(step.get("status", "success") == "success" for step in result.get("steps") or [])
+
+
+def default_workers() -> int:
+    """默认并发数：libx264 自身会用满多个核，每个进程按 2 核估算"""
+    return max(1, (os.cpu_count() or 1) // 2)
+
+
+class PostProcessPool:
+    """有并发上限的后处理执行器（线程安全）"""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="postprocess")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.run_total = 0.0
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """排队执行 fn(*args, **kwargs)，返回 Future"""
+        submitted = time.time()
+        with self._lock:
+            self.queued += 1
+
+        def _task():
+            started = time.time()
+            wait = started - submitted
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+            ok = False
+            try:
+                result = fn(*args, **kwargs)
+                ok = _succeeded(result)
+                return result
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.run_total += time.time() - started
+                    if ok:
+                        self.completed += 1
+                    else:
+                        self.failed += 1
+
+        return self._executor.submit(_task)
+
+    def run(self, fn: Callable, *args, **kwargs):
+        """排队执行并等待结果（异常原样抛出）"""
+        return self.submit(fn, *args, **kwargs).result()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            started = self.completed + self.failed + self.running
+            finished = self.completed + self.failed
+            return {
+                "workers": self.workers,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "avg_wait_seconds": round(self.wait_total / started, 3) if started else 0.0,
+                "max_wait_seconds": round(self.wait_max, 3),
+                "avg_run_seconds": round(self.run_total / finished, 3) if finished else 0.0,
+            }
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+# ── 全局实例 ─────────────────────────────────────────────────────
+
+_pool: Optional[PostProcessPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_postprocess_pool() -> PostProcessPool:
+    """获取进程内共享的后处理执行器（postprocess_workers 为 0 时按 CPU 核数决定）"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PostProcessPool(settings.postprocess_workers or default_workers())
+        return _pool
@@ -3,12 +3,21 @@ Prompt 生成模块 - MVP 版本
 功能：
 1. 根据产品信息和卖点生成视频脚本
 2. 生成 Sora/Creatok 视频提示词
+3. 合并模式：一次结构化输出同时返回脚本和视频提示词
+4. 流式生成：边接收边解析，hook / 每个 scene 到达即回调（on_partial）
 """
-from typing import List, Optional, Dict
+from typing import Any, Callable, List, Optional, Dict
 from openai import OpenAI
 
 from .config import settings
-from .utils import parse_json_response
+from .http_clients import OPENAI_BASE_URL, get_client
+from .llm_cache import chat_completion, stream_chat_completion
+from .utils import IncrementalScriptParser, parse_json_response
+
+
+# 流式回调：on_partial(event, value, partial_script)
+# event 为 "hook" / "scene" / "cta" / "video_prompt"，partial_script 为目前已完整到达的脚本
+PartialCallback = Callable[[str, Any, dict], None]
 
 
 class PromptGenerator:
@@ -21,14 +30,38 @@ class PromptGenerator:
         Args:
             api_key: OpenAI API Key
         """
-        self.client = OpenAI(api_key=api_key or settings.openai_api_key)
+        self.client = OpenAI(
+            api_key=api_key or settings.openai_api_key,
+            http_client=get_client(OPENAI_BASE_URL),
+        )
+
+    def _complete(self, on_partial: Optional[PartialCallback], use_cache: bool, **kwargs) -> str:
+        """
+        调用 chat 接口返回文本；传入 on_partial 时改为流式调用，
+        并用增量解析器在 hook / scene / cta 完整到达时立即回调
+        """
+        if on_partial is None:
+            return chat_completion(self.client, use_cache=use_cache, **kwargs)
+
+        parser = IncrementalScriptParser()
+
+        def _on_delta(delta: str):
+            for event, value in parser.feed(delta):
+                try:
+                    on_partial(event, value, parser.script)
+                except Exception as e:
+                    print(f"⚠️ 流式回调异常: {e}")
+
+        return stream_chat_completion(self.client, _on_delta, use_cache=use_cache, **kwargs)
 
     def generate_video_script(
         self,
         product_name: str,
         product_description: str,
         selling_points: List[str],
-        duration: int = 15
+        duration: int = 15,
+        use_cache: bool = True,
+        on_partial: Optional[PartialCallback] = None,
     ) -> dict:
         """
         生成视频脚本
@@ -38,6 +71,8 @@ class PromptGenerator:
             product_description: 产品描述
             selling_points: 卖点列表
             duration: 视频时长（秒）
+            use_cache: 是否使用 LLM 响应缓存
+            on_partial: 流式回调，传入时边生成边回调已完整的 hook / scene / cta
 
         Returns:
             包含脚本和分镜的字典
@@ -78,7 +113,9 @@ class PromptGenerator:
 """
 
         # 调用 GPT-4 生成脚本
-        response = self.client.chat.completions.create(
+        script_text = self._complete(
+            on_partial,
+            use_cache,
             model="gpt-4o",
             messages=[
                 {
@@ -94,9 +131,6 @@ class PromptGenerator:
             max_tokens=1000
         )
 
-        # 提取脚本
-        script_text = response.choices[0].message.content
-
         print(f"✅ 脚本生成完成")
         print(f"预览: {script_text[:200]}...")
 
@@ -114,7 +148,8 @@ class PromptGenerator:
         self,
         product_description: str,
         script: dict,
-        reference_image_path: Optional[str] = None
+        reference_image_path: Optional[str] = None,
+        use_cache: bool = True,
     ) -> str:
         """
         生成 AI 视频生成工具的 Prompt（Sora/Creatok）
@@ -123,6 +158,7 @@ class PromptGenerator:
             product_description: 产品外观描述
             script: 视频脚本（从 generate_video_script 获得）
             reference_image_path: 参考图片路径（可选）
+            use_cache: 是否使用 LLM 响应缓存
 
         Returns:
             完整的视频生成 Prompt
@@ -165,7 +201,9 @@ IMPORTANT:
 """
 
         # 使用 GPT-4 优化 Prompt
-        response = self.client.chat.completions.create(
+        optimized_prompt = chat_completion(
+            self.client,
+            use_cache=use_cache,
             model="gpt-4o",
             messages=[
                 {
@@ -193,50 +231,171 @@ IMPORTANT:
             max_tokens=800
         )
 
-        optimized_prompt = response.choices[0].message.content
-
         print(f"✅ 视频 Prompt 生成完成")
         print(f"长度: {len(optimized_prompt)} 字符")
 
         return optimized_prompt
 
-    def generate_complete_prompt(
+    def generate_script_and_prompt(
         self,
         product_name: str,
         product_description: str,
         selling_points: List[str],
-        duration: int = 15
+        duration: int = 15,
+        use_cache: bool = True,
+        on_partial: Optional[PartialCallback] = None,
     ) -> Dict[str, any]:
         """
-        一站式生成完整的视频 Prompt
+        合并模式：一次 GPT-4o 调用（JSON 结构化输出）同时生成脚本和视频 Prompt
 
         Args:
             product_name: 产品名称
             product_description: 产品描述
             selling_points: 卖点列表
-            duration: 视频时长
+            duration: 视频时长（秒）
+            use_cache: 是否使用 LLM 响应缓存
+            on_partial: 流式回调，传入时边生成边回调已完整的 hook / scene / cta
 
         Returns:
-            包含脚本和 Prompt 的字典
+            {"script": {...}, "video_prompt": "..."}
         """
-        # 生成脚本
+        print(f"📝 生成视频脚本 + Prompt（合并模式）...")
+        print(f"产品: {product_name}")
+        print(f"卖点: {', '.join(selling_points)}")
+
+        prompt = f"""为这个产品生成一个 {duration} 秒的 TikTok 短视频脚本，并据此写出 AI 视频生成工具（Seedance/Creatok）使用的英文视频 Prompt：
+
+产品名称: {product_name}
+产品描述: {product_description}
+
+核心卖点:
+{chr(10).join(f'- {point}' for point in selling_points)}
+
+脚本要求:
+1. 遵循 TikTok 爆款视频结构：痛点开头(3s) + 卖点展示 + 引导下单
+2. 每个镜头 3-5 秒
+3. 简洁有力，适合年轻用户
+4. 突出产品的视觉冲击力
+
+视频 Prompt 要求:
+1. 保持产品外观描述准确
+2. 场景描述要具体、可视化，与脚本分镜一一对应
+3. 添加适当的镜头运动、光线描述
+4. 9:16 竖版格式，简洁现代的电商风格
+5. 总长度控制在 500 tokens 以内
+
+请只返回一个 JSON 对象，包含:
+- hook: 痛点/吸引开头（1句话）
+- scenes: 分镜列表，每个包含 duration(秒)、description(镜头描述)、text(屏幕文字)
+- cta: 行动号召（1句话）
+- video_prompt: 视频生成 Prompt（英文字符串）
+"""
+
+        result_text = self._complete(
+            on_partial,
+            use_cache,
+            model="gpt-4o",
+            messages=[
+                {
+                    "role": "system",
+                    "content": "你是一个专业的 TikTok 短视频脚本编剧，同时精通 AI 视频生成提示词的编写。"
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            response_format={"type": "json_object"},
+            temperature=0.7,
+            max_tokens=1800
+        )
+
+        data = parse_json_response(result_text)
+        if not isinstance(data, dict) or not data.get("scenes"):
+            # 结构化输出异常，退回两步生成
+            print(f"⚠️ 合并模式返回格式异常，改用两步生成")
+            return self._generate_two_call(
+                product_name, product_description, selling_points, duration, use_cache, on_partial
+            )
+
+        video_prompt = str(data.pop("video_prompt", "") or "").strip()
+        script = {
+            "hook": data.get("hook", ""),
+            "scenes": data.get("scenes", []),
+            "cta": data.get("cta", ""),
+        }
+        if not video_prompt:
+            video_prompt = self.generate_video_prompt(product_description, script, use_cache=use_cache)
+
+        print(f"✅ 脚本 + Prompt 生成完成（Prompt {len(video_prompt)} 字符）")
+        return {"script": script, "video_prompt": video_prompt}
+
+    def _generate_two_call(
+        self,
+        product_name: str,
+        product_description: str,
+        selling_points: List[str],
+        duration: int,
+        use_cache: bool,
+        on_partial: Optional[PartialCallback] = None,
+    ) -> Dict[str, any]:
+        """两步模式：先生成脚本，再基于脚本优化视频 Prompt"""
         script = self.generate_video_script(
             product_name,
             product_description,
             selling_points,
-            duration
+            duration,
+            use_cache=use_cache,
+            on_partial=on_partial,
         )
-
-        # 生成视频 Prompt
         video_prompt = self.generate_video_prompt(
             product_description,
-            script
+            script,
+            use_cache=use_cache,
         )
+        return {"script": script, "video_prompt": video_prompt}
+
+    def generate_complete_prompt(
+        self,
+        product_name: str,
+        product_description: str,
+        selling_points: List[str],
+        duration: int = 15,
+        use_cache: bool = True,
+        mode: Optional[str] = None,
+        on_partial: Optional[PartialCallback] = None,
+    ) -> Dict[str, any]:
+        """
+        一站式生成完整的视频 Prompt
+
+        Args:
+            product_name: 产品名称
+            product_description: 产品描述
+            selling_points: 卖点列表
+            duration: 视频时长
+            use_cache: 是否使用 LLM 响应缓存
+            mode: "fused" 一次调用同时生成脚本和 Prompt；"two_call" 先脚本再 Prompt；
+                为空时使用 settings.prompt_mode
+            on_partial: 流式回调 on_partial(event, value, partial_script)，
+                传入时脚本以流式生成，hook / 每个 scene 到达即回调
+
+        Returns:
+            包含脚本和 Prompt 的字典
+        """
+        mode = mode or settings.prompt_mode
+        if mode == "fused":
+            result = self.generate_script_and_prompt(
+                product_name, product_description, selling_points, duration, use_cache, on_partial
+            )
+        else:
+            result = self._generate_two_call(
+                product_name, product_description, selling_points, duration, use_cache, on_partial
+            )
 
         return {
             "product_name": product_name,
-            "script": script,
-            "video_prompt": video_prompt,
+            "script": result["script"],
+            "video_prompt": result["video_prompt"],
             "duration": duration
         }
 
@@ -0,0 +1,267 @@
+"""
+视频任务轮询模块
+功能：单个后台 asyncio 事件循环统一轮询所有未完成的 Seedance / Creatok 任务，
+共享一个 httpx.AsyncClient，每个任务完成时解析对应的 Future。
+
+轮询间隔由 PollSchedule 根据后端返回的 progress 和已耗时自适应计算：
+前期稀疏、临近完成时密集，HTTP 错误按带抖动的指数退避重试，并给出 ETA。
+已耗时从任务提交时间算起（重启 / 重试后重新登记的任务不会从 0 开始）。
+
+调用方（run_pipeline / 批量任务线程）只需等待 Future，
+数百个在途任务只占用一个轮询线程和若干协程，而不是数百个 sleep 中的线程。
+"""
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional, Tuple
+
+import httpx
+
+from .http_clients import build_async_client
+
+# (url, headers, timeout)
+StatusRequest = Tuple[str, Dict[str, str], float]
+
+
+class PollSchedule:
+    """
+    自适应轮询节奏
+
+    根据 progress / 已耗时估算完成速度，下次轮询安排在预计剩余时间的一半处，
+    并限制在 [min_interval, max_interval] 之间；尚无进度时按 expected_duration 估算。
+    """
+
+    def __init__(
+        self,
+        expected_duration: float = 120.0,
+        min_interval: float = 2.0,
+        max_interval: float = 20.0,
+        max_backoff: float = 60.0,
+        max_errors: int = 5,
+    ):
+        self.expected_duration = expected_duration
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.max_backoff = max_backoff
+        self.max_errors = max_errors
+        self.errors = 0
+        self.eta: Optional[float] = None
+
+    def estimate_remaining(self, progress: float, elapsed: float) -> float:
+        """估算剩余秒数"""
+        progress = min(max(progress or 0.0, 0.0), 100.0)
+        if progress >= 100:
+            return 0.0
+        if progress > 0 and elapsed > 0:
+            rate = progress / elapsed
+            return (100.0 - progress) / rate
+        return max(self.expected_duration - elapsed, 0.0)
+
+    def next_delay(self, progress: float, elapsed: float) -> float:
+        """收到一次正常状态后，计算下次轮询的等待时间并更新 ETA"""
+        self.errors = 0
+        remaining = self.estimate_remaining(progress, elapsed)
+        self.eta = remaining
+        delay = min(max(remaining / 2, self.min_interval), self.max_interval)
+        # ±10% 抖动，避免大量任务同时轮询
+        return delay * random.uniform(0.9, 1.1)
+
+    def error_delay(self) -> Optional[float]:
+        """HTTP 错误后的退避时间；连续错误超过上限返回 None"""
+        self.errors += 1
+        if self.errors > self.max_errors:
+            return None
+        base = min(self.min_interval * (2 ** self.errors), self.max_backoff)
+        return random.uniform(base / 2, base)
+
+
+class TaskPoller:
+    """后台轮询器（线程安全，进程内共享一个实例）"""
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._lock = threading.Lock()
+        self._futures: Dict[Tuple[str, str], Future] = {}
+
+    # ── 生命周期 ──────────────────────────────────────────────
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            ready = threading.Event()
+            self._loop = asyncio.new_event_loop()
+
+            def _run():
+                asyncio.set_event_loop(self._loop)
+                self._client = build_async_client()
+                ready.set()
+                self._loop.run_forever()
+
+            self._thread = threading.Thread(target=_run, name="task-poller", daemon=True)
+            self._thread.start()
+            ready.wait()
+
+    def shutdown(self):
+        """关闭共享客户端并停止事件循环"""
+        with self._lock:
+            if not self._loop or not self._thread:
+                return
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), loop).result(timeout=5)
+            self._client = None
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+
+    # ── 对外接口 ──────────────────────────────────────────────
+
+    def watch(
+        self,
+        task_id: str,
+        backend: str,
+        build_request: Callable[[], StatusRequest],
+        parse_status: Callable[[Dict], Dict],
+        max_wait_time: float = 300,
+        check_interval: Optional[float] = None,
+        schedule: Optional[PollSchedule] = None,
+        on_progress: Optional[Callable[[Dict], None]] = None,
+        started_at: Optional[float] = None,
+    ) -> Future:
+        """
+        登记一个待轮询任务，返回完成时解析的 Future
+
+        同一 (backend, task_id) 重复登记时返回同一个 Future。
+
+        Args:
+            task_id: 视频任务 ID
+            backend: seedance 或 creatok
+            build_request: 返回 (url, headers, timeout) 的函数
+            parse_status: 将接口 JSON 转换为 {"status": ...} 字典的函数
+            max_wait_time: 最长等待秒数，超时返回 status=timeout
+            check_interval: 固定轮询间隔（秒）；为空时按 schedule 自适应
+            schedule: 自适应轮询节奏，默认使用 PollSchedule()
+            on_progress: 每次拿到进度时回调 {"progress", "elapsed", "eta_seconds"}，
+                在轮询线程中执行，应尽快返回
+            started_at: 任务提交时间（time.time() 时间戳），已耗时和 ETA 从此刻计算；
+                为空时从开始轮询时计算。max_wait_time 始终按本次轮询计算
+
+        Returns:
+            concurrent.futures.Future，结果为 completed / failed / error / timeout 字典
+        """
+        self._ensure_started()
+        key = (backend, task_id)
+        with self._lock:
+            existing = self._futures.get(key)
+            if existing is not None and not existing.done():
+                return existing
+
+            future = asyncio.run_coroutine_threadsafe(
+                self._poll(
+                    task_id,
+                    build_request,
+                    parse_status,
+                    max_wait_time,
+                    check_interval,
+                    schedule or PollSchedule(),
+                    on_progress,
+                    started_at,
+                ),
+                self._loop,
+            )
+            self._futures[key] = future
+        future.add_done_callback(lambda f, k=key: self._forget(k, f))
+        return future
+
+    def pending(self) -> int:
+        """当前仍在轮询的任务数"""
+        with self._lock:
+            return sum(1 for f in self._futures.values() if not f.done())
+
+    # ── 内部实现 ──────────────────────────────────────────────
+
+    def _forget(self, key: Tuple[str, str], future: Future):
+        with self._lock:
+            if self._futures.get(key) is future:
+                self._futures.pop(key, None)
+
+    async def _poll(
+        self,
+        task_id: str,
+        build_request: Callable[[], StatusRequest],
+        parse_status: Callable[[Dict], Dict],
+        max_wait_time: float,
+        check_interval: Optional[float],
+        schedule: PollSchedule,
+        on_progress: Optional[Callable[[Dict], None]],
+        started_at: Optional[float],
+    ) -> Dict:
+        start_time = time.monotonic()
+        # 本次登记之前任务已经运行的时间（重启后继续轮询、重试时不从 0 开始）
+        offset = max(time.time() - started_at, 0.0) if started_at else 0.0
+
+        while True:
+            if time.monotonic() - start_time > max_wait_time:
+                return {
+                    "status": "timeout",
+                    "error": f"等待超过 {int(max_wait_time)} 秒"
+                }
+
+            url, headers, timeout = build_request()
+            try:
+                response = await self._client.get(url, headers=headers, timeout=timeout)
+                response.raise_for_status()
+                result = parse_status(response.json())
+            except httpx.HTTPError as e:
+                print(f"❌ 任务 {task_id} 状态查询失败: {e}")
+                delay = None if _is_fatal(e) else schedule.error_delay()
+                if delay is None:
+                    return {"status": "error", "error": str(e)}
+                await asyncio.sleep(delay)
+                continue
+
+            if result["status"] in ("completed", "failed", "error"):
+                return result
+
+            elapsed = offset + time.monotonic() - start_time
+            delay = schedule.next_delay(float(result.get("progress") or 0), elapsed)
+            if on_progress:
+                try:
+                    on_progress({
+                        "progress": result.get("progress", 0),
+                        "elapsed": round(elapsed, 1),
+                        "eta_seconds": round(schedule.eta, 1),
+                    })
+                except Exception as e:
+                    print(f"⚠️ 进度回调异常: {e}")
+
+            await asyncio.sleep(check_interval or delay)
+
+
+def _is_fatal(error: httpx.HTTPError) -> bool:
+    """4xx（429 除外）视为不可重试的错误"""
+    if isinstance(error, httpx.HTTPStatusError):
+        code = error.response.status_code
+        return 400 <= code < 500 and code != 429
+    return False
+
+
+# ── 全局实例 ──────────────────────────────────────────────────
+
+_poller: Optional[TaskPoller] = None
+_poller_lock = threading.Lock()
+
+
+def get_poller() -> TaskPoller:
+    """获取进程内共享的轮询器"""
+    global _poller
+    with _poller_lock:
+        if _poller is None:
+            _poller = TaskPoller()
+        return _poller
@@ -55,3 +55,90 @@ def parse_json_response(text: str) -> Optional[Union[dict, list]]:
             pass
 
     return None
+
+
+class IncrementalScriptParser:
+    """
+    流式脚本 JSON 增量解析器
+
+    逐段 feed GPT 流式输出的文本，一旦 hook / 某个 scene / cta / video_prompt
+    完整到达就立即产出事件，不必等待整个 JSON 结束。
+
+    用法:
+        parser = IncrementalScriptParser()
+        for delta in stream:
+            for event, value in parser.feed(delta):
+                ...   # event: "hook" | "scene" | "cta" | "video_prompt"
+    """
+
+    STRING_FIELDS = ("hook", "cta", "video_prompt")
+
+    def __init__(self):
+        self.buffer = ""
+        self.script: dict = {"hook": "", "scenes": [], "cta": ""}
+        self._decoder = json.JSONDecoder()
+        self._done_fields: set = set()
+        self._scenes_cursor: Optional[int] = None   # 下一个 scene 的起始搜索位置
+        self._scenes_closed = False
+
+    def feed(self, text: str) -> list:
+        """追加一段文本，返回本次新完成的 (event, value) 列表"""
+        if not text:
+            return []
+        self.buffer += text
+        events = []
+
+        for field in self.STRING_FIELDS:
+            if field in self._done_fields:
+                continue
+            value = self._try_string_field(field)
+            if value is not None:
+                self._done_fields.add(field)
+                self.script[field] = value
+                events.append((field, value))
+
+        for scene in self._try_scenes():
+            self.script["scenes"].append(scene)
+            events.append(("scene", scene))
+
+        return events
+
+    def _try_string_field(self, field: str) -> Optional[str]:
+        match = re.search(rf'"{field}"\s*:\s*"', self.buffer)
+        if not match:
+            return None
+        try:
+            value, _ = self._decoder.raw_decode(self.buffer, match.end() - 1)
+        except json.JSONDecodeError:
+            return None   # 字符串尚未结束
+        return value if isinstance(value, str) else None
+
+    def _try_scenes(self) -> list:
+        if self._scenes_closed:
+            return []
+        if self._scenes_cursor is None:
+            match = re.search(r'"scenes"\s*:\s*\[', self.buffer)
+            if not match:
+                return []
+            self._scenes_cursor = match.end()
+
+        scenes = []
+        pos = self._scenes_cursor
+        while True:
+            while pos < len(self.buffer) and self.buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(self.buffer):
+                break
+            if self.buffer[pos] == "]":
+                self._scenes_closed = True
+                pos += 1
+                break
+            try:
+                scene, end = self._decoder.raw_decode(self.buffer, pos)
+            except json.JSONDecodeError:
+                break   # 当前 scene 尚未完整
+            if isinstance(scene, dict):
+                scenes.append(scene)
+            pos = end
+        self._scenes_cursor = pos
+        return scenes
@@ -4,13 +4,18 @@
 1. 豆包 Seedance（火山引擎 ARK，推荐）- 国内直连，成本低，支持图生视频
 2. Creatok - 国际服务，15秒视频
 """
-import time
+import asyncio
 import base64
+import time
 import httpx
+from concurrent.futures import Future
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Callable, Optional, Dict, Tuple
 
 from .config import settings
+from .downloads import stream_download
+from .http_clients import get_client
+from .task_poller import PollSchedule, get_poller
 
 
 class VideoGenerator:
@@ -39,16 +44,13 @@ class VideoGenerator:
             data = base64.b64encode(f.read()).decode("utf-8")
         return f"data:{mime};base64,{data}"
 
-    def download_video(self, video_url: str, output_path: str):
-        """下载视频到本地"""
+    def download_video(self, video_url: str, output_path: str) -> Dict:
+        """下载视频到本地（流式写入 + 断点续传），返回 {"path", "size", "sha256"}"""
         print(f"⬇️  下载视频: {output_path}")
-        with httpx.Client(timeout=120.0, follow_redirects=True) as client:
-            response = client.get(video_url)
-            response.raise_for_status()
-        with open(output_path, "wb") as f:
-            f.write(response.content)
-        size_mb = len(response.content) / 1024 / 1024
-        print(f"✅ 视频已保存 ({size_mb:.2f} MB)")
+        result = stream_download(video_url, output_path)
+        size_mb = result["size"] / 1024 / 1024
+        print(f"✅ 视频已保存 ({size_mb:.2f} MB, sha256={result['sha256'][:12]})")
+        return result
 
     # ────────────────────────────────────────────────────────────
     # 豆包 Seedance（火山引擎 ARK）
@@ -109,8 +111,9 @@ class VideoGenerator:
         }
 
         try:
-            response = httpx.post(
-                f"{self.seedance_api_url}/contents/generations/tasks",
+            url = f"{self.seedance_api_url}/contents/generations/tasks"
+            response = get_client(url).post(
+                url,
                 headers=headers,
                 json=payload,
                 timeout=30.0,
@@ -127,34 +130,33 @@ class VideoGenerator:
 
     def check_seedance_status(self, task_id: str) -> Dict:
         """查询 Seedance 任务状态"""
-        headers = {"Authorization": f"Bearer {self.ark_api_key}"}
+        url, headers, timeout = self._status_request(task_id, "seedance")
         try:
-            response = httpx.get(
-                f"{self.seedance_api_url}/contents/generations/tasks/{task_id}",
-                headers=headers,
-                timeout=15.0,
-            )
+            response = get_client(url).get(url, headers=headers, timeout=timeout)
             response.raise_for_status()
-            result = response.json()
-            status = result.get("status")
-
-            if status == "done":
-                video_url = result.get("video_url")
-                print(f"✅ Seedance 生成完成: {video_url}")
-                return {"status": "completed", "video_url": video_url}
-            elif status == "failed":
-                error = result.get("error", "未知错误")
-                print(f"❌ Seedance 生成失败: {error}")
-                return {"status": "failed", "error": error}
-            else:
-                progress = result.get("progress", 0)
-                print(f"⏳ Seedance 生成中... {progress}%")
-                return {"status": "processing", "progress": progress}
+            return self._parse_seedance_status(response.json())
 
         except httpx.HTTPError as e:
             print(f"❌ Seedance 状态查询失败: {e}")
             return {"status": "error", "error": str(e)}
 
+    def _parse_seedance_status(self, result: Dict) -> Dict:
+        """将 Seedance 任务查询结果转换为统一的状态字典"""
+        status = result.get("status")
+
+        if status == "done":
+            video_url = result.get("video_url")
+            print(f"✅ Seedance 生成完成: {video_url}")
+            return {"status": "completed", "video_url": video_url}
+        elif status == "failed":
+            error = result.get("error", "未知错误")
+            print(f"❌ Seedance 生成失败: {error}")
+            return {"status": "failed", "error": error}
+        else:
+            progress = result.get("progress", 0)
+            print(f"⏳ Seedance 生成中... {progress}%")
+            return {"status": "processing", "progress": progress}
+
     # ────────────────────────────────────────────────────────────
     # Creatok
     # ────────────────────────────────────────────────────────────
@@ -188,8 +190,9 @@ class VideoGenerator:
             payload["reference_image"] = image_data_url
 
         try:
-            response = httpx.post(
-                f"{self.creatok_api_url}/videos/generate",
+            url = f"{self.creatok_api_url}/videos/generate"
+            response = get_client(url).post(
+                url,
                 headers=headers,
                 json=payload,
                 timeout=30.0,
@@ -206,66 +209,138 @@ class VideoGenerator:
 
     def check_creatok_status(self, task_id: str) -> Dict:
         """查询 Creatok 任务状态"""
-        headers = {"Authorization": f"Bearer {self.creatok_api_key}"}
+        url, headers, timeout = self._status_request(task_id, "creatok")
         try:
-            response = httpx.get(
-                f"{self.creatok_api_url}/videos/{task_id}",
-                headers=headers,
-                timeout=10.0,
-            )
+            response = get_client(url).get(url, headers=headers, timeout=timeout)
             response.raise_for_status()
-            result = response.json()
-            status = result.get("status")
-
-            if status == "completed":
-                video_url = result.get("video_url") or result.get("url")
-                print(f"✅ Creatok 生成完成: {video_url}")
-                return {"status": "completed", "video_url": video_url}
-            elif status == "failed":
-                error = result.get("error", "未知错误")
-                print(f"❌ Creatok 生成失败: {error}")
-                return {"status": "failed", "error": error}
-            else:
-                progress = result.get("progress", 0)
-                print(f"⏳ Creatok 生成中... {progress}%")
-                return {"status": "processing", "progress": progress}
+            return self._parse_creatok_status(response.json())
 
         except httpx.HTTPError as e:
             print(f"❌ Creatok 状态查询失败: {e}")
             return {"status": "error", "error": str(e)}
 
+    def _parse_creatok_status(self, result: Dict) -> Dict:
+        """将 Creatok 任务查询结果转换为统一的状态字典"""
+        status = result.get("status")
+
+        if status == "completed":
+            video_url = result.get("video_url") or result.get("url")
+            print(f"✅ Creatok 生成完成: {video_url}")
+            return {"status": "completed", "video_url": video_url}
+        elif status == "failed":
+            error = result.get("error", "未知错误")
+            print(f"❌ Creatok 生成失败: {error}")
+            return {"status": "failed", "error": error}
+        else:
+            progress = result.get("progress", 0)
+            print(f"⏳ Creatok 生成中... {progress}%")
+            return {"status": "processing", "progress": progress}
+
+    def _status_request(self, task_id: str, backend: str) -> Tuple[str, Dict[str, str], float]:
+        """构建任务状态查询请求：(url, headers, timeout)"""
+        if backend == "seedance":
+            return (
+                f"{self.seedance_api_url}/contents/generations/tasks/{task_id}",
+                {"Authorization": f"Bearer {self.ark_api_key}"},
+                15.0,
+            )
+        return (
+            f"{self.creatok_api_url}/videos/{task_id}",
+            {"Authorization": f"Bearer {self.creatok_api_key}"},
+            10.0,
+        )
+
     # ────────────────────────────────────────────────────────────
     # 通用：等待完成 + 完整流程
     # ────────────────────────────────────────────────────────────
 
+    def watch_task(
+        self,
+        task_id: str,
+        backend: str = "seedance",
+        max_wait_time: int = 300,
+        check_interval: Optional[float] = None,
+        on_progress: Optional[Callable[[Dict], None]] = None,
+        started_at: Optional[float] = None,
+    ) -> Future:
+        """
+        将任务交给共享的异步轮询器，立即返回 Future
+
+        Future 结果与 wait_for_completion 的返回值相同。
+        check_interval 为空时按进度自适应轮询（见 task_poller.PollSchedule）；
+        started_at 为任务提交时间，已耗时和 ETA 从此刻计算。
+        """
+        parse = self._parse_seedance_status if backend == "seedance" else self._parse_creatok_status
+        schedule = PollSchedule(
+            expected_duration=getattr(settings, f"{backend}_expected_seconds", 120),
+            min_interval=settings.poll_min_interval,
+            max_interval=settings.poll_max_interval,
+        )
+        return get_poller().watch(
+            task_id,
+            backend,
+            build_request=lambda: self._status_request(task_id, backend),
+            parse_status=parse,
+            max_wait_time=max_wait_time,
+            check_interval=check_interval,
+            schedule=schedule,
+            on_progress=on_progress,
+            started_at=started_at,
+        )
+
     def wait_for_completion(
         self,
         task_id: str,
         backend: str = "seedance",
         max_wait_time: int = 300,
-        check_interval: int = 8,
+        check_interval: Optional[float] = None,
+        on_progress: Optional[Callable[[Dict], None]] = None,
+        started_at: Optional[float] = None,
     ) -> Dict:
-        """轮询等待视频生成完成"""
+        """
+        轮询等待视频生成完成（轮询在共享事件循环中进行，本线程只等待结果）
+
+        Args:
+            check_interval: 固定轮询间隔（秒），为空时自适应
+            on_progress: 进度回调，参数为 {"progress", "elapsed", "eta_seconds"}
+            started_at: 任务提交时间（time.time() 时间戳），为空时从现在计算
+        """
         print(f"⏰ 等待生成完成（{backend}，最多 {max_wait_time} 秒）...")
-        start_time = time.time()
-
-        while True:
-            elapsed = time.time() - start_time
-            if elapsed > max_wait_time:
-                return {
-                    "status": "timeout",
-                    "error": f"等待超过 {max_wait_time} 秒"
-                }
-
-            if backend == "seedance":
-                result = self.check_seedance_status(task_id)
-            else:
-                result = self.check_creatok_status(task_id)
-
-            if result["status"] in ("completed", "failed", "error"):
-                return result
+        future = self.watch_task(task_id, backend, max_wait_time, check_interval, on_progress, started_at)
+        return future.result()
 
-            time.sleep(check_interval)
+    async def wait_for_completion_async(
+        self,
+        task_id: str,
+        backend: str = "seedance",
+        max_wait_time: int = 300,
+        check_interval: Optional[float] = None,
+        on_progress: Optional[Callable[[Dict], None]] = None,
+        started_at: Optional[float] = None,
+    ) -> Dict:
+        """wait_for_completion 的协程版本，供 asyncio 调用方使用"""
+        future = self.watch_task(task_id, backend, max_wait_time, check_interval, on_progress, started_at)
+        return await asyncio.wrap_future(future)
+
+    def _create_task(
+        self,
+        prompt: str,
+        reference_image_path: Optional[str],
+        duration: int,
+        backend: str,
+    ) -> Dict:
+        """根据 backend 调用对应生成器创建任务"""
+        if backend == "seedance":
+            return self.generate_with_seedance(
+                prompt=prompt,
+                reference_image_path=reference_image_path,
+                duration=duration,
+            )
+        return self.generate_with_creatok(
+            prompt=prompt,
+            reference_image_path=reference_image_path,
+            duration=duration,
+        )
 
     def generate_video(
         self,
@@ -275,6 +350,10 @@ class VideoGenerator:
         duration: int = 5,
         backend: str = "seedance",
         wait: bool = True,
+        on_progress: Optional[Callable[[Dict], None]] = None,
+        task_id: Optional[str] = None,
+        on_task_created: Optional[Callable[[str], None]] = None,
+        task_created_at: Optional[float] = None,
     ) -> Dict:
         """
         完整视频生成流程（统一入口）
@@ -286,6 +365,10 @@ class VideoGenerator:
             duration: 视频时长（Seedance 建议 5 秒，Creatok 建议 15 秒）
             backend: 'seedance' 或 'creatok'
             wait: 是否等待生成完成
+            on_progress: 轮询进度回调（含 eta_seconds）
+            task_id: 已创建的任务 ID（断点恢复时传入，直接继续轮询；任务已失败时重新创建）
+            on_task_created: 新任务创建成功后的回调，参数为 task_id（用于记录检查点）
+            task_created_at: 已创建任务的提交时间（time.time() 时间戳），轮询进度和 ETA 从此刻计算
         """
         print(f"\n{'='*50}")
         print(f"开始生成视频 [{backend}]")
@@ -293,42 +376,50 @@ class VideoGenerator:
 
         Path(output_path).parent.mkdir(parents=True, exist_ok=True)
 
-        # 根据 backend 调用对应生成器
-        if backend == "seedance":
-            result = self.generate_with_seedance(
-                prompt=prompt,
-                reference_image_path=reference_image_path,
-                duration=duration,
+        final_result = None
+        if task_id:
+            if not wait:
+                return {"status": "created", "task_id": task_id, "backend": backend}
+            print(f"⏳ 继续轮询已有任务: {task_id}")
+            final_result = self.wait_for_completion(
+                task_id, backend=backend, on_progress=on_progress, started_at=task_created_at
             )
-        else:
-            result = self.generate_with_creatok(
-                prompt=prompt,
-                reference_image_path=reference_image_path,
-                duration=duration,
-            )
-
-        if result["status"] != "created":
-            return result
+            if final_result["status"] != "completed":
+                print(f"⚠️ 已有任务未成功（{final_result.get('error', final_result['status'])}），重新创建")
+                final_result = None
+
+        if final_result is None:
+            created_at = time.time()
+            result = self._create_task(prompt, reference_image_path, duration, backend)
+            if result["status"] != "created":
+                return result
 
-        task_id = result["task_id"]
+            task_id = result["task_id"]
+            if on_task_created is not None:
+                on_task_created(task_id)
 
-        if not wait:
-            return {"status": "created", "task_id": task_id, "backend": backend}
+            if not wait:
+                return {"status": "created", "task_id": task_id, "backend": backend}
 
-        # 轮询等待
-        final_result = self.wait_for_completion(task_id, backend=backend)
+            # 轮询等待
+            final_result = self.wait_for_completion(
+                task_id, backend=backend, on_progress=on_progress, started_at=created_at
+            )
 
-        if final_result["status"] != "completed":
-            return final_result
+            if final_result["status"] != "completed":
+                return final_result
 
         # 下载视频
-        self.download_video(final_result["video_url"], output_path)
+        download = self.download_video(final_result["video_url"], output_path)
 
         return {
             "status": "success",
             "output_path": output_path,
             "video_url": final_result["video_url"],
             "backend": backend,
+            "task_id": task_id,
+            "size": download["size"],
+            "sha256": download["sha256"],
         }
 
 